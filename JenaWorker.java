@@ -0,0 +1,77 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+
+/**
+ * Long-lived Jena worker used by jena_pool.py.
+ *
+ * Reads length-prefixed queries ("<bytes>\n<query>") from stdin, runs each one
+ * through arq exactly like `arq --query <file>` and answers with
+ * "<exit code> <bytes>\n<output>", where output is the captured stdout on
+ * success and the captured stderr on failure.
+ *
+ * Launched in source-file mode: java -cp "$JENA_HOME/lib/*" JenaWorker.java
+ */
+public class JenaWorker {
+
+    public static void main(String[] args) throws IOException {
+        InputStream in = new BufferedInputStream(System.in);
+        OutputStream protocol = new BufferedOutputStream(new FileOutputStream(FileDescriptor.out));
+        Path queryFile = Files.createTempFile("jena-worker-", ".rq");
+        queryFile.toFile().deleteOnExit();
+
+        String header;
+        while ((header = readLine(in)) != null) {
+            if (header.isEmpty()) {
+                continue;
+            }
+            byte[] query = in.readNBytes(Integer.parseInt(header.trim()));
+            Files.write(queryFile, query);
+
+            ByteArrayOutputStream out = new ByteArrayOutputStream();
+            ByteArrayOutputStream err = new ByteArrayOutputStream();
+            PrintStream previousOut = System.out;
+            PrintStream previousErr = System.err;
+            System.setOut(new PrintStream(out, true, StandardCharsets.UTF_8));
+            System.setErr(new PrintStream(err, true, StandardCharsets.UTF_8));
+            int code;
+            try {
+                code = new arq.arq("--query", queryFile.toString()).mainRun(false, false);
+            } catch (Throwable t) {
+                t.printStackTrace(System.err);
+                code = 1;
+            } finally {
+                System.out.flush();
+                System.err.flush();
+                System.setOut(previousOut);
+                System.setErr(previousErr);
+            }
+
+            byte[] payload = code == 0 ? out.toByteArray() : err.toByteArray();
+            protocol.write((code + " " + payload.length + "\n").getBytes(StandardCharsets.UTF_8));
+            protocol.write(payload);
+            protocol.flush();
+        }
+    }
+
+    private static String readLine(InputStream in) throws IOException {
+        ByteArrayOutputStream line = new ByteArrayOutputStream();
+        int b;
+        while ((b = in.read()) != -1) {
+            if (b == '\n') {
+                return line.toString(StandardCharsets.UTF_8);
+            }
+            line.write(b);
+        }
+        return line.size() > 0 ? line.toString(StandardCharsets.UTF_8) : null;
+    }
+}
@@ -0,0 +1,104 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, List, Optional
+
+import tracing
+import utils
+from config import Config
+from sparql_client import SPARQLClient, SPARQLSyntaxError, SPARQLTimeoutError
+
+STATUS_OK = 'ok'
+STATUS_EMPTY = 'empty'
+STATUS_TIMEOUT = 'timeout'
+STATUS_SYNTAX_ERROR = 'syntax_error'
+STATUS_ERROR = 'error'
+
+
+def result_to_answer(result: dict):
+    """Flattens a SPARQL JSON result like utils.extruct_values; ASK results become their boolean."""
+    if 'boolean' in result:
+        return result['boolean']
+    return utils.extruct_values(result)
+
+
+@tracing.traced('sparql')
+def answer_one(client: SPARQLClient, item: dict, timeout: Optional[float] = None) -> dict:
+    """Runs one gold query and classifies the outcome."""
+    start = time.perf_counter()
+    record = {'id': item['id'], 'sparql': item['sparql']}
+    try:
+        answer = client.query_answer(item['sparql'], timeout)
+        record['answer'] = answer
+        record['status'] = STATUS_EMPTY if answer == [] else STATUS_OK
+    except SPARQLTimeoutError as e:
+        record.update(status=STATUS_TIMEOUT, error=str(e))
+    except SPARQLSyntaxError as e:
+        record.update(status=STATUS_SYNTAX_ERROR, error=str(e))
+    except Exception as e:
+        record.update(status=STATUS_ERROR, error=str(e))
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def materialize_answers(items: Iterable[dict], out_file: str, sparql_endpoint: str = Config.SPARQL_ENDPOINT,
+                        workers: int = 8, timeout: float = 60.0, retry_failed: bool = False) -> dict:
+    """
+    Answers many queries against an endpoint with a bounded worker pool.
+
+    Each worker thread keeps one keep-alive connection. Results are appended to a JSONL
+    file as they complete, one record per query with a status of ok, empty, timeout,
+    syntax_error or error. Ids already in the file are skipped, so an interrupted run
+    resumes; with `retry_failed` records that did not succeed are attempted again.
+
+    Args:
+      items (iterable of dict): Objects with `id` and `sparql`.
+      out_file (str): JSONL output.
+      sparql_endpoint (str): Endpoint URL, or local:<index directory> (see local_sparql).
+      workers (int): Concurrent queries.
+      timeout (float): Per-query wall-clock timeout in seconds.
+      retry_failed (bool): Re-run ids whose last status was timeout or error.
+
+    Returns:
+      dict: number of queries per status.
+    """
+    done = {}
+    for record in utils.load_jsonl(out_file):
+        done[str(record['id'])] = record.get('status')
+    retryable = {STATUS_TIMEOUT, STATUS_ERROR} if retry_failed else set()
+    pending = [item for item in items if str(item['id']) not in done or done[str(item['id'])] in retryable]
+
+    client = utils.get_sparql_client(sparql_endpoint, timeout)
+    counts = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(answer_one, client, item, timeout) for item in pending]
+        # Journaled in completion order, so a slow query does not hold back the finished ones
+        for future in as_completed(futures):
+            record = future.result()
+            utils.append_jsonl([record], out_file)
+            counts[record['status']] = counts.get(record['status'], 0) + 1
+    return counts
+
+
+def latest_records(out_file: str) -> List[dict]:
+    """The last record per id of a materialized-answers file, in first-seen order."""
+    latest = {}
+    for record in utils.load_jsonl(out_file):
+        latest[str(record['id'])] = record
+    return list(latest.values())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Materialize answers of gold SPARQL queries.")
+    parser.add_argument("input_json", help="JSON array of objects with id and sparql (or query)")
+    parser.add_argument("out_file", help="JSONL output")
+    parser.add_argument("--endpoint", default=Config.SPARQL_ENDPOINT)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--retry-failed", action='store_true')
+    args = parser.parse_args()
+
+    input_items = [{'id': item['id'], 'sparql': item.get('sparql') or item['query']}
+                   for item in utils.load_json_data(args.input_json)]
+    print(materialize_answers(input_items, args.out_file, args.endpoint, args.workers, args.timeout,
+                              args.retry_failed))
@@ -1,44 +1,46 @@
 import utils
+import columnar_dataset
 from config import Config
-import question_similarity
-import kgqa
-import llms
-from prompts import question_to_sparql_prompt
-import dblp_schema
+import entity_index
+from llm_cache import cached_llm_call
+import prompt_assembly
+import sparql_cost
+import tracing
 import logging
-from SPARQLWrapper import SPARQLWrapper, JSON
 import sys,os,json
-import random
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 LOCAL_SPARQL_ENDPOINT = Config.LOCAL_SPARQL_ENDPOINT
 DBLP_QUAD_1_SPARQL_ENDPOINT = Config.DBLP_QUAD_1_SPARQL_ENDPOINT
 SPARQL_ENDPOINT = LOCAL_SPARQL_ENDPOINT
+CHATAI_LLM_MODEL = 'qwen2.5-coder-32b-instruct'
+
+# Model and client modules are slow to import; they load on first use (see baseline_server for a warm process)
+question_similarity = utils.LazyModule('question_similarity')
+kgqa = utils.LazyModule('kgqa')
+llms = utils.LazyModule('llms')
+question_to_sparql_prompt = utils.LazyModule('prompts.question_to_sparql_prompt')
+dblp_schema = utils.LazyModule('dblp_schema')
+HEAVY_MODULES = (question_similarity, kgqa, llms, question_to_sparql_prompt, dblp_schema)
 
 def random_split(data_path, test_ratio=0.2, seed=42):
     """
-    Split data into test and train sets based on date.
+    Split data into test and train sets by a stable hash of each record's id.
+
+    Records are streamed and assigned one at a time (see split_dataset), so adding
+    questions later keeps every existing assignment.
 
     Args:
-      data (list of dict): Each dict contains a date under `date_key`.
-      date_key (str): The key in each dict where the date is stored.
+      data_path (str): JSON array of records with an `id`.
       test_ratio (float): Fraction of data to assign to test set (default 0.2).
-      date_format (str or None): Optional strptime format if dates are strings.
+      seed (int): Salt of the hash; another seed gives another split.
 
     Returns:
-      (train_data, test_data): two lists split by date.
+      dict: number of records per split.
     """
-    random.seed(seed)
-    data = utils.load_json_data(data_path)
-    data_shuffled = data[:]  # make a shallow copy
-
-    random.shuffle(data_shuffled)
-
-    split_index = int(len(data_shuffled) * test_ratio)
-    test_data = data_shuffled[:split_index]
-    train_data = data_shuffled[split_index:]
-    utils.write_to_json(test_data,"experiment/ask-dblp/test_data.json")
-    utils.write_to_json(train_data, "experiment/ask-dblp/train_data.json")
+    import split_dataset
+    return split_dataset.split_file(data_path, "experiment/ask-dblp", [('test', test_ratio), ('train', 1 - test_ratio)],
+                                    salt=str(seed), name_pattern="{split}_data.json")
 
 
 def collect_answers(data_source):
@@ -48,7 +50,10 @@ def collect_answers(data_source):
             continue
         for qid, data in item.items():
             extracted_strings = []
-            if isinstance(data, dict) and 'answer' in data and isinstance(data['answer'], list):
+            if isinstance(data, dict) and isinstance(data.get('answer'), bool):
+                # ASK predictions are scored like the boolean gold answers
+                extracted_strings = data['answer']
+            elif isinstance(data, dict) and 'answer' in data and isinstance(data['answer'], list):
                 for entry in data['answer']:
                     if isinstance(entry, dict):
                         # Extract string values from all keys in the dict
@@ -98,77 +103,105 @@ def postprocess_predictions_for_eval_ask_dblp():
 
 
 
+def question_to_sparql_template(examples_key):
+    """QUESTION_TO_SPARQL_PROMPT with the schema and the few-shot examples filled in once."""
+    examples = utils.get_examples(examples_key)
+    return prompt_assembly.compiled(('question_to_sparql', examples), lambda: prompt_assembly.CompiledPrompt(
+        'question_to_sparql',
+        question_to_sparql_prompt.QUESTION_TO_SPARQL_PROMPT,
+        dblp_schema=dblp_schema.properties_uri_and_description,
+        examples=examples,
+    ))
+
+
+@tracing.traced('prompt')
 def get_question_to_sparql_prompt(question, selected_entities=[], similar_questions_pool={}):
-    examples = utils.get_examples("build_sparql")
+    examples_key = "build_sparql"
     selected_entities_string = ''
     if selected_entities:
         selected_entities_string = '\n  '.join(
             f"ENTITY_LABEL: {entity['normalized_label']} ; ENTITY_TYPE: {entity['entity_type']} ; URI: {entity['uri']}"
             for entity in selected_entities
         )
-        examples = utils.get_examples("buidl_sparql_with_uri")
-    prompt_template = question_to_sparql_prompt.QUESTION_TO_SPARQL_PROMPT
-    prompt = prompt_template.format(
+        examples_key = "buidl_sparql_with_uri"
+    return question_to_sparql_template(examples_key).render(
         question=question,
-        dblp_schema=dblp_schema.properties_uri_and_description,
-        examples=examples,
         entities=selected_entities_string,
         similar_questions_pool=similar_questions_pool,
     )
-    return prompt
 
 
-def answer_questions(qsim, question, top_k = 5):
-    try:
+@tracing.traced('similarity')
+def find_similar_questions(qsim, question, top_k=5):
+    if hasattr(qsim, 'search'):
+        # A similarity_index.SimilarityIndex
+        similar_questions = qsim.search([question], top_k)[0]
+    else:
         similar_questions = question_similarity.identify_similar_questions(qsim, question)
-        similar_questions_pool = {}
-        if similar_questions:
-            for qid, qu, score, q_sparql, q_entities in similar_questions[:top_k]:
-                similar_questions_pool.update({'question':qu, 'entities':q_entities, 'sparql':q_sparql})
+    similar_questions_pool = {}
+    if similar_questions:
+        for qid, qu, score, q_sparql, q_entities in similar_questions[:top_k]:
+            similar_questions_pool.update({'question':qu, 'entities':q_entities, 'sparql':q_sparql})
+    return similar_questions, similar_questions_pool
+
+
+@tracing.traced('entity_linking')
+def link_entities(question):
+    linker = entity_index.get_default_linker()
+    if linker is not None:
+        all_entities, selected_entities = linker.link(question)
+    else:
         all_entities, selected_entities = kgqa.entity_linker(question)
-        if not all_entities and selected_entities:
-            all_entities = []
-            selected_entities = []
-        prompt = get_question_to_sparql_prompt(question, selected_entities, similar_questions_pool)
-        chatai_llm_model = 'qwen2.5-coder-32b-instruct'
-        sparql_query, confidence = llms.chatai_models(prompt=prompt, model=chatai_llm_model)
+    if not all_entities and selected_entities:
+        all_entities = []
+        selected_entities = []
+    return all_entities, selected_entities
+
+
+def generate_sparql(question, selected_entities, similar_questions_pool):
+    prompt = get_question_to_sparql_prompt(question, selected_entities, similar_questions_pool)
+    return cached_llm_call('chatai', CHATAI_LLM_MODEL, prompt, None,
+                           lambda: llms.chatai_models(prompt=prompt, model=CHATAI_LLM_MODEL))
+
+
+def execute_sparql(sparql, plan=None):
+    # Generated queries run with a timeout of their cost class, costly ones with a LIMIT cap
+    plan = plan or sparql_cost.plan(sparql)
+    return utils.run_sparql_answer(sparql_endpoint=SPARQL_ENDPOINT, sparql_query=plan.sparql,
+                                   max_rows=plan.max_rows, timeout=plan.timeout)
+
+
+def answer_questions(qsim, question, top_k = 5):
+    try:
+        similar_questions, similar_questions_pool = find_similar_questions(qsim, question, top_k)
+        all_entities, selected_entities = link_entities(question)
+        sparql_query, confidence = generate_sparql(question, selected_entities, similar_questions_pool)
         if 'sparql' in sparql_query:
             sparql = sparql_query['sparql']
-            sparql_result = SPARQLWrapper(SPARQL_ENDPOINT)
-            sparql_result.setQuery(sparql)
-            sparql_result.setReturnFormat(JSON)
-            results = sparql_result.query().convert()
-            answer = utils.extruct_values(results)
+            plan = sparql_cost.plan(sparql)
+            answer = execute_sparql(sparql, plan)
+            if answer is None:
+                logging.warning(f"No answer for a {plan.cost} query ({', '.join(plan.issues)})")
+                return {}
             return {'answer':answer, 'sparql':sparql, 'confidence':confidence,
                 'all_entities':all_entities, 'selected_entities':selected_entities,
-                'similar_questions':similar_questions, 'top_k': top_k}
+                'similar_questions':similar_questions, 'top_k': top_k, 'sparql_plan': plan.report(answer)}
     except Exception as e:
         logging.error(f"An error occurred during SPARQL Generation: {e}", exc_info=e)
         return {}
 
 
-def eval_dblp_quad(test_set, prediction_file="experiment/DBLP-QuAD/answer_predictions_test.json"):
-    test_set = utils.load_json_data(test_set)
-    answer_predictions = utils.load_json_data(prediction_file)
-    qsim = question_similarity.QuestionSimilarityIdentifier()
-    for q in test_set['questions']:
-        qid = q["id"]
-        question = utils.get_value_from_dict(q["paraphrased_question"],"string")
-        answer_result = answer_questions(qsim, question)
-        answer_predictions.append({qid:answer_result})
-        utils.write_to_json(answer_predictions,prediction_file)
-
-
-def eval_ask_dblp(test_set, prediction_file="experiment/ask-dblp/answer_predictions_test.json"):
-    test_set = utils.load_json_data(test_set)
-    answer_predictions = utils.load_json_data(prediction_file)
-    qsim = question_similarity.QuestionSimilarityIdentifier()
-    for q in test_set:
-        qid = q["id"]
-        question = q["formal_question"]
-        answer_result = answer_questions(qsim, question)
-        answer_predictions.append({qid:answer_result})
-        utils.write_to_json(answer_predictions,prediction_file)
+def eval_dblp_quad(test_set, prediction_file="experiment/DBLP-QuAD/answer_predictions_test.json", concurrency=None):
+    import eval_engine
+    questions = [(q["id"], utils.get_value_from_dict(q["paraphrased_question"],"string"))
+                 for q in columnar_dataset.iter_records(test_set, records_key='questions')]
+    return eval_engine.evaluate(questions, prediction_file, concurrency=concurrency)
+
+
+def eval_ask_dblp(test_set, prediction_file="experiment/ask-dblp/answer_predictions_test.json", concurrency=None):
+    import eval_engine
+    questions = [(q["id"], q["formal_question"]) for q in columnar_dataset.iter_records(test_set)]
+    return eval_engine.evaluate(questions, prediction_file, concurrency=concurrency)
 
 
 if __name__ == '__main__':
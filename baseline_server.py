@@ -0,0 +1,225 @@
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import baseline
+import entity_index
+import eval_engine
+import llm_cache
+import prompt_assembly
+import similarity_index
+import sparql_cache
+
+
+class BaselineService:
+    """
+    Keeps the baseline warm: models, indexes and clients are loaded once and the
+    per-stage pools of an EvaluationEngine stay up between requests.
+
+    Questions from concurrent requests are collected into micro-batches (up to
+    `max_batch` questions or `batch_window` seconds), so a similarity index can
+    search a whole batch in one matrix product and the entity linker can resolve
+    it together, before each question runs through the stage pools.
+    """
+
+    def __init__(self, qsim=None, concurrency: Optional[Dict[str, int]] = None, top_k: int = 5,
+                 max_batch: int = 32, batch_window: float = 0.01):
+        self.started = time.time()
+        for module in baseline.HEAVY_MODULES:
+            module.load()
+        if qsim is None:
+            qsim = similarity_index.get_default_index() or baseline.question_similarity.QuestionSimilarityIdentifier()
+        self.engine = eval_engine.EvaluationEngine(qsim, concurrency, top_k)
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.pending: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self.drivers = ThreadPoolExecutor(max_workers=sum(self.engine.concurrency.values()),
+                                          thread_name_prefix='question')
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'questions': 0, 'errors': 0, 'batches': 0}
+        self.running = True
+        self.batcher = threading.Thread(target=self._batch_loop, name='batcher', daemon=True)
+        self.batcher.start()
+        self.load_seconds = round(time.time() - self.started, 3)
+
+    def _count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def _next_batch(self) -> List[Tuple[str, Future]]:
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return [item for item in batch if item is not None]
+
+    def _batch_loop(self):
+        while self.running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            self._count('batches')
+            questions = [question for question, _ in batch]
+            qsim = self.engine.qsim
+            try:
+                if hasattr(qsim, 'prefetch'):
+                    qsim.prefetch(questions, self.engine.top_k)
+                linker = entity_index.get_default_linker()
+                if linker is not None:
+                    linker.prefetch(questions, self.engine.concurrency['entity_linking'])
+            except Exception as e:
+                # Each question still goes through the regular stages
+                logging.error(f"Batch prefetch failed: {e}", exc_info=e)
+            for question, future in batch:
+                self.drivers.submit(self._drive, question, future)
+
+    def _drive(self, question: str, future: Future):
+        try:
+            future.set_result(self.engine.answer(question))
+        except Exception as e:
+            self._count('errors')
+            future.set_exception(e)
+        finally:
+            if hasattr(self.engine.qsim, 'discard'):
+                self.engine.qsim.discard([question], self.engine.top_k)
+
+    def answer(self, questions: List[str], timeout: Optional[float] = None) -> List[dict]:
+        """Answers like baseline.answer_questions, one result per question."""
+        self._count('requests')
+        self._count('questions', len(questions))
+        futures = []
+        for question in questions:
+            future = Future()
+            self.pending.put((question, future))
+            futures.append(future)
+        return [future.result(timeout) for future in futures]
+
+    def health(self) -> dict:
+        return {'status': 'ok' if self.running else 'stopping', 'uptime_s': round(time.time() - self.started, 1),
+                'load_s': self.load_seconds, 'queued': self.pending.qsize()}
+
+    def metrics(self) -> dict:
+        with self.lock:
+            report = dict(self.counters)
+        report['latency'] = self.engine.timer.summary()
+        linker = entity_index.get_default_linker()
+        if linker is not None:
+            report['entity_linking'] = dict(linker.stats)
+        report['prompts'] = prompt_assembly.PROMPT_STATS.summary()
+        for name, cache in (('llm_cache', llm_cache.get_default_cache()),
+                            ('sparql_cache', sparql_cache.get_default_cache())):
+            if cache is not None:
+                report[name] = cache.stats()
+        return report
+
+    def close(self):
+        self.running = False
+        self.pending.put(None)
+        self.batcher.join()
+        self.drivers.shutdown(wait=True)
+        self.engine.close()
+
+
+class BaselineRequestHandler(BaseHTTPRequestHandler):
+    """POST /answer with {"question": ...} or {"questions": [...]}; GET /health and /metrics."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, self.server.service.health())
+        elif self.path == '/metrics':
+            self._send_json(200, self.server.service.metrics())
+        else:
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/answer':
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            questions = request['questions'] if 'questions' in request else [request['question']]
+            if not all(isinstance(question, str) for question in questions):
+                raise ValueError("questions must be strings")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': f"Bad request: {e}"})
+            return
+        try:
+            answers = self.server.service.answer(questions, self.server.answer_timeout)
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {'answers': answers})
+
+
+def serve(service: BaselineService, host: str = '127.0.0.1', port: int = 0,
+          timeout: Optional[float] = 300.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Serves `service` over HTTP on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), BaselineRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.answer_timeout = timeout
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def ask(url: str, questions: List[str], timeout: float = 300.0) -> List[dict]:
+    """Client side: answers from a running server."""
+    body = json.dumps({'questions': questions}).encode('utf-8')
+    request = urllib.request.Request(url.rstrip('/') + '/answer', body, {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)['answers']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the baseline as a resident service, or query one.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve')
+    serve_parser.add_argument("--host", default='127.0.0.1')
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--top-k", type=int, default=5)
+    serve_parser.add_argument("--max-batch", type=int, default=32)
+    serve_parser.add_argument("--batch-window", type=float, default=0.01, help="Seconds to wait for a batch to fill")
+    ask_parser = subparsers.add_parser('ask')
+    ask_parser.add_argument("questions", nargs='+')
+    ask_parser.add_argument("--url", default='http://127.0.0.1:8765')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        service = BaselineService(top_k=args.top_k, max_batch=args.max_batch, batch_window=args.batch_window)
+        server, url = serve(service, args.host, args.port)
+        print(f"Baseline ready in {service.load_seconds}s at {url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+            service.close()
+    else:
+        for question, answer in zip(args.questions, ask(args.url, args.questions)):
+            print(json.dumps({'question': question, 'answer': answer}, ensure_ascii=False, indent=2))
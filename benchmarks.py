@@ -0,0 +1,328 @@
+import argparse
+import contextlib
+import csv
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import time
+import types
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import RDFS, XSD
+
+import tracing
+
+DBLP = 'https://dblp.org/rdf/schema#'
+PREFIX = f"PREFIX dblp: <{DBLP}> PREFIX rdfs: <{RDFS}>"
+QUERY_TEMPLATES = (
+    "SELECT DISTINCT ?title WHERE {{ ?paper dblp:authoredBy <https://dblp.org/pid/{author}> . "
+    "?paper dblp:title ?title }}",
+    "SELECT (COUNT(DISTINCT ?paper) AS ?count) WHERE {{ ?paper dblp:publishedIn \"Venue{venue}\" . "
+    "?paper dblp:yearOfPublication \"{year}\"^^<http://www.w3.org/2001/XMLSchema#gYear> }}",
+    "SELECT DISTINCT ?name WHERE {{ ?paper dblp:authoredBy <https://dblp.org/pid/{author}> . "
+    "?paper dblp:authoredBy ?coauthor . ?coauthor rdfs:label ?name FILTER(?coauthor != "
+    "<https://dblp.org/pid/{author}>) }}",
+    "ASK {{ <https://dblp.org/rec/{paper}> dblp:authoredBy <https://dblp.org/pid/{author}> }}",
+)
+# Stand-in latencies in seconds, roughly those of the remote services
+DEFAULT_LATENCY = {'llm': 0.05, 'entity_linking': 0.01, 'similarity': 0.002, 'sparql': 0.005}
+
+
+def synthetic_graph(papers: int = 2000, authors: int = 300, seed: int = 0) -> Graph:
+    """A small DBLP-shaped graph: papers with titles, years, venues and three authors each."""
+    rng = random.Random(seed)
+    graph = Graph()
+    schema = {name: URIRef(DBLP + name) for name in ('authoredBy', 'title', 'yearOfPublication', 'publishedIn')}
+    for a in range(authors):
+        graph.add((URIRef(f"https://dblp.org/pid/{a}"), RDFS.label, Literal(f"Author {a}")))
+    for p in range(papers):
+        paper = URIRef(f"https://dblp.org/rec/{p}")
+        graph.add((paper, schema['title'], Literal(f"Title {p}")))
+        graph.add((paper, schema['yearOfPublication'], Literal(str(2000 + p % 20), datatype=XSD.gYear)))
+        graph.add((paper, schema['publishedIn'], Literal(f"Venue{p % 13}")))
+        for a in rng.sample(range(authors), 3):
+            graph.add((paper, schema['authoredBy'], URIRef(f"https://dblp.org/pid/{a}")))
+    return graph
+
+
+def synthetic_queries(count: int, papers: int = 2000, authors: int = 300, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [PREFIX + ' ' + rng.choice(QUERY_TEMPLATES).format(
+        author=rng.randrange(authors), venue=rng.randrange(13), year=2000 + rng.randrange(20),
+        paper=rng.randrange(papers)) for _ in range(count)]
+
+
+def _variant(sparql: str, rng: random.Random) -> str:
+    """The same query spelled differently: keyword case, whitespace or variable names."""
+    kind = rng.randrange(3)
+    if kind == 0:
+        return re.sub(r'\b(SELECT|DISTINCT|WHERE|ASK|COUNT|FILTER)\b', lambda m: m.group(1).lower(), sparql)
+    if kind == 1:
+        return re.sub(r' ', lambda m: rng.choice((' ', '  ', '\n  ')), sparql)
+    return sparql.replace('?paper', '?p').replace('?title', '?t')
+
+
+def synthetic_log(path: str, rows: int, duplicate_share: float = 0.5, seed: int = 0) -> str:
+    """
+    A query log CSV (id, datetime, query) as dedup_pipeline reads it. About
+    `duplicate_share` of the rows repeat an earlier query, verbatim or as a variant that
+    only the lexical or the canonical tier recognizes; some carry a description.
+    """
+    rng = random.Random(seed)
+    queries = synthetic_queries(rows, seed=seed)
+    seen = []
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'datetime', 'query'])
+        for i, query in enumerate(queries):
+            if seen and rng.random() < duplicate_share:
+                query = rng.choice(seen)
+                query = query if rng.random() < 0.3 else _variant(query, rng)
+            else:
+                seen.append(query)
+            if rng.random() < 0.2:
+                query = f"Publications of author {i} " + query
+            writer.writerow([f"q{i}", f"2025-05-13T{i % 24:02d}:00:00", query])
+    return path
+
+
+def synthetic_questions(count: int, seed: int = 0) -> List[Tuple[str, str]]:
+    rng = random.Random(seed)
+    return [(f"Q{i:05d}", f"Which papers did Author {rng.randrange(300)} write in {2000 + rng.randrange(20)}?")
+            for i in range(count)]
+
+
+class StandInLLM:
+    """
+    Deterministic replacement for the llms module: answers after a fixed latency, with a
+    SPARQL query chosen by the prompt hash (chatai_models) or with one well-formed output
+    per input item (chatgpt, as sparql_to_question expects).
+    """
+
+    def __init__(self, latency: float = DEFAULT_LATENCY['llm']):
+        self.latency = latency
+
+    def chatai_models(self, prompt: str, model: str):
+        time.sleep(self.latency)
+        seed = int.from_bytes(hashlib.sha1(prompt.encode('utf-8')).digest()[:4], 'big')
+        return {'sparql': synthetic_queries(1, seed=seed)[0]}, 0.9
+
+    def chatgpt(self, prompt: str, n: int = 1):
+        time.sleep(self.latency)
+        # The input batch is the JSON array that ends the prompt
+        starts = [match.start() for match in re.finditer(r'\n\s*\[', prompt)]
+        batch = json.loads(prompt[starts[-1]:]) if starts else []
+        return {'outputs': [{'id': item['id'], 'formal_question': f"Question about {item['id']}",
+                             'entities': []} for item in batch]}
+
+
+class StandInLinker:
+    def __init__(self, latency: float = DEFAULT_LATENCY['entity_linking']):
+        self.latency = latency
+
+    def entity_linker(self, question: str):
+        time.sleep(self.latency)
+        entity = {'normalized_label': 'author', 'entity_type': 'Creator', 'uri': 'https://dblp.org/pid/1'}
+        return [entity], [entity]
+
+
+class StandInSimilarity:
+    """Answers like similarity_index.SimilarityIndex.search after a fixed latency per batch."""
+
+    def __init__(self, latency: float = DEFAULT_LATENCY['similarity']):
+        self.latency = latency
+
+    def search(self, questions: List[str], top_k: int = 5) -> List[list]:
+        time.sleep(self.latency)
+        return [[(f"S{k}", f"Similar question {k}", 0.9, QUERY_TEMPLATES[0], []) for k in range(top_k)]
+                for _ in questions]
+
+
+@contextlib.contextmanager
+def _patched(replacements: List[Tuple[object, str, object]]):
+    saved = [(target, name, getattr(target, name)) for target, name, _ in replacements]
+    try:
+        for target, name, value in replacements:
+            setattr(target, name, value)
+        yield
+    finally:
+        for target, name, value in reversed(saved):
+            setattr(target, name, value)
+
+
+@contextlib.contextmanager
+def stand_ins(sparql_endpoint: str, llm: StandInLLM, linker: StandInLinker):
+    """Points the baseline at local stand-ins, with the response caches switched off."""
+    import baseline
+    import entity_index
+    import llm_cache
+    import sparql_cache
+    import utils
+    prompt = types.SimpleNamespace(QUESTION_TO_SPARQL_PROMPT=(
+        "Schema:\n{dblp_schema}\nExamples:\n{examples}\nSimilar: {similar_questions_pool}\n"
+        "Entities: {entities}\nQuestion: {question}"))
+    with _patched([(baseline, 'llms', llm), (baseline, 'kgqa', linker), (baseline, 'SPARQL_ENDPOINT', sparql_endpoint),
+                   (baseline, 'question_to_sparql_prompt', prompt),
+                   (baseline, 'dblp_schema', types.SimpleNamespace(properties_uri_and_description=DBLP)),
+                   (utils, 'get_examples', lambda key, file_path=None: f"examples for {key}"),
+                   (entity_index, 'get_default_linker', lambda: None),
+                   (llm_cache, 'get_default_cache', lambda: None),
+                   (sparql_cache, 'get_default_cache', lambda: None)]):
+        yield
+
+
+@contextlib.contextmanager
+def sparql_backend(backend: str, latency: float, graph: Graph) -> Iterator[str]:
+    """An endpoint URL over `graph`: a local HTTP endpoint ('http') or an in-process index ('local')."""
+    if backend == 'http':
+        from local_endpoint import serve_graph
+        server, url = serve_graph(graph, delay=latency)
+        try:
+            yield url
+        finally:
+            server.shutdown()
+    else:
+        import local_sparql
+        with tempfile.TemporaryDirectory() as directory:
+            local_sparql.build_index(graph, directory)
+            yield local_sparql.LOCAL_SCHEME + directory
+
+
+def _throughput(count: int, seconds: float) -> dict:
+    return {'items': count, 'seconds': round(seconds, 3), 'per_second': round(count / max(seconds, 1e-9), 1)}
+
+
+def bench_canonicalize(queries: int = 300) -> dict:
+    from sparql_canonical import canonicalize_batch
+    sparql = synthetic_queries(queries)
+    start = time.perf_counter()
+    canonicalize_batch(sparql)
+    return _throughput(queries, time.perf_counter() - start)
+
+
+def bench_dedup(rows: int = 5000, processes: int = 2, chunk_size: int = 1000) -> dict:
+    from dedup_pipeline import deduplicate_logs
+    with tempfile.TemporaryDirectory() as directory:
+        log = synthetic_log(os.path.join(directory, 'log.csv'), rows)
+        start = time.perf_counter()
+        stats = deduplicate_logs([log], os.path.join(directory, 'out.csv'), os.path.join(directory, 'store.sqlite'),
+                                 processes, chunk_size)
+        return dict(_throughput(rows, time.perf_counter() - start), written=stats['written'])
+
+
+def bench_results(rows: int = 20000) -> dict:
+    import sparql_results
+    report = sparql_results.benchmark(rows)
+    return dict(_throughput(rows, report['stream_seconds']), peak_mb=report['stream_peak_mb'])
+
+
+def bench_sparql(queries: int = 500, workers: int = 8, backend: str = 'http',
+                 latency: float = DEFAULT_LATENCY['sparql']) -> dict:
+    from answer_materializer import materialize_answers
+    items = [{'id': i, 'sparql': sparql} for i, sparql in enumerate(synthetic_queries(queries))]
+    with sparql_backend(backend, latency, synthetic_graph()) as endpoint, \
+            tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        counts = materialize_answers(items, os.path.join(directory, 'answers.jsonl'), endpoint, workers)
+        return dict(_throughput(queries, time.perf_counter() - start), statuses=counts)
+
+
+def bench_baseline(questions: int = 200, backend: str = 'http', latency: Optional[Dict[str, float]] = None,
+                   concurrency: Optional[Dict[str, int]] = None) -> dict:
+    import eval_engine
+    latency = dict(DEFAULT_LATENCY, **(latency or {}))
+    with sparql_backend(backend, latency['sparql'], synthetic_graph()) as endpoint, \
+            stand_ins(endpoint, StandInLLM(latency['llm']), StandInLinker(latency['entity_linking'])), \
+            tempfile.TemporaryDirectory() as directory:
+        engine = eval_engine.EvaluationEngine(StandInSimilarity(latency['similarity']), concurrency)
+        try:
+            start = time.perf_counter()
+            engine.run(synthetic_questions(questions), os.path.join(directory, 'predictions.jsonl'))
+            return dict(_throughput(questions, time.perf_counter() - start), stages=engine.timer.summary())
+        finally:
+            engine.close()
+
+
+def bench_sparql_to_question(items: int = 500, batch_size: int = 10, concurrency: int = 4,
+                             latency: float = DEFAULT_LATENCY['llm']) -> dict:
+    import llm_cache
+    import sparql_to_question
+    records = [{'id': str(i), 'query': sparql} for i, sparql in enumerate(synthetic_queries(items))]
+    replacements = [(sparql_to_question, 'llms', StandInLLM(latency)), (llm_cache, 'get_default_cache', lambda: None)]
+    with _patched(replacements), tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'queries.json')
+        with open(input_path, 'w', encoding='utf-8') as f:
+            json.dump(records, f)
+        start = time.perf_counter()
+        sparql_to_question.main(input_path, os.path.join(directory, 'questions.json'), batch_size, concurrency)
+        return _throughput(items, time.perf_counter() - start)
+
+
+BENCHMARKS = {
+    'canonicalize': bench_canonicalize,
+    'dedup': bench_dedup,
+    'results': bench_results,
+    'sparql_http': lambda: bench_sparql(backend='http'),
+    'sparql_local': lambda: bench_sparql(backend='local', workers=1),
+    'baseline': bench_baseline,
+    'sparql_to_question': bench_sparql_to_question,
+}
+
+
+def run_suite(names: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Runs the benchmarks; one that raises is recorded as {'error': ...} and the rest still run."""
+    report = {}
+    for name in names or BENCHMARKS:
+        try:
+            with tracing.span(f"benchmark.{name}"):
+                report[name] = BENCHMARKS[name]()
+        except Exception as e:
+            report[name] = {'error': f"{type(e).__name__}: {e}"}
+            print(f"{name}: failed with {report[name]['error']}")
+            continue
+        print(f"{name}: {report[name]['per_second']}/s over {report[name]['items']} items")
+    return report
+
+
+def compare(report: Dict[str, dict], reference: Dict[str, dict], tolerance: float = 0.2) -> List[str]:
+    """Benchmarks that failed or whose throughput fell more than `tolerance` below the reference run."""
+    regressions = []
+    for name, result in report.items():
+        if 'error' in result:
+            regressions.append(f"{name}: failed with {result['error']}")
+            continue
+        before = reference.get(name, {}).get('per_second')
+        if before and result['per_second'] < before * (1 - tolerance):
+            regressions.append(f"{name}: {result['per_second']}/s, was {before}/s")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline throughput benchmarks with synthetic data and stand-ins.")
+    parser.add_argument("names", nargs='*', help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Earlier report to check for throughput regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--trace", help="Write a Chrome trace of the run and print span percentiles")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    if args.trace:
+        tracing.enable(args.trace)
+    suite_report = run_suite(args.names)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(suite_report, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            found = compare(suite_report, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        raise SystemExit(1 if found else 0)
+    raise SystemExit(1 if any('error' in result for result in suite_report.values()) else 0)
@@ -0,0 +1,320 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+from array import array
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# Every JSON value is a run of int64 tokens, (payload << 3) | tag.
+TAG_NULL, TAG_FALSE, TAG_TRUE, TAG_STRING, TAG_INT, TAG_NUMBER, TAG_LIST, TAG_DICT = range(8)
+# Containers carry the number of tokens of their content, so a field can be skipped without decoding it.
+# Dict content alternates key term ids and values; strings and non-int numbers point into the term table.
+MAX_INLINE_INT = 1 << 59
+
+
+def _id_hash(value) -> int:
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+class _Encoder:
+    def __init__(self):
+        self.term_ids = {}
+        self.terms = []
+        self.tokens = array('q')
+
+    def term(self, text: str) -> int:
+        term_id = self.term_ids.get(text)
+        if term_id is None:
+            term_id = self.term_ids[text] = len(self.terms)
+            self.terms.append(text)
+        return term_id
+
+    def encode(self, value):
+        tokens = self.tokens
+        if value is None:
+            tokens.append(TAG_NULL)
+        elif value is True:
+            tokens.append(TAG_TRUE)
+        elif value is False:
+            tokens.append(TAG_FALSE)
+        elif isinstance(value, str):
+            tokens.append(self.term(value) << 3 | TAG_STRING)
+        elif isinstance(value, int) and -MAX_INLINE_INT < value < MAX_INLINE_INT:
+            zigzag = value << 1 if value >= 0 else (-value << 1) - 1
+            tokens.append(zigzag << 3 | TAG_INT)
+        elif isinstance(value, (int, float)):
+            tokens.append(self.term(json.dumps(value)) << 3 | TAG_NUMBER)
+        elif isinstance(value, (list, dict)):
+            header = len(tokens)
+            tokens.append(0)
+            if isinstance(value, list):
+                tag = TAG_LIST
+                for item in value:
+                    self.encode(item)
+            else:
+                tag = TAG_DICT
+                for key, item in value.items():
+                    tokens.append(self.term(key))
+                    self.encode(item)
+            tokens[header] = (len(tokens) - header - 1) << 3 | tag
+        else:
+            raise TypeError(f"Not a JSON value: {type(value).__name__}")
+
+
+def _read_json(path: str):
+    """Reads a JSON file, or the single JSON file inside a .zip archive."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = [name for name in archive.namelist() if not name.endswith('/')]
+            with archive.open(names[0]) as f:
+                return json.load(io.TextIOWrapper(f, encoding='utf-8'))
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def convert(input_json: str, output_dir: str, records_key: Optional[str] = None, id_key: str = 'id') -> dict:
+    """
+    Converts a JSON dataset into the columnar layout read by ColumnarDataset.
+
+    The records are the top-level array, or the array under `records_key` (found
+    automatically for DBLP-QuAD style {"questions": [...]} files). Other top-level keys
+    are kept in the metadata so that export reproduces the original document.
+
+    Output directory:
+      terms.bin, term_offsets.npy    every distinct string (keys, IRIs, literals) once, UTF-8
+      tokens.npy, record_offsets.npy tagged int64 encoding of each record
+      id_hashes.npy, id_positions.npy  sorted 64-bit hashes of record ids and their record numbers
+      meta.json                      record count, container layout, format version
+
+    Returns:
+      dict: records, terms and on-disk bytes.
+    """
+    data = _read_json(input_json)
+    container = None
+    if isinstance(data, dict):
+        if records_key is None:
+            lists = [key for key, value in data.items() if isinstance(value, list)]
+            if len(lists) != 1:
+                raise ValueError(f"Pass records_key; top-level arrays found: {lists}")
+            records_key = lists[0]
+        # The records array is left as None in place, so export keeps the key order
+        container = {key: (None if key == records_key else value) for key, value in data.items()}
+        records = data[records_key]
+    else:
+        records_key = None
+        records = data
+    del data
+    return write_records(records, output_dir, id_key, records_key, container, os.path.basename(input_json))
+
+
+def write_records(records: Iterable, output_dir: str, id_key: str = 'id', records_key: Optional[str] = None,
+                  container: Optional[dict] = None, source: Optional[str] = None) -> dict:
+    """Writes records (any JSON values) in the columnar layout; see convert."""
+    encoder = _Encoder()
+    record_offsets = array('q', [0])
+    id_hashes = array('q')
+    for record in records:
+        encoder.encode(record)
+        record_offsets.append(len(encoder.tokens))
+        record_id = record.get(id_key) if isinstance(record, dict) else None
+        id_hashes.append(_id_hash(record_id) if record_id is not None else 0)
+    count = len(record_offsets) - 1
+
+    os.makedirs(output_dir, exist_ok=True)
+    encoded_terms = [term.encode('utf-8') for term in encoder.terms]
+    term_offsets = np.zeros(len(encoded_terms) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in encoded_terms], out=term_offsets[1:])
+    with open(os.path.join(output_dir, 'terms.bin'), 'wb') as f:
+        f.write(b''.join(encoded_terms))
+    np.save(os.path.join(output_dir, 'term_offsets.npy'), term_offsets)
+    np.save(os.path.join(output_dir, 'tokens.npy'), np.frombuffer(encoder.tokens, dtype=np.int64))
+    np.save(os.path.join(output_dir, 'record_offsets.npy'), np.frombuffer(record_offsets, dtype=np.int64))
+    hashes = np.frombuffer(id_hashes, dtype=np.int64)
+    order = np.argsort(hashes, kind='stable')
+    np.save(os.path.join(output_dir, 'id_hashes.npy'), hashes[order])
+    np.save(os.path.join(output_dir, 'id_positions.npy'), order.astype(np.int64))
+    meta = {'format': FORMAT_VERSION, 'records': count, 'terms': len(encoder.terms),
+            'records_key': records_key, 'container': container, 'id_key': id_key,
+            'source': source}
+    with open(os.path.join(output_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+    return {'records': count, 'terms': len(encoder.terms), 'bytes': size}
+
+
+class ColumnarDataset:
+    """
+    Read-only, memory-mapped view of a converted dataset.
+
+    Opening only maps the files; records are decoded on access. `get(id)` finds a
+    record through the sorted id hash index, and `column(key)` reads one top-level
+    field of every record without decoding the rest.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta['format'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset format {self.meta['format']}")
+        self.id_key = self.meta['id_key']
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode='r')
+
+        self.term_offsets = load('term_offsets.npy')
+        self.tokens = load('tokens.npy')
+        self.record_offsets = load('record_offsets.npy')
+        self.id_hashes = load('id_hashes.npy')
+        self.id_positions = load('id_positions.npy')
+        terms_path = os.path.join(path, 'terms.bin')
+        self.terms = np.memmap(terms_path, dtype=np.uint8, mode='r') if os.path.getsize(terms_path) else b''
+        self.term_cache = {}
+
+    def __len__(self) -> int:
+        return self.meta['records']
+
+    def term(self, term_id: int) -> str:
+        text = self.term_cache.get(term_id)
+        if text is None:
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            text = bytes(self.terms[start:end]).decode('utf-8')
+            if len(self.term_cache) < 1 << 16:
+                self.term_cache[term_id] = text
+        return text
+
+    def _decode(self, tokens: List[int], position: int):
+        """Decodes the value starting at `position`; returns it with the position after it."""
+        token = tokens[position]
+        tag, payload = token & 7, token >> 3
+        position += 1
+        if tag == TAG_STRING:
+            return self.term(payload), position
+        if tag == TAG_INT:
+            return (payload >> 1) if not payload & 1 else -((payload + 1) >> 1), position
+        if tag == TAG_DICT:
+            end = position + payload
+            value = {}
+            while position < end:
+                key = self.term(tokens[position])
+                value[key], position = self._decode(tokens, position + 1)
+            return value, position
+        if tag == TAG_LIST:
+            end = position + payload
+            value = []
+            while position < end:
+                item, position = self._decode(tokens, position)
+                value.append(item)
+            return value, position
+        if tag == TAG_NUMBER:
+            return json.loads(self.term(payload)), position
+        return (None, False, True)[tag], position
+
+    def _record_tokens(self, index: int) -> List[int]:
+        return self.tokens[self.record_offsets[index]:self.record_offsets[index + 1]].tolist()
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._decode(self._record_tokens(index), 0)[0]
+
+    def __iter__(self) -> Iterator:
+        for index in range(len(self)):
+            yield self[index]
+
+    def field(self, index: int, key: str):
+        """One top-level field of a record, skipping over the others; None if missing."""
+        tokens = self._record_tokens(index)
+        if not tokens or tokens[0] & 7 != TAG_DICT:
+            return None
+        position = 1
+        while position < len(tokens):
+            if self.term(tokens[position]) == key:
+                return self._decode(tokens, position + 1)[0]
+            value_token = tokens[position + 1]
+            position += 2
+            if value_token & 7 in (TAG_LIST, TAG_DICT):
+                position += value_token >> 3
+        return None
+
+    def column(self, key: str) -> list:
+        return [self.field(index, key) for index in range(len(self))]
+
+    def get(self, record_id, default=None):
+        """The record whose id equals `record_id`, found by binary search of the hash index."""
+        target = _id_hash(record_id)
+        position = int(np.searchsorted(self.id_hashes, target))
+        while position < len(self.id_hashes) and self.id_hashes[position] == target:
+            index = int(self.id_positions[position])
+            if str(self.field(index, self.id_key)) == str(record_id):
+                return self[index]
+            position += 1
+        return default
+
+    def to_python(self):
+        """The original document: the record list, or the container dict holding it."""
+        records = list(self)
+        if self.meta['records_key'] is None:
+            return records
+        document = dict(self.meta['container'])
+        document[self.meta['records_key']] = records
+        return document
+
+    def export_json(self, output_json: str, indent: Optional[int] = 4):
+        with open(output_json, 'w', encoding='utf-8') as f:
+            json.dump(self.to_python(), f, ensure_ascii=False, indent=indent)
+
+
+def is_columnar(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, 'meta.json'))
+
+
+def iter_records(path: str, records_key: Optional[str] = None) -> Iterator:
+    """
+    Records of a dataset given either as a converted directory or as (zipped) JSON,
+    where `records_key` selects the array of a dict-shaped document.
+    """
+    if is_columnar(path):
+        yield from ColumnarDataset(path)
+        return
+    data = _read_json(path)
+    yield from (data[records_key] if records_key is not None else data)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert JSON datasets to the columnar format and back.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert_parser = subparsers.add_parser('convert')
+    convert_parser.add_argument("input_json", help="JSON file or zip archive holding one")
+    convert_parser.add_argument("output_dir")
+    convert_parser.add_argument("--records-key", default=None)
+    convert_parser.add_argument("--id-key", default='id')
+    export_parser = subparsers.add_parser('export')
+    export_parser.add_argument("dataset_dir")
+    export_parser.add_argument("output_json")
+    get_parser = subparsers.add_parser('get')
+    get_parser.add_argument("dataset_dir")
+    get_parser.add_argument("id")
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        print(convert(args.input_json, args.output_dir, args.records_key, args.id_key))
+    elif args.command == 'export':
+        ColumnarDataset(args.dataset_dir).export_json(args.output_json)
+    else:
+        start = time.perf_counter()
+        record = ColumnarDataset(args.dataset_dir).get(args.id)
+        elapsed = time.perf_counter() - start
+        print(json.dumps(record, ensure_ascii=False, indent=2))
+        print(f"{elapsed * 1000:.2f} ms")
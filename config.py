@@ -30,4 +30,18 @@ class Config:
             "chatai_api_key": os.environ.get("CHATAI_API_KEY", ""),
             "model": os.environ.get("CHATAI_MODEL", "")
         }
-    }
\ No newline at end of file
+    }
+    LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "")
+    LLM_CACHE_MAX_MB = float(os.environ.get("LLM_CACHE_MAX_MB", "0") or 0)
+    LLM_CACHE_REPLAY = os.environ.get("LLM_CACHE_REPLAY", "").lower() in ("1", "true", "yes")
+    SPARQL_CACHE_PATH = os.environ.get("SPARQL_CACHE_PATH", "")
+    SPARQL_CACHE_MAX_MB = float(os.environ.get("SPARQL_CACHE_MAX_MB", "0") or 0)
+    SPARQL_CACHE_TTL = float(os.environ.get("SPARQL_CACHE_TTL", "0") or 0)
+    SPARQL_CACHE_NEGATIVE_TTL = float(os.environ.get("SPARQL_CACHE_NEGATIVE_TTL", "0") or 0)
+    SIMILARITY_INDEX_PATH = os.environ.get("SIMILARITY_INDEX_PATH", "")
+    SIMILARITY_MODEL = os.environ.get("SIMILARITY_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    ENTITY_INDEX_PATH = os.environ.get("ENTITY_INDEX_PATH", "")
+    ENTITY_CACHE_PATH = os.environ.get("ENTITY_CACHE_PATH", "")
+    SPARQL_COST_TIMEOUTS = os.environ.get("SPARQL_COST_TIMEOUTS", "")
+    SPARQL_MAX_ROWS = int(os.environ.get("SPARQL_MAX_ROWS", "10000") or 0)
+    TRACE_PATH = os.environ.get("TRACE_PATH", "")
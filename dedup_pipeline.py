@@ -0,0 +1,232 @@
+import argparse
+import csv
+import functools
+import hashlib
+import os
+import sqlite3
+from collections import deque
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List, Optional
+
+from tqdm import tqdm
+
+from lexical_dedup import lexical_hashes, lexical_normalize, read_log_chunks, split_queries
+from sparql_canonical import canonicalize_with_rdflib
+import tracing
+
+OUTPUT_FIELDS = ['id', 'datetime', 'question', 'query']
+
+
+class HashStore:
+    """
+    On-disk dedup index: the SHA-1 of every canonical query seen so far, the 64-bit
+    hash of every lexically normalized query, how many rows of each input file have been
+    consumed and how many bytes of each output file are backed by those checkpoints.
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS hashes (hash BLOB PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS lexical_hashes (hash INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS checkpoints (input_file TEXT PRIMARY KEY, rows INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS outputs (output_file TEXT PRIMARY KEY, bytes INTEGER NOT NULL);
+        ''')
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
+
+    def add(self, query_hash: bytes) -> bool:
+        """Adds a hash; returns True if it was not seen before."""
+        cursor = self.connection.execute('INSERT OR IGNORE INTO hashes (hash) VALUES (?)', (query_hash,))
+        return cursor.rowcount == 1
+
+    def seen_lexical(self, hashes: List[int]) -> set:
+        """The subset of `hashes` already stored as lexical hashes."""
+        seen = set()
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            seen.update(row[0] for row in self.connection.execute(
+                f'SELECT hash FROM lexical_hashes WHERE hash IN ({placeholders})', batch))
+        return seen
+
+    def add_lexical(self, hashes: Iterable[int]):
+        self.connection.executemany('INSERT OR IGNORE INTO lexical_hashes (hash) VALUES (?)',
+                                    ((h,) for h in hashes))
+
+    def rows_done(self, input_file: str) -> int:
+        row = self.connection.execute('SELECT rows FROM checkpoints WHERE input_file = ?', (input_file,)).fetchone()
+        return row[0] if row else 0
+
+    def output_bytes(self, output_file: str) -> Optional[int]:
+        row = self.connection.execute('SELECT bytes FROM outputs WHERE output_file = ?', (output_file,)).fetchone()
+        return row[0] if row else None
+
+    def checkpoint(self, input_file: str, rows: int, output_file: str, output_bytes: int):
+        """Commits the hashes added since the last checkpoint together with the new positions."""
+        self.connection.execute('INSERT OR REPLACE INTO checkpoints (input_file, rows) VALUES (?, ?)', (input_file, rows))
+        self.connection.execute('INSERT OR REPLACE INTO outputs (output_file, bytes) VALUES (?, ?)',
+                                (output_file, output_bytes))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def canonicalize_queries(sparql_queries: List[str]) -> List[Optional[str]]:
+    """Worker task: canonicalize a chunk of SPARQL queries with rdflib."""
+    return [canonicalize_with_rdflib(sparql) for sparql in sparql_queries]
+
+
+def _ordered_parallel_map(pool, func, tasks: Iterator[tuple], window: int):
+    """
+    Like pool.imap over (key, argument) pairs, yielding (key, func(argument)) in input order
+    while keeping at most `window` tasks in flight so memory stays bounded.
+    """
+    pending = deque()
+    for key, argument in tasks:
+        pending.append((key, pool.apply_async(func, (argument,))))
+        if len(pending) >= window:
+            key, result = pending.popleft()
+            yield key, result.get()
+    while pending:
+        key, result = pending.popleft()
+        yield key, result.get()
+
+
+def _open_output(output_csv: str, store: HashStore):
+    """Opens the output for appending, truncating anything written after the last checkpoint."""
+    committed = store.output_bytes(output_csv)
+    if committed is None or not os.path.exists(output_csv):
+        outfile = open(output_csv, 'w', newline='', encoding='utf-8')
+        csv.DictWriter(outfile, fieldnames=OUTPUT_FIELDS).writeheader()
+        return outfile
+    with open(output_csv, 'r+b') as f:
+        f.truncate(committed)
+    return open(output_csv, 'a', newline='', encoding='utf-8')
+
+
+def deduplicate_logs(input_csvs: List[str], output_csv: str, store_path: str, processes: Optional[int] = None,
+                     chunk_size: int = 1000, jena_fallback: bool = False) -> dict:
+    """
+    Streams any number of query logs into one deduplicated CSV, keeping first-seen order.
+
+    Dedup runs in two tiers. Chunks are read with pandas, split into description and
+    query and lexically normalized in bulk; exact lexical duplicates are dropped right
+    away. Only the lexically new queries are canonicalized, in parallel, and
+    deduplicated by the SHA-1 of their canonical form.
+
+    Hashes of both tiers and per-file row checkpoints live in a SQLite store, so
+    re-running resumes where the previous run stopped and new log files are
+    deduplicated against everything seen before.
+
+    Args:
+      input_csvs (list of str): Query logs with id, datetime and query columns.
+      output_csv (str): Deduplicated output; appended to on re-runs.
+      store_path (str): SQLite file for hashes and checkpoints.
+      processes (int): Canonicalizer processes (default: all cores).
+      chunk_size (int): Rows per task and per checkpoint.
+      jena_fallback (bool): Send queries rdflib cannot parse to a Jena worker pool.
+
+    Returns:
+      dict: rows read, rows written and rows dropped per tier and reason.
+    """
+    store = HashStore(store_path)
+    output_csv = os.path.abspath(output_csv)
+    stats = {'rows': 0, 'written': 0, 'no_sparql': 0, 'lexical_duplicates': 0, 'canonicalized': 0,
+             'canonical_duplicates': 0, 'not_canonicalized': 0}
+    jena_pool = None
+    if jena_fallback:
+        from jena_pool import JenaCanonicalizerPool
+        jena_pool = JenaCanonicalizerPool()
+    processes = processes or os.cpu_count() or 1
+    # Lexical hashes of chunks that are in flight but not yet checkpointed
+    in_flight_lexical = set()
+
+    def lexical_tier(chunk):
+        with tracing.span('dedup.lexical', rows=len(chunk)):
+            descriptions, sparql = split_queries(chunk['query'])
+            hashes = lexical_hashes(lexical_normalize(sparql))
+            candidates = (sparql != '') & ~hashes.duplicated() & ~hashes.isin(in_flight_lexical)
+            already_stored = store.seen_lexical(hashes[candidates].tolist())
+        new = candidates & ~hashes.isin(already_stored)
+        new_hashes = hashes[new].tolist()
+        in_flight_lexical.update(new_hashes)
+        return (chunk, descriptions, sparql, new, new_hashes), sparql[new].tolist()
+
+    traced = tracing.get_tracer() is not None
+    canonicalize = canonicalize_queries
+    if traced:
+        # Canonicalization runs in worker processes; their spans travel back with the results
+        canonicalize = functools.partial(tracing.call_in_worker, 'canonicalize', canonicalize_queries)
+
+    try:
+        with _open_output(output_csv, store) as outfile, Pool(processes) as pool:
+            writer = csv.DictWriter(outfile, fieldnames=OUTPUT_FIELDS)
+            for input_csv in input_csvs:
+                input_csv = os.path.abspath(input_csv)
+                rows_done = store.rows_done(input_csv)
+                tasks = (lexical_tier(chunk) for chunk in read_log_chunks(input_csv, chunk_size, rows_done))
+                progress = tqdm(desc=os.path.basename(input_csv), unit="query", initial=rows_done)
+
+                for key, canonicals in _ordered_parallel_map(pool, canonicalize, tasks, 2 * processes):
+                    if traced:
+                        canonicals, worker_span = canonicals
+                        tracing.record_worker_span(worker_span)
+                    chunk, descriptions, sparql, new, new_hashes = key
+                    if jena_pool is not None:
+                        missing = [i for i, canonical in enumerate(canonicals) if canonical is None]
+                        new_sparql = sparql[new].tolist()
+                        with tracing.span('canonicalize.jena', queries=len(missing)):
+                            fallbacks = jena_pool.canonicalize_many([new_sparql[i] for i in missing])
+                        for i, canonical in zip(missing, fallbacks):
+                            canonicals[i] = canonical
+
+                    canonical_of = dict(zip(new[new].index, canonicals))
+                    for index, row in zip(chunk.index, chunk.itertuples(index=False)):
+                        if sparql[index] == '':
+                            stats['no_sparql'] += 1
+                        elif index not in canonical_of:
+                            stats['lexical_duplicates'] += 1
+                        elif canonical_of[index] is None:
+                            stats['not_canonicalized'] += 1
+                        elif store.add(hashlib.sha1(canonical_of[index].encode('utf-8')).digest()):
+                            writer.writerow({'id': row.id, 'datetime': row.datetime,
+                                             'question': descriptions[index], 'query': sparql[index]})
+                            stats['written'] += 1
+                        else:
+                            stats['canonical_duplicates'] += 1
+                    stats['canonicalized'] += len(canonicals)
+
+                    store.add_lexical(new_hashes)
+                    outfile.flush()
+                    os.fsync(outfile.fileno())
+                    rows_done += len(chunk)
+                    store.checkpoint(input_csv, rows_done, output_csv, os.fstat(outfile.fileno()).st_size)
+                    in_flight_lexical.difference_update(new_hashes)
+                    stats['rows'] += len(chunk)
+                    progress.update(len(chunk))
+                progress.close()
+    finally:
+        if jena_pool is not None:
+            jena_pool.close()
+        stats['unique_total'] = len(store)
+        store.close()
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Resumable, parallel deduplication of DBLP SPARQL query logs.")
+    parser.add_argument("input_csvs", nargs='+', help="query log CSVs, processed in the given order")
+    parser.add_argument("--output", default="log_data/dedup/deduplicated_queries.csv")
+    parser.add_argument("--store", default="log_data/dedup/dedup_index.sqlite")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--jena-fallback", action='store_true', help="canonicalize rdflib failures with Jena")
+    args = parser.parse_args()
+
+    result = deduplicate_logs(args.input_csvs, args.output, args.store, args.processes, args.chunk_size,
+                              args.jena_fallback)
+    for key, value in result.items():
+        print(f"{key}: {value}")
@@ -57,13 +57,28 @@ def canonicalize_with_jena(sparql_query: str, jena_path: str = APACHE_JEANA_ARQ_
         return None
 
 
+def iter_chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 if __name__ == '__main__':
+    from jena_pool import JenaCanonicalizerPool
+    from sparql_canonical import canonicalize_batch
 
     input_csv = "log_data/dblp-sparql-logs-2025-05-13.csv"
     output_csv = "log_data/dedup/deduplicated_queries.csv"
+    chunk_size = 2000
 
     with open(input_csv, newline='', encoding='utf-8') as infile, \
-            open(output_csv, 'w', newline='', encoding='utf-8') as outfile:
+            open(output_csv, 'w', newline='', encoding='utf-8') as outfile, \
+            JenaCanonicalizerPool() as pool:
 
         reader = csv.DictReader(infile)
         fieldnames = ['id', 'datetime', 'question', 'query']  # New output columns
@@ -72,28 +87,30 @@ if __name__ == '__main__':
 
         seen_hashes = set()
         total = 400000
-        for row in tqdm(reader, total=total, desc="Processing queries", unit="query"):
-            full_query = row['query']
-            desc, sparql = split_leading_string(full_query)
-
+        progress = tqdm(total=total, desc="Processing queries", unit="query")
+        for rows in iter_chunks(reader, chunk_size):
+            split_rows = [(row, *split_leading_string(row['query'])) for row in rows]
             # Skip if there's no valid SPARQL portion
-            if not sparql.strip():
-                continue
-
-            # Canonicalize (replace with your method or Jena wrapper)
-            canonical = canonicalize_with_jena(sparql)
-            if canonical is None:
-                continue
-
-            # Hash for deduplication
-            query_hash = hashlib.sha1(canonical.encode('utf-8')).hexdigest()
-
-            if query_hash not in seen_hashes:
-                seen_hashes.add(query_hash)
-                writer.writerow({
-                    'id': row['id'],
-                    'datetime': row['datetime'],
-                    'question': desc,
-                    'query': sparql
-                })
-    print(f"Deduplicated {len(seen_hashes)} unique queries saved to {output_csv}")
\ No newline at end of file
+            split_rows = [(row, desc, sparql) for row, desc, sparql in split_rows if sparql.strip()]
+
+            # Canonicalize in-process with rdflib; only what rdflib cannot parse goes to the Jena pool
+            canonicals = canonicalize_batch([sparql for _, _, sparql in split_rows], pool.canonicalize_many)
+
+            for (row, desc, sparql), canonical in zip(split_rows, canonicals):
+                if canonical is None:
+                    continue
+
+                # Hash for deduplication
+                query_hash = hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+                if query_hash not in seen_hashes:
+                    seen_hashes.add(query_hash)
+                    writer.writerow({
+                        'id': row['id'],
+                        'datetime': row['datetime'],
+                        'question': desc,
+                        'query': sparql
+                    })
+            progress.update(len(rows))
+        progress.close()
+    print(f"Deduplicated {len(seen_hashes)} unique queries saved to {output_csv}")
@@ -0,0 +1,110 @@
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+
+class DiskCache:
+    """
+    Thread-safe SQLite key/value store for JSON-serializable values.
+
+    Entries can expire after a time-to-live and are evicted least-recently-used first
+    once their total size exceeds `max_bytes`. A read-only cache never writes, not even
+    access times, and opens an existing database only.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, ttl: Optional[float] = None,
+                 read_only: bool = False):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if read_only:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Read-only cache {path} does not exist")
+            uri = pathlib.Path(path).resolve().as_uri() + '?mode=ro'
+            self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,
+                    last_used REAL NOT NULL, expires REAL);
+                CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            ''')
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def lookup(self, key: str, validate: Optional[Callable[[Any], bool]] = None) -> Tuple[bool, object]:
+        """
+        Returns (found, value), so that cached None values can be told from misses.
+        Values rejected by `validate` are reported, and counted, as misses.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute('SELECT value, expires, size FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[1] is not None and row[1] < now:
+                if not self.read_only:
+                    self.connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+                    self.connection.commit()
+                    self.total_bytes -= row[2]
+                row = None
+            value = json.loads(row[0]) if row is not None else None
+            if row is None or (validate is not None and not validate(value)):
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            if not self.read_only:
+                self.connection.execute('UPDATE entries SET last_used = ? WHERE key = ?', (now, key))
+                self.connection.commit()
+        return True, value
+
+    def get(self, key: str):
+        return self.lookup(key)[1]
+
+    def put(self, key: str, value, ttl: Optional[float] = None):
+        """Stores a value; `ttl` overrides the cache-wide time-to-live for this entry."""
+        if self.read_only:
+            return
+        try:
+            serialized = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        size = len(serialized.encode('utf-8'))
+        now = time.time()
+        ttl = ttl if ttl is not None else self.ttl
+        expires = now + ttl if ttl else None
+        with self.lock:
+            old = self.connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self.connection.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, last_used, expires) VALUES (?, ?, ?, ?, ?)',
+                (key, serialized, size, now, expires))
+            self.total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        if not self.max_bytes or self.total_bytes <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self.connection.execute('SELECT key, size FROM entries ORDER BY last_used'):
+            if self.total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self.connection.executemany('DELETE FROM entries WHERE key = ?', evicted)
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries = self.connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'entries': entries, 'bytes': self.total_bytes}
+
+    def close(self):
+        self.connection.close()
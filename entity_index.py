@@ -0,0 +1,314 @@
+import argparse
+import bisect
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import Config
+from disk_cache import DiskCache
+
+MAX_MENTION_TOKENS = 8
+# Share of the training occurrences a URI needs for a label to count as unambiguous
+DOMINANT_SHARE = 0.9
+ENTITY_TYPES = (('/pid/', 'Creator'), ('/streams/', 'Stream'), ('/rec/', 'Publication'))
+# Tokens a question may leave uncovered by mentions and still be resolved locally
+STOPWORDS = frozenset('''
+a about after all an and any are as at be before between by can did do does for from give had has have how in
+is it list me of on or show since than that the their them there these they this those to until was were what
+when where which who whom whose with within would you
+'''.split())
+
+
+def normalize_label(text: str) -> str:
+    """Lower-cased, accent-free, punctuation-free label with single spaces."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return ' '.join(re.findall(r'\w+', text))
+
+
+def entity_type(uri: str) -> str:
+    for marker, name in ENTITY_TYPES:
+        if marker in uri:
+            return name
+    return 'Entity'
+
+
+def _question_texts(record: dict) -> List[str]:
+    texts = []
+    for key in ('formal_question', 'original_query', 'question'):
+        value = record.get(key)
+        if isinstance(value, dict):
+            value = value.get('string')
+        if isinstance(value, str):
+            texts.append(value)
+    return texts
+
+
+class LabelIndex:
+    """
+    Normalized mention label -> URI counts, built from the mention/uri pairs that
+    sparql_to_question extracts. Exact lookups are a dict access; prefix lookups
+    bisect a sorted label list.
+
+    `words` are the tokens the training questions use outside their entity mentions
+    ("papers", "published", ...), minus tokens of any label; together with STOPWORDS
+    they tell whether the mentions found cover a whole question.
+    """
+
+    def __init__(self, labels: Optional[Dict[str, Dict[str, int]]] = None, words: Iterable[str] = ()):
+        self.labels = labels or {}
+        self.sorted_labels = sorted(self.labels)
+        self.words = frozenset(words)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict], entities_key: str = 'entities') -> 'LabelIndex':
+        labels = {}
+        context = set()
+        for record in records:
+            mentions = []
+            for entity in record.get(entities_key) or []:
+                if not isinstance(entity, dict) or not entity.get('mention') or not entity.get('uri'):
+                    continue
+                label = normalize_label(entity['mention'])
+                uri = entity['uri'].strip().strip('<>')
+                if label:
+                    counts = labels.setdefault(label, {})
+                    counts[uri] = counts.get(uri, 0) + 1
+                    mentions.append(label)
+            for text in _question_texts(record):
+                text = f" {normalize_label(text)} "
+                for label in sorted(mentions, key=len, reverse=True):
+                    text = text.replace(f" {label} ", ' | ')
+                context.update(text.split())
+        label_tokens = {token for label in labels for token in label.split()}
+        return cls(labels, context - label_tokens - {'|'})
+
+    @classmethod
+    def load(cls, path: str) -> 'LabelIndex':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if 'labels' in data and 'words' in data:
+            return cls(data['labels'], data['words'])
+        # Indexes saved before context words were kept: every question gets checked remotely
+        return cls(data)
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'labels': self.labels, 'words': sorted(self.words)}, f, ensure_ascii=False)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def exact(self, label: str) -> Dict[str, int]:
+        return self.labels.get(label, {})
+
+    def prefix(self, label: str, limit: int = 10) -> List[str]:
+        """Labels starting with `label` on a token boundary, at most `limit`."""
+        start = bisect.bisect_left(self.sorted_labels, label)
+        matches = []
+        for candidate in self.sorted_labels[start:]:
+            if not candidate.startswith(label) or len(matches) >= limit:
+                break
+            if len(candidate) == len(label) or candidate[len(label)] == ' ':
+                matches.append(candidate)
+        return matches
+
+    def candidates(self, label: str) -> Dict[str, int]:
+        """URI counts of the exact label, else merged over the labels it is a prefix of."""
+        counts = dict(self.exact(label))
+        if not counts:
+            for candidate in self.prefix(label):
+                for uri, count in self.labels[candidate].items():
+                    counts[uri] = counts.get(uri, 0) + count
+        return counts
+
+    def find_mentions(self, question: str) -> List[Tuple[str, Dict[str, int]]]:
+        """
+        Greedy longest-first, non-overlapping mentions in a question: token windows that
+        are exact labels, or (two tokens and more) prefixes of labels.
+        """
+        return self.scan(question)[0]
+
+    def scan(self, question: str) -> Tuple[List[Tuple[str, Dict[str, int]]], List[str]]:
+        """(mentions, uncovered): the mentions of find_mentions, and the tokens outside them."""
+        tokens = normalize_label(question).split()
+        mentions, uncovered = [], []
+        i = 0
+        while i < len(tokens):
+            for size in range(min(MAX_MENTION_TOKENS, len(tokens) - i), 0, -1):
+                window = ' '.join(tokens[i:i + size])
+                counts = self.exact(window) if size == 1 else self.candidates(window)
+                if counts:
+                    mentions.append((window, counts))
+                    i += size
+                    break
+            else:
+                uncovered.append(tokens[i])
+                i += 1
+        return mentions, uncovered
+
+    def is_context(self, token: str) -> bool:
+        """Whether a token outside the mentions is question wording rather than a possible entity."""
+        return token in STOPWORDS or token in self.words or token.isdigit()
+
+
+def _resolve(counts: Dict[str, int]) -> Optional[str]:
+    """The URI of an unambiguous mention, or None."""
+    uri, count = max(counts.items(), key=lambda item: item[1])
+    return uri if count >= DOMINANT_SHARE * sum(counts.values()) else None
+
+
+def _entity(mention: str, uri: str, score: float) -> dict:
+    return {'normalized_label': mention, 'entity_type': entity_type(uri), 'uri': uri, 'score': round(score, 4),
+            'source': 'local'}
+
+
+class EntityLinker:
+    """
+    Links questions locally where the label index covers them and is unambiguous, and
+    falls back to the remote linker (kgqa.entity_linker by default) otherwise. A
+    question is covered when every token outside the detected mentions is question
+    wording (see LabelIndex.is_context); a name missing from the index sends the
+    question to the remote linker instead of silently losing that entity.
+
+    Remote responses are memoized in a DiskCache keyed by the normalized question, so
+    the same question never goes over the network twice. `link_many` resolves a batch
+    locally first and sends only the ambiguous questions to the remote linker, several
+    at a time and each distinct question once. Without a remote linker (offline) the
+    local result is returned even when partial.
+    """
+
+    def __init__(self, index: LabelIndex, remote: Optional[Callable[[str], tuple]] = None,
+                 cache: Optional[DiskCache] = None, concurrency: int = 4):
+        self.index = index
+        self.remote = remote
+        self.cache = cache
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.stats = {'local': 0, 'cached': 0, 'remote': 0}
+
+    def _count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def link_local(self, question: str) -> Tuple[list, list, bool]:
+        """(all_entities, selected_entities, resolved) from the label index alone."""
+        all_entities, selected = [], []
+        mentions, uncovered = self.index.scan(question)
+        resolved = all(self.index.is_context(token) for token in uncovered)
+        for mention, counts in mentions:
+            total = sum(counts.values())
+            for uri, count in sorted(counts.items(), key=lambda item: -item[1]):
+                all_entities.append(_entity(mention, uri, count / total))
+            uri = _resolve(counts)
+            if uri is None:
+                resolved = False
+            else:
+                selected.append(_entity(mention, uri, counts[uri] / total))
+        return all_entities, selected, resolved and bool(selected)
+
+    @staticmethod
+    def cache_key(question: str) -> str:
+        return hashlib.sha256(normalize_label(question).encode('utf-8')).hexdigest()
+
+    def _remote(self, question: str) -> tuple:
+        if self.cache is not None:
+            found, value = self.cache.lookup(self.cache_key(question))
+            if found:
+                self._count('cached')
+                return tuple(value)
+        all_entities, selected = self.remote(question)
+        self._count('remote')
+        if self.cache is not None:
+            self.cache.put(self.cache_key(question), [all_entities, selected])
+        return all_entities, selected
+
+    def link(self, question: str) -> tuple:
+        """Same contract as kgqa.entity_linker: (all_entities, selected_entities)."""
+        all_entities, selected, resolved = self.link_local(question)
+        if resolved or self.remote is None:
+            self._count('local')
+            return all_entities, selected
+        return self._remote(question)
+
+    def link_many(self, questions: Sequence[str], concurrency: Optional[int] = None) -> List[Optional[tuple]]:
+        """
+        `link` for a batch. A question whose remote call fails gets None and nothing is
+        memoized for it, so `link` retries it on its own later; one failure does not
+        abort the batch.
+        """
+        results = [None] * len(questions)
+        unresolved = {}
+        for i, question in enumerate(questions):
+            all_entities, selected, resolved = self.link_local(question)
+            if resolved or self.remote is None:
+                self._count('local')
+                results[i] = (all_entities, selected)
+            else:
+                unresolved.setdefault(self.cache_key(question), []).append(i)
+        if unresolved:
+            positions = list(unresolved.values())
+
+            def remote(indices):
+                try:
+                    return self._remote(questions[indices[0]])
+                except Exception as e:
+                    print(f"Entity linking failed for {questions[indices[0]]!r}: {e}")
+                    return None
+
+            with ThreadPoolExecutor(max_workers=concurrency or self.concurrency) as executor:
+                linked = executor.map(remote, positions)
+                for indices, result in zip(positions, linked):
+                    for i in indices:
+                        results[i] = result
+        return results
+
+    def prefetch(self, questions: Sequence[str], concurrency: Optional[int] = None):
+        """Fills the memo cache for the ambiguous ones among `questions`."""
+        if self.cache is not None:
+            self.link_many(questions, concurrency)
+
+
+_default_linker = None
+_default_linker_lock = threading.Lock()
+
+
+def get_default_linker() -> Optional[EntityLinker]:
+    """Linker over ENTITY_INDEX_PATH with the ENTITY_CACHE_PATH memo, or None if neither is set."""
+    global _default_linker
+    if not Config.ENTITY_INDEX_PATH and not Config.ENTITY_CACHE_PATH:
+        return None
+    with _default_linker_lock:
+        if _default_linker is None:
+            import kgqa
+            index = LabelIndex.load(Config.ENTITY_INDEX_PATH) if Config.ENTITY_INDEX_PATH else LabelIndex()
+            cache = DiskCache(Config.ENTITY_CACHE_PATH) if Config.ENTITY_CACHE_PATH else None
+            _default_linker = EntityLinker(index, kgqa.entity_linker, cache)
+    return _default_linker
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or query the local entity label index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build')
+    build_parser.add_argument("input_json", nargs='+', help="Records with entities: [{mention, uri}]")
+    build_parser.add_argument("--output", default=Config.ENTITY_INDEX_PATH or "entity_index.json")
+    link_parser = subparsers.add_parser('link')
+    link_parser.add_argument("questions", nargs='+')
+    link_parser.add_argument("--index", default=Config.ENTITY_INDEX_PATH or "entity_index.json")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        import columnar_dataset
+        records = (record for path in args.input_json for record in columnar_dataset.iter_records(path))
+        index = LabelIndex.from_records(records)
+        index.save(args.output)
+        print(f"{len(index)} labels written to {args.output}")
+    else:
+        linker = EntityLinker(LabelIndex.load(args.index))
+        for question, (_, selected) in zip(args.questions, linker.link_many(args.questions)):
+            print(question, json.dumps(selected, ensure_ascii=False))
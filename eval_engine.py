@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import baseline
+import entity_index
+import similarity_index
+import sparql_cost
+import utils
+
+STAGES = ('similarity', 'entity_linking', 'llm', 'sparql')
+DEFAULT_CONCURRENCY = {'similarity': 1, 'entity_linking': 4, 'llm': 8, 'sparql': 4}
+
+
+class StageTimer:
+    """Collects per-stage latencies from many threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            self.latencies.setdefault(stage, []).append(seconds)
+
+    def summary(self, percentiles=(50, 90, 95, 99)) -> Dict[str, dict]:
+        report = {}
+        with self.lock:
+            for stage, values in self.latencies.items():
+                values = np.asarray(values)
+                report[stage] = {'count': len(values), 'total_s': round(float(values.sum()), 3)}
+                for p, value in zip(percentiles, np.percentile(values, percentiles)):
+                    report[stage][f"p{p}_ms"] = round(float(value) * 1000, 1)
+                report[stage]['max_ms'] = round(float(values.max()) * 1000, 1)
+        return report
+
+
+def print_summary(report: Dict[str, dict]):
+    for stage, row in report.items():
+        print(f"{stage:>16}: " + ", ".join(f"{key}={value}" for key, value in row.items()))
+
+
+class EvaluationEngine:
+    """
+    Answers test questions through the baseline stages with separate bounded
+    concurrency per stage.
+
+    Each question is driven by its own thread that submits its work to the stage pools
+    in turn (similarity search and entity linking run side by side), so while one
+    question waits on the LLM others are linking entities or querying the endpoint.
+    Predictions are appended to a JSONL journal as they finish; questions whose id is
+    already journaled are skipped, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, qsim, concurrency: Optional[Dict[str, int]] = None, top_k: int = 5):
+        self.qsim = qsim
+        self.top_k = top_k
+        self.concurrency = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+        self.pools = {stage: ThreadPoolExecutor(max_workers=self.concurrency[stage], thread_name_prefix=stage)
+                      for stage in STAGES}
+        self.timer = StageTimer()
+
+    def _run(self, stage: str, func, *args):
+        def timed():
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.timer.record(stage, time.perf_counter() - start)
+        return self.pools[stage].submit(timed)
+
+    def answer(self, question: str) -> dict:
+        """Same result as baseline.answer_questions, computed on the stage pools."""
+        start = time.perf_counter()
+        try:
+            similar = self._run('similarity', baseline.find_similar_questions, self.qsim, question, self.top_k)
+            linked = self._run('entity_linking', baseline.link_entities, question)
+            similar_questions, similar_questions_pool = similar.result()
+            all_entities, selected_entities = linked.result()
+            sparql_query, confidence = self._run('llm', baseline.generate_sparql, question, selected_entities,
+                                                 similar_questions_pool).result()
+            if 'sparql' not in sparql_query:
+                return None
+            sparql = sparql_query['sparql']
+            plan = sparql_cost.plan(sparql)
+            answer = self._run('sparql', baseline.execute_sparql, sparql, plan).result()
+            if answer is None:
+                logging.warning(f"No answer for a {plan.cost} query ({', '.join(plan.issues)})")
+                return {}
+            return {'answer': answer, 'sparql': sparql, 'confidence': confidence,
+                    'all_entities': all_entities, 'selected_entities': selected_entities,
+                    'similar_questions': similar_questions, 'top_k': self.top_k,
+                    'sparql_plan': plan.report(answer)}
+        except Exception as e:
+            logging.error(f"An error occurred during SPARQL Generation: {e}", exc_info=e)
+            return {}
+        finally:
+            self.timer.record('question', time.perf_counter() - start)
+
+    def run(self, questions: List[Tuple[str, str]], journal_path: str) -> dict:
+        """
+        Answers (id, question) pairs not yet in the journal.
+
+        Returns:
+          dict: number of answered questions and the per-stage latency report.
+        """
+        done = {str(qid) for record in utils.load_jsonl(journal_path) for qid in record}
+        pending = [(qid, question) for qid, question in questions if str(qid) not in done]
+        print(f"{len(questions) - len(pending)} of {len(questions)} questions already answered")
+        if hasattr(self.qsim, 'prefetch'):
+            # A similarity index answers all pending questions in a few batched searches
+            start = time.perf_counter()
+            self.qsim.prefetch([question for _, question in pending], self.top_k)
+            self.timer.record('similarity_prefetch', time.perf_counter() - start)
+        linker = entity_index.get_default_linker()
+        if linker is not None:
+            # Links locally where possible and memoizes the remote answers for the rest
+            start = time.perf_counter()
+            linker.prefetch([question for _, question in pending], self.concurrency['entity_linking'])
+            self.timer.record('entity_linking_prefetch', time.perf_counter() - start)
+
+        lock = threading.Lock()
+
+        def drive(item):
+            qid, question = item
+            prediction = self.answer(question)
+            if hasattr(self.qsim, 'discard'):
+                self.qsim.discard([question], self.top_k)
+            with lock:
+                utils.append_jsonl([{qid: prediction}], journal_path)
+
+        in_flight = sum(self.concurrency.values())
+        with ThreadPoolExecutor(max_workers=in_flight, thread_name_prefix='question') as drivers:
+            list(drivers.map(drive, pending))
+
+        report = self.timer.summary()
+        print_summary(report)
+        return {'answered': len(pending), 'latency': report}
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+
+
+def evaluate(questions: List[Tuple[str, str]], prediction_file: str, qsim=None,
+             concurrency: Optional[Dict[str, int]] = None) -> dict:
+    """
+    Runs the engine with a JSONL journal next to `prediction_file`, then writes
+    `prediction_file` once in the [{id: prediction}] format the postprocess_* functions read.
+    """
+    if qsim is None:
+        qsim = similarity_index.get_default_index() or baseline.question_similarity.QuestionSimilarityIdentifier()
+    journal_path = os.path.splitext(prediction_file)[0] + '.jsonl'
+    if not os.path.exists(journal_path) and os.path.exists(prediction_file):
+        # Seed the journal with predictions from runs made before journaling existed
+        utils.append_jsonl(utils.load_json_data(prediction_file), journal_path)
+    engine = EvaluationEngine(qsim, concurrency)
+    try:
+        result = engine.run(questions, journal_path)
+    finally:
+        engine.close()
+    utils.write_to_json(utils.load_jsonl(journal_path), prediction_file)
+    return result
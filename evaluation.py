@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+DEFAULT_KS = (1, 5, 10)
+METRICS = ('precision', 'recall', 'f1', 'exact_match')
+
+
+def answer_tokens(answer) -> List[str]:
+    """
+    Flattens one answer into strings: booleans (ASK) become "true"/"false", result
+    rows (dicts, as from utils.extruct_values) contribute all their values, and raw
+    SPARQL JSON results are read like postprocess_predictions_for_eval_dblp_quad does.
+    """
+    if answer is None:
+        return []
+    if isinstance(answer, dict):
+        if 'boolean' in answer:
+            return answer_tokens(answer['boolean'])
+        bindings = answer.get('results', {}).get('bindings', [])
+        return [value['value'] for binding in bindings for value in binding.values()]
+    if isinstance(answer, bool):
+        return ['true' if answer else 'false']
+    if isinstance(answer, str):
+        return [answer]
+    tokens = []
+    for item in answer:
+        if isinstance(item, dict):
+            tokens.extend(str(value) for value in item.values())
+        elif isinstance(item, bool):
+            tokens.append('true' if item else 'false')
+        elif item is not None:
+            tokens.append(str(item))
+    return tokens
+
+
+def answer_pairs(records: Iterable) -> Dict[str, List[str]]:
+    """
+    Reads answers given as [{"id": ..., "answer": ...}] (the postprocess_* outputs) or
+    as [{id: prediction}] (prediction files as written by the eval engine).
+    """
+    pairs = {}
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        if 'id' in record and 'answer' in record:
+            pairs[str(record['id'])] = answer_tokens(record['answer'])
+            continue
+        for qid, prediction in record.items():
+            answer = prediction.get('answer') if isinstance(prediction, dict) else None
+            pairs[str(qid)] = answer_tokens(answer)
+    return pairs
+
+
+def _flatten(ids: Sequence[str], answers: Dict[str, List[str]]):
+    """(question index, answer string) arrays in answer order, questions in `ids` order."""
+    lengths = np.fromiter((len(answers.get(qid, ())) for qid in ids), dtype=np.int64, count=len(ids))
+    questions = np.repeat(np.arange(len(ids), dtype=np.int64), lengths)
+    strings = [answer for qid in ids for answer in answers.get(qid, ())]
+    return questions, strings
+
+
+class AnswerSetEvaluator:
+    """
+    Scores predicted answer sets against gold answer sets for a whole test set at once.
+
+    Gold answer strings are interned to integer ids once; each prediction file is then
+    mapped onto the same ids, and every (question, answer) pair becomes one int64 key,
+    so true positives, set sizes and Hits@k are NumPy set operations and bincounts over
+    flat arrays instead of per-question Python loops. Sets compare after deduplication;
+    Hits@k looks at the first k distinct predicted answers in their given order.
+
+    Conventions: an empty prediction for an empty gold set scores 1 on every metric;
+    otherwise an empty side scores 0.
+    """
+
+    def __init__(self, gold: Dict[str, List[str]], templates: Optional[Dict[str, str]] = None):
+        self.ids = list(gold)
+        self.templates = templates or {}
+        questions, strings = _flatten(self.ids, gold)
+        codes, self.vocabulary = pd.factorize(pd.Series(strings, dtype=object))
+        self.vocabulary = pd.Index(self.vocabulary)
+        self.gold_keys = np.unique(questions * (len(self.vocabulary) + 1) + codes)
+        self.gold_counts = np.bincount(self.gold_keys // (len(self.vocabulary) + 1), minlength=len(self.ids))
+
+    def score(self, predictions: Dict[str, List[str]], ks: Sequence[int] = DEFAULT_KS) -> pd.DataFrame:
+        """Per-question metrics for every gold question; missing predictions count as empty."""
+        questions, strings = _flatten(self.ids, predictions)
+        codes = self.vocabulary.get_indexer(pd.Series(strings, dtype=object))
+        unknown = codes < 0
+        # Answers never seen in gold cannot be hits; they only count towards the set size
+        width = len(self.vocabulary) + 1 + int(unknown.sum())
+        if unknown.any():
+            codes[unknown] = len(self.vocabulary) + 1 + pd.factorize(pd.Series(strings, dtype=object)[unknown])[0]
+        keys = questions * width + codes
+
+        # Distinct predictions in their original order, with their rank within the question
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        keys, questions = keys[first], questions[first]
+        ranks = np.arange(len(keys)) - np.searchsorted(questions, questions, side='left')
+        gold_width = len(self.vocabulary) + 1
+        gold_keys = (self.gold_keys // gold_width) * width + self.gold_keys % gold_width
+        hits = np.isin(keys, gold_keys, assume_unique=True)
+
+        n = len(self.ids)
+        tp = np.bincount(questions[hits], minlength=n)
+        predicted = np.bincount(questions, minlength=n)
+        gold = self.gold_counts
+        both_empty = (gold == 0) & (predicted == 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predicted > 0, tp / predicted, both_empty.astype(float))
+            recall = np.where(gold > 0, tp / gold, both_empty.astype(float))
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        frame = pd.DataFrame({
+            'id': self.ids,
+            'template': [self.templates.get(qid) for qid in self.ids],
+            'gold': gold, 'predicted': predicted, 'correct': tp,
+            'precision': precision, 'recall': recall, 'f1': f1,
+            'exact_match': ((tp == gold) & (tp == predicted)).astype(float),
+        })
+        for k in ks:
+            hit_at_k = np.bincount(questions[hits & (ranks < k)], minlength=n) > 0
+            frame[f"hits@{k}"] = (hit_at_k | both_empty).astype(float)
+        return frame
+
+
+def bootstrap_ci(values: np.ndarray, resamples: int = 1000, alpha: float = 0.05, seed: int = 0,
+                 block: int = 200) -> np.ndarray:
+    """
+    Percentile bootstrap confidence intervals of the column means of `values` (questions x
+    metrics). All metrics share the resamples; each block of resamples is a matrix of
+    per-question draw counts, so the resampled means are one matrix product.
+
+    Returns:
+      np.ndarray: (metrics, 2) lower and upper bounds.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    n = len(values)
+    if n == 0 or resamples <= 0:
+        return np.full((values.shape[1], 2), np.nan)
+    rng = np.random.default_rng(seed)
+    means = []
+    for start in range(0, resamples, block):
+        size = min(block, resamples - start)
+        draws = rng.integers(0, n, size=(size, n)) + np.arange(size)[:, None] * n
+        counts = np.bincount(draws.ravel(), minlength=size * n).reshape(size, n)
+        means.append(counts @ values / n)
+    return np.quantile(np.concatenate(means), [alpha / 2, 1 - alpha / 2], axis=0).T
+
+
+def summarize(frame: pd.DataFrame, resamples: int = 1000, seed: int = 0) -> dict:
+    """Macro averages with bootstrap intervals, overall and per template."""
+    metrics = [column for column in frame.columns if column in METRICS or column.startswith('hits@')]
+
+    def aggregate(group: pd.DataFrame) -> dict:
+        values = group[metrics].to_numpy(dtype=float)
+        intervals = bootstrap_ci(values, resamples, seed=seed)
+        row = {'questions': len(group)}
+        if not len(group):
+            return row
+        for metric, mean, (low, high) in zip(metrics, values.mean(axis=0), intervals):
+            row[metric] = {'mean': round(float(mean), 4), 'ci': [round(float(low), 4), round(float(high), 4)]}
+        return row
+
+    summary = {'overall': aggregate(frame)}
+    if frame['template'].notna().any():
+        summary['templates'] = {str(template): aggregate(group)
+                                for template, group in frame.groupby('template', sort=True)}
+    return summary
+
+
+def load_templates(test_set: str, records_key: Optional[str] = None, template_key: str = 'template_id') -> Dict[str, str]:
+    """id -> template of a test set in JSON or columnar form."""
+    import columnar_dataset
+    return {str(record['id']): record.get(template_key)
+            for record in columnar_dataset.iter_records(test_set, records_key) if template_key in record}
+
+
+def evaluate_files(gold_file: str, prediction_files: List[str], templates: Optional[Dict[str, str]] = None,
+                   ks: Sequence[int] = DEFAULT_KS, resamples: int = 1000, details_dir: Optional[str] = None) -> dict:
+    """
+    Scores several prediction files against one gold file, interning the gold answers once.
+
+    Returns:
+      dict: prediction file -> summary (see summarize).
+    """
+    evaluator = AnswerSetEvaluator(answer_pairs(utils.load_json_data(gold_file)), templates)
+    results = {}
+    for prediction_file in prediction_files:
+        start = time.perf_counter()
+        frame = evaluator.score(answer_pairs(utils.load_json_data(prediction_file)), ks)
+        results[prediction_file] = summarize(frame, resamples)
+        results[prediction_file]['seconds'] = round(time.perf_counter() - start, 3)
+        if details_dir:
+            os.makedirs(details_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(prediction_file))[0]
+            frame.to_csv(os.path.join(details_dir, f"{name}_scores.csv"), index=False)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score answer predictions against gold answers.")
+    parser.add_argument("gold_file", help="[{id, answer}] as written by postprocess_predictions_*")
+    parser.add_argument("prediction_files", nargs='+')
+    parser.add_argument("--test-set", default=None, help="Test set with template ids for per-template scores")
+    parser.add_argument("--records-key", default=None, help="Array key of a dict-shaped test set, e.g. questions")
+    parser.add_argument("--ks", type=int, nargs='+', default=list(DEFAULT_KS))
+    parser.add_argument("--bootstrap", type=int, default=1000, help="Bootstrap resamples (0 disables)")
+    parser.add_argument("--details-dir", default=None, help="Write per-question scores as CSV here")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    templates = load_templates(args.test_set, args.records_key) if args.test_set else None
+    report = evaluate_files(args.gold_file, args.prediction_files, templates, args.ks, args.bootstrap,
+                            args.details_dir)
+    if args.output:
+        utils.write_to_json(report, args.output)
+    else:
+        print(json.dumps(report, indent=2))
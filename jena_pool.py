@@ -0,0 +1,213 @@
+import argparse
+import csv
+import os
+import queue
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+from deduplicate import APACHE_JEANA_ARQ_PATH, canonicalize_with_jena, split_leading_string
+
+WORKER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "JenaWorker.java")
+
+
+def jena_home_from_arq(jena_path: str) -> str:
+    """Returns the Jena distribution directory for a path like <JENA_HOME>/bin/arq."""
+    return os.path.dirname(os.path.dirname(os.path.abspath(jena_path)))
+
+
+class JenaWorker:
+    """
+    A single long-lived JVM that canonicalizes queries exactly like `arq --query <file>`.
+
+    Queries are sent over stdin as length-prefixed frames, so the JVM start-up cost
+    is paid once per worker instead of once per query. A query that takes longer than
+    `timeout` seconds kills the JVM, which is restarted for the next query.
+    """
+
+    def __init__(self, jena_path: str = APACHE_JEANA_ARQ_PATH, java: str = "java", timeout: float = 60.0):
+        jena_home = jena_home_from_arq(jena_path)
+        self.command = [java, "-cp", os.path.join(jena_home, "lib", "*")]
+        log4j_config = os.path.join(jena_home, "log4j2.properties")
+        if os.path.exists(log4j_config):
+            self.command.append(f"-Dlog4j.configurationFile=file:{log4j_config}")
+        self.command.append(WORKER_SOURCE)
+        self.timeout = timeout
+        self.process = None
+        self.responses = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        # Frames are read on a thread of their own so a hung JVM cannot block the caller;
+        # each process gets a fresh queue, so a killed one cannot answer for its successor.
+        self.responses = queue.Queue()
+        threading.Thread(target=self._read_responses, args=(self.process.stdout, self.responses),
+                         daemon=True).start()
+
+    @staticmethod
+    def _read_responses(stdout, responses: queue.Queue):
+        try:
+            while True:
+                header = stdout.readline()
+                if not header:
+                    break
+                code, length = (int(part) for part in header.split())
+                responses.put((code, stdout.read(length).decode('utf-8')))
+        except (OSError, ValueError):
+            pass
+        responses.put(None)
+
+    def close(self):
+        if self.process and self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def kill(self):
+        if self.process:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def _roundtrip(self, sparql_query: str):
+        if self.process is None:
+            self.start()
+        payload = sparql_query.encode('utf-8')
+        self.process.stdin.write(f"{len(payload)}\n".encode('utf-8') + payload)
+        self.process.stdin.flush()
+        try:
+            response = self.responses.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Jena worker did not answer within {self.timeout}s")
+        if response is None:
+            raise EOFError("Jena worker exited")
+        return response
+
+    def canonicalize(self, sparql_query: str) -> Optional[str]:
+        """Same contract as deduplicate.canonicalize_with_jena."""
+        try:
+            try:
+                code, output = self._roundtrip(sparql_query)
+            except (EOFError, BrokenPipeError, ValueError):
+                # The JVM died (e.g. out of memory); restart it and retry once.
+                self.close()
+                code, output = self._roundtrip(sparql_query)
+        except TimeoutError as e:
+            # The JVM may be stuck on this query; restart it for the next one instead of retrying.
+            print(f"[TIMEOUT] {e}")
+            self.kill()
+            return None
+        except Exception as e:
+            print(f"[EXCEPTION] {e}")
+            self.kill()
+            return None
+
+        if code != 0:
+            print(f"[ERROR] Jena failed:\n{output}")
+            return None
+
+        return output.strip()
+
+
+class JenaCanonicalizerPool:
+    """
+    A pool of JenaWorker processes, one per core by default. Workers start on first use.
+
+    `canonicalize` is thread-safe; `canonicalize_many` spreads a list of queries over
+    all workers and returns the results in input order.
+    """
+
+    def __init__(self, workers: Optional[int] = None, jena_path: str = APACHE_JEANA_ARQ_PATH,
+                 timeout: float = 60.0):
+        self.size = workers or os.cpu_count() or 1
+        self.workers = [JenaWorker(jena_path, timeout=timeout) for _ in range(self.size)]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+        self.executor = ThreadPoolExecutor(max_workers=self.size)
+
+    def canonicalize(self, sparql_query: str) -> Optional[str]:
+        worker = self.idle.get()
+        try:
+            return worker.canonicalize(sparql_query)
+        finally:
+            self.idle.put(worker)
+
+    def canonicalize_many(self, sparql_queries: Iterable[str]) -> List[Optional[str]]:
+        return list(self.executor.map(self.canonicalize, sparql_queries))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for worker in self.workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_sample_queries(input_csv: str, sample_size: int) -> List[str]:
+    queries = []
+    with open(input_csv, newline='', encoding='utf-8') as infile:
+        for row in csv.DictReader(infile):
+            _, sparql = split_leading_string(row['query'])
+            if sparql:
+                queries.append(sparql)
+            if len(queries) >= sample_size:
+                break
+    return queries
+
+
+def benchmark(queries: List[str], workers: Optional[int] = None, jena_path: str = APACHE_JEANA_ARQ_PATH):
+    """
+    Compares the per-query subprocess path with the worker pool on the same queries.
+
+    Returns:
+        dict: throughput of both paths, the speedup and how many outputs were identical.
+    """
+    start = time.perf_counter()
+    baseline_results = [canonicalize_with_jena(query, jena_path) for query in queries]
+    baseline_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with JenaCanonicalizerPool(workers, jena_path) as pool:
+        pool_results = pool.canonicalize_many(queries)
+        pool_size = pool.size
+    pool_seconds = time.perf_counter() - start
+
+    identical = sum(1 for a, b in zip(baseline_results, pool_results) if a == b)
+    report = {
+        'queries': len(queries),
+        'workers': pool_size,
+        'subprocess_seconds': round(baseline_seconds, 3),
+        'subprocess_queries_per_second': round(len(queries) / baseline_seconds, 2),
+        'pool_seconds': round(pool_seconds, 3),
+        'pool_queries_per_second': round(len(queries) / pool_seconds, 2),
+        'speedup': round(baseline_seconds / pool_seconds, 2),
+        'identical_outputs': identical,
+    }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Jena worker pool against per-query arq calls.")
+    parser.add_argument("input_csv", help="query log with a 'query' column")
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--jena-path", default=APACHE_JEANA_ARQ_PATH)
+    args = parser.parse_args()
+
+    sample = load_sample_queries(args.input_csv, args.sample)
+    for key, value in benchmark(sample, args.workers, args.jena_path).items():
+        print(f"{key}: {value}")
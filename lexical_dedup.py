@@ -0,0 +1,115 @@
+import argparse
+import re
+from typing import Iterator, Tuple
+
+import pandas as pd
+
+SPARQL_KEYWORDS = ['PREFIX', 'BASE', 'SELECT', 'CONSTRUCT', 'DESCRIBE', 'ASK']
+
+# Same split as deduplicate.split_leading_string: everything before the first keyword is the description.
+SPLIT_PATTERN = r'(?is)^(.*?)(\b(?:' + '|'.join(SPARQL_KEYWORDS) + r')\b.*)$'
+
+NORMALIZE_KEYWORDS = SPARQL_KEYWORDS + [
+    'WHERE', 'FILTER', 'OPTIONAL', 'UNION', 'MINUS', 'GRAPH', 'SERVICE', 'BIND', 'VALUES', 'AS', 'DISTINCT',
+    'REDUCED', 'ORDER', 'BY', 'GROUP', 'HAVING', 'LIMIT', 'OFFSET', 'ASC', 'DESC', 'NOT', 'EXISTS', 'IN', 'FROM',
+    'NAMED', 'COUNT', 'SUM', 'MIN', 'MAX', 'AVG', 'SAMPLE', 'GROUP_CONCAT', 'SEPARATOR', 'STR', 'LANG', 'REGEX',
+    'CONTAINS', 'STRSTARTS', 'LCASE', 'UCASE', 'YEAR', 'BOUND', 'IF', 'COALESCE', 'A',
+]
+# Literals and IRIs are kept verbatim; whitespace outside them collapses, keywords are upper-cased.
+LEXICAL_TOKEN = re.compile(
+    r'''("""(?:[^"\\]|\\.|"(?!""))*"""|'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"|<[^<>\s"{}|^`\\]*>)'''
+    r'|(\s+)'
+    r'|(?<![\w?$:])(' + '|'.join(NORMALIZE_KEYWORDS) + r')(?![\w:])',
+    re.IGNORECASE,
+)
+PREFIX_DECLARATION = r'(?i)\bPREFIX\s+([\w\-.]*:)\s*(<[^<>\s]*>)'
+
+
+def read_log_chunks(input_csv: str, chunk_size: int = 10000, skip_rows: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    Reads a query log in DataFrame chunks of `chunk_size` rows, skipping the first
+    `skip_rows` records (counted as records, so queries spanning several lines are safe).
+    """
+    reader = pd.read_csv(input_csv, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    for chunk in reader:
+        if skip_rows >= len(chunk):
+            skip_rows -= len(chunk)
+            continue
+        if skip_rows:
+            chunk = chunk.iloc[skip_rows:]
+            skip_rows = 0
+        yield chunk
+
+
+def split_queries(queries: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Vectorized deduplicate.split_leading_string: (descriptions, sparql queries)."""
+    parts = queries.str.extract(SPLIT_PATTERN)
+    matched = parts[1].notna()
+    descriptions = parts[0].where(matched, queries).str.strip()
+    sparql = parts[1].where(matched, '').str.strip()
+    return descriptions, sparql
+
+
+def _normalize_token(match) -> str:
+    if match.group(1):
+        return match.group(1)
+    if match.group(2):
+        return ' '
+    return match.group(3).upper()
+
+
+def lexical_normalize(sparql: pd.Series) -> pd.Series:
+    """
+    Cheap normal form for spotting duplicates that differ only in whitespace, keyword
+    case or prefix declarations: whitespace outside literals and IRIs is collapsed,
+    keywords are upper-cased, and the PREFIX declarations are reduced to the sorted set
+    of those whose prefix is used in the query body.
+    """
+    normalized = sparql.str.replace(LEXICAL_TOKEN, _normalize_token, regex=True).str.strip()
+    declarations = normalized.str.findall(PREFIX_DECLARATION)
+    body = normalized.str.replace(PREFIX_DECLARATION, '', regex=True).str.strip()
+
+    def prologue(row):
+        declared, text = row
+        used = {f"PREFIX {prefix} {iri}" for prefix, iri in declared if prefix in text}
+        return ' '.join(sorted(used))
+
+    has_prefixes = declarations.str.len() > 0
+    prologues = pd.Series('', index=sparql.index)
+    if has_prefixes.any():
+        # Assigned as an aligned Series: pandas rejects a plain list when every row is masked
+        values = [prologue(row) for row in zip(declarations[has_prefixes], body[has_prefixes])]
+        prologues[has_prefixes] = pd.Series(values, index=sparql.index[has_prefixes])
+    return (prologues + ' ' + body).str.strip()
+
+
+def lexical_hashes(normalized: pd.Series) -> pd.Series:
+    """64-bit hashes of the normalized queries, as signed integers (fit SQLite INTEGER)."""
+    return pd.Series(pd.util.hash_pandas_object(normalized, index=False).values.view('int64'), index=normalized.index)
+
+
+def lexical_tier_counts(input_csv: str, chunk_size: int = 10000) -> dict:
+    """Tier-1 statistics of a log: how many rows would reach the canonicalizer."""
+    counts = {'rows': 0, 'no_sparql': 0, 'lexical_duplicates': 0, 'lexically_unique': 0}
+    seen = set()
+    for chunk in read_log_chunks(input_csv, chunk_size):
+        _, sparql = split_queries(chunk['query'])
+        has_sparql = sparql != ''
+        hashes = lexical_hashes(lexical_normalize(sparql[has_sparql]))
+        new = ~hashes.duplicated() & ~hashes.isin(seen)
+        seen.update(hashes[new].tolist())
+        counts['rows'] += len(chunk)
+        counts['no_sparql'] += int((~has_sparql).sum())
+        counts['lexically_unique'] += int(new.sum())
+        counts['lexical_duplicates'] += int((~new).sum())
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Count exact lexical duplicates in a query log.")
+    parser.add_argument("input_csv")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    for key, value in lexical_tier_counts(args.input_csv, args.chunk_size).items():
+        print(f"{key}: {value}")
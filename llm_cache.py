@@ -0,0 +1,88 @@
+import argparse
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Optional
+
+import tracing
+from config import Config
+from disk_cache import DiskCache
+
+
+class CacheMissError(Exception):
+    """Raised in replay mode when a prompt is not in the cache."""
+
+
+class LLMCache(DiskCache):
+    """
+    Disk-backed LLM response cache keyed by a hash of (provider, model, prompt, params).
+
+    Entries are evicted least-recently-used first once their total size exceeds
+    `max_bytes`. In replay mode the cache is read-only and a miss raises CacheMissError
+    instead of calling the model, which makes runs reproducible without network access.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, replay: bool = False):
+        super().__init__(path, max_bytes=max_bytes, read_only=replay)
+        self.replay = replay
+
+    @staticmethod
+    def key(provider: str, model: str, prompt: str, params: Optional[dict] = None) -> str:
+        payload = json.dumps([provider, model, prompt, params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def cached_call(self, provider: str, model: str, prompt: str, params: Optional[dict], call: Callable[[], Any],
+                    validate: Optional[Callable[[Any], bool]] = None):
+        """
+        Returns the cached response, or runs `call()` and caches its result.
+
+        Responses rejected by `validate` (e.g. malformed or partial model outputs) are
+        returned but not cached, and cached ones it rejects count as misses, so a retry
+        of the same prompt asks the model again instead of replaying the bad response.
+        """
+        key = self.key(provider, model, prompt, params)
+        found, value = self.lookup(key, validate)
+        if found:
+            return value
+        if self.replay:
+            raise CacheMissError(f"No cached response for {provider}/{model} prompt {key[:12]}")
+        with tracing.span('llm.request', provider=provider, model=model):
+            value = call()
+        if validate is None or validate(value):
+            self.put(key, value)
+        return value
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[LLMCache]:
+    """The cache configured via LLM_CACHE_PATH / LLM_CACHE_MAX_MB / LLM_CACHE_REPLAY, or None."""
+    global _default_cache
+    if not Config.LLM_CACHE_PATH:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_bytes = int(Config.LLM_CACHE_MAX_MB * 1024 * 1024) or None
+            _default_cache = LLMCache(Config.LLM_CACHE_PATH, max_bytes, Config.LLM_CACHE_REPLAY)
+    return _default_cache
+
+
+@tracing.traced('llm')
+def cached_llm_call(provider: str, model: str, prompt: str, params: Optional[dict], call: Callable[[], Any],
+                    validate: Optional[Callable[[Any], bool]] = None):
+    """Runs an LLM call through the default cache when one is configured."""
+    cache = get_default_cache()
+    if cache is None:
+        return call()
+    return cache.cached_call(provider, model, prompt, params, call, validate)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect an LLM response cache.")
+    parser.add_argument("path", nargs='?', default=Config.LLM_CACHE_PATH)
+    args = parser.parse_args()
+
+    cache = LLMCache(args.path, replay=True)
+    print(cache.stats())
@@ -0,0 +1,126 @@
+import random
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, Optional
+
+import utils
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket limiting requests and prompt tokens per minute.
+
+    A limit of None disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.lock = threading.Lock()
+        self.buckets = []
+        for kind, per_minute in (('requests', requests_per_minute), ('tokens', tokens_per_minute)):
+            if per_minute:
+                self.buckets.append({'kind': kind, 'capacity': per_minute, 'rate': per_minute / 60.0,
+                                     'level': per_minute})
+        self.last_refill = time.monotonic()
+
+    def acquire(self, tokens: int = 0):
+        """Blocks until one request with `tokens` prompt tokens fits into every bucket."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed, self.last_refill = now - self.last_refill, now
+                wait_seconds = 0.0
+                for bucket in self.buckets:
+                    bucket['level'] = min(bucket['capacity'], bucket['level'] + elapsed * bucket['rate'])
+                    cost = min(1 if bucket['kind'] == 'requests' else tokens, bucket['capacity'])
+                    if bucket['level'] < cost:
+                        wait_seconds = max(wait_seconds, (cost - bucket['level']) / bucket['rate'])
+                if wait_seconds <= 0:
+                    for bucket in self.buckets:
+                        bucket['level'] -= min(1 if bucket['kind'] == 'requests' else tokens, bucket['capacity'])
+                    return
+            time.sleep(wait_seconds)
+
+
+def call_with_retries(func: Callable, argument, max_retries: int = 5, base_delay: float = 1.0,
+                      max_delay: float = 60.0):
+    """Calls func(argument), retrying failures with exponential backoff and jitter."""
+    for attempt in range(max_retries + 1):
+        try:
+            return func(argument)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+            print(f"Attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def run_batches(batches: Iterable[List[dict]], process: Callable[[List[dict]], List[dict]], journal_path: str,
+                concurrency: int = 4, rate_limiter: Optional[RateLimiter] = None,
+                prompt_tokens: Callable[[List[dict]], int] = lambda batch: 0,
+                max_retries: int = 5, base_delay: float = 1.0) -> dict:
+    """
+    Runs `process` over batches with up to `concurrency` calls in flight.
+
+    Every finished batch is appended to a JSONL journal right away, so a crash loses at
+    most the batches in flight. Batches that still fail after `max_retries` are reported
+    and left out of the journal, to be picked up by the next run.
+
+    Args:
+      batches (iterable of list of dict): Input batches.
+      process (callable): Maps a batch to its list of output records.
+      journal_path (str): JSONL file the output records are appended to.
+      concurrency (int): Maximum number of batches in flight.
+      rate_limiter (RateLimiter): Optional request/token rate limit.
+      prompt_tokens (callable): Estimated prompt tokens of a batch, for the token limit.
+      max_retries (int): Retries per batch before giving up on it.
+      base_delay (float): First backoff delay in seconds.
+
+    Returns:
+      dict: counts of finished and failed batches and of journaled records.
+    """
+    stats = {'batches': 0, 'failed_batches': 0, 'records': 0}
+
+    def attempt(batch):
+        if rate_limiter is not None:
+            rate_limiter.acquire(prompt_tokens(batch))
+        return process(batch)
+
+    def run_one(batch):
+        return call_with_retries(attempt, batch, max_retries, base_delay)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = set()
+
+        def drain(return_when):
+            done, still_running = wait(in_flight, return_when=return_when)
+            for future in done:
+                try:
+                    records = future.result()
+                except Exception as e:
+                    print(f"Batch failed after {max_retries} retries: {e}")
+                    stats['failed_batches'] += 1
+                    continue
+                utils.append_jsonl(records, journal_path)
+                stats['batches'] += 1
+                stats['records'] += len(records)
+            return still_running
+
+        for batch in batches:
+            in_flight.add(executor.submit(run_one, batch))
+            if len(in_flight) >= concurrency:
+                in_flight = drain(FIRST_COMPLETED)
+        if in_flight:
+            drain(ALL_COMPLETED)
+    return stats
+
+
+def journaled_ids(journal_path: str) -> set:
+    return {str(record['id']) for record in utils.load_jsonl(journal_path) if 'id' in record}
+
+
+def pending_items(items: List[dict], journal_path: str) -> List[dict]:
+    """Items whose `id` is not in the journal yet."""
+    done = journaled_ids(journal_path)
+    return [item for item in items if str(item['id']) not in done]
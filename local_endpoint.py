@@ -0,0 +1,92 @@
+import argparse
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+from rdflib import Graph
+
+from sparql_canonical import RDFLIB_LOCK
+
+
+class SPARQLRequestHandler(BaseHTTPRequestHandler):
+    """SPARQL protocol (GET ?query= and form POST) over the server's rdflib graph, JSON results only."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _answer(self, params: dict):
+        sparql_query = params.get('query', [''])[0]
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        try:
+            # rdflib's SPARQL parser is not thread-safe
+            with self.server.lock:
+                body = self.server.graph.query(sparql_query).serialize(format='json')
+        except Exception as e:
+            self._send(400, f"Query parse error: {e}".encode('utf-8'), 'text/plain; charset=utf-8')
+            return
+        self._send(200, body, 'application/sparql-results+json')
+
+    def do_GET(self):
+        self._answer(urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        if self.headers.get('Content-Type', '').startswith('application/sparql-query'):
+            self._answer({'query': [body]})
+        else:
+            self._answer(urllib.parse.parse_qs(body))
+
+
+def serve_graph(graph: Graph, host: str = '127.0.0.1', port: int = 0, delay: float = 0.0
+                ) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serves `graph` as a SPARQL endpoint on a background thread.
+
+    Args:
+      graph (Graph): The data to query.
+      host (str): Interface to bind.
+      port (int): Port to bind; 0 picks a free one.
+      delay (float): Artificial latency per query in seconds, to mimic a remote endpoint.
+
+    Returns:
+      (server, endpoint_url): call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), SPARQLRequestHandler)
+    server.daemon_threads = True
+    server.graph = graph
+    server.delay = delay
+    server.lock = RDFLIB_LOCK
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/sparql"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve an RDF file as a local SPARQL endpoint.")
+    parser.add_argument("data", nargs='+', help="RDF files (N-Triples, Turtle, ...)")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8890)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    data = Graph()
+    for path in args.data:
+        data.parse(path)
+    server, url = serve_graph(data, args.host, args.port, args.delay)
+    print(f"Serving {len(data)} triples at {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,472 @@
+import argparse
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.paths import InvPath, Path, SequencePath
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from rdflib.plugins.sparql.algebra import translateQuery
+from rdflib.plugins.sparql.parser import parseQuery
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.store import Store
+from rdflib.term import Variable
+from rdflib.util import from_n3
+
+from sparql_canonical import RDFLIB_LOCK
+from sparql_client import LOCAL_SCHEME, SPARQLQueryError, SPARQLSyntaxError, SPARQLTimeoutError, is_local
+from sparql_results import ResultStream
+
+FORMAT_VERSION = 1
+# Permutation name -> the triple positions in its sort order
+ORDERS = {'spo': (0, 1, 2), 'pos': (1, 2, 0), 'osp': (2, 0, 1)}
+# Bound positions of a pattern -> the permutation whose sort order starts with them
+PERMUTATION_FOR_BOUND = {(): 'spo', (0,): 'spo', (0, 1): 'spo', (0, 1, 2): 'spo',
+                         (1,): 'pos', (1, 2): 'pos', (2,): 'osp', (0, 2): 'osp'}
+PROLOGUE_PATTERN = re.compile(r'^\s*(?:(?:PREFIX\s+[\w.-]*:\s*<[^>]*>|BASE\s+<[^>]*>)\s*)*', re.IGNORECASE)
+
+
+class _Sink:
+    def __init__(self):
+        self.triples = []
+
+    def triple(self, s, p, o):
+        self.triples.append((s, p, o))
+
+
+def iter_triples(path: str, batch_size: int = 100000) -> Iterator[tuple]:
+    """Triples of an RDF file; N-Triples are streamed line by line, other formats go through rdflib."""
+    if not path.endswith('.nt'):
+        yield from Graph().parse(path)
+        return
+    sink = _Sink()
+    parser = W3CNTriplesParser(sink)
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = []
+        for line in f:
+            lines.append(line)
+            if len(lines) >= batch_size:
+                parser.parsestring(''.join(lines))
+                lines = []
+                yield from sink.triples
+                sink.triples = []
+        parser.parsestring(''.join(lines))
+        yield from sink.triples
+
+
+def build_index(triples: Iterable[tuple], output_dir: str) -> dict:
+    """
+    Writes a read-only triple index: a sorted term dictionary (terms.bin and term_offsets.npy,
+    as in columnar_dataset) and the triples as term ids in SPO, POS and OSP order.
+    """
+    term_ids = {}
+    terms = []
+    ids = array('q')
+    for triple in triples:
+        for term in triple:
+            text = term.n3()
+            term_id = term_ids.get(text)
+            if term_id is None:
+                term_id = term_ids[text] = len(terms)
+                terms.append(text)
+            ids.append(term_id)
+    del term_ids
+
+    # Sorted terms make the dictionary searchable by bisection
+    order = sorted(range(len(terms)), key=terms.__getitem__)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[order] = np.arange(len(terms))
+    dtype = np.int32 if len(terms) < 2 ** 31 else np.int64
+    rows = np.unique(rank[np.frombuffer(ids, dtype=np.int64)].reshape(-1, 3), axis=0).astype(dtype)
+
+    os.makedirs(output_dir, exist_ok=True)
+    encoded_terms = [terms[i].encode('utf-8') for i in order]
+    term_offsets = np.zeros(len(encoded_terms) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in encoded_terms], out=term_offsets[1:])
+    with open(os.path.join(output_dir, 'terms.bin'), 'wb') as f:
+        f.write(b''.join(encoded_terms))
+    np.save(os.path.join(output_dir, 'term_offsets.npy'), term_offsets)
+    for name, positions in ORDERS.items():
+        columns = rows[:, positions]
+        permutation = np.lexsort(columns.T[::-1])
+        # One contiguous array per column, so range searches never copy
+        np.save(os.path.join(output_dir, f"{name}.npy"), np.ascontiguousarray(columns[permutation].T))
+    meta = {'format': FORMAT_VERSION, 'triples': len(rows), 'terms': len(terms)}
+    with open(os.path.join(output_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir))
+    return dict(meta, bytes=size)
+
+
+class _TermTable:
+    """The sorted term dictionary as a sequence of N3 strings, for bisect."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+
+class TripleIndex:
+    """
+    Memory-mapped view of a built index. A pattern is answered from the permutation whose
+    sort order starts with its bound positions: two binary searches narrow the rows.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta['format'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format {self.meta['format']}")
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode='r')
+
+        terms_path = os.path.join(path, 'terms.bin')
+        blob = np.memmap(terms_path, dtype=np.uint8, mode='r') if os.path.getsize(terms_path) else b''
+        self.terms = _TermTable(blob, load('term_offsets.npy'))
+        self.orders = {name: load(f"{name}.npy") for name in ORDERS}
+        self.term_cache = {}
+        self.id_cache = {}
+
+    def __len__(self) -> int:
+        return self.meta['triples']
+
+    def term(self, term_id: int):
+        term = self.term_cache.get(term_id)
+        if term is None:
+            term = from_n3(self.terms[term_id])
+            if len(self.term_cache) < 1 << 18:
+                self.term_cache[term_id] = term
+        return term
+
+    def term_id(self, term) -> Optional[int]:
+        text = term.n3()
+        if text not in self.id_cache:
+            i = bisect.bisect_left(self.terms, text)
+            self.id_cache[text] = i if i < len(self.terms) and self.terms[i] == text else None
+        return self.id_cache[text]
+
+    def match(self, pattern: Tuple[Optional[int], Optional[int], Optional[int]]) -> np.ndarray:
+        """(n, 3) term ids of the triples matching a pattern of ids, None for unbound positions."""
+        bound = tuple(i for i, term_id in enumerate(pattern) if term_id is not None)
+        name = PERMUTATION_FOR_BOUND[bound]
+        positions = ORDERS[name]
+        columns = self.orders[name]
+        lo, hi = 0, columns.shape[1]
+        for column, position in zip(columns, positions):
+            if pattern[position] is None:
+                break
+            start = lo + np.searchsorted(column[lo:hi], pattern[position], 'left')
+            hi = lo + np.searchsorted(column[lo:hi], pattern[position], 'right')
+            lo = start
+        rows = np.empty((hi - lo, 3), dtype=columns.dtype)
+        for column, position in zip(columns, positions):
+            rows[:, position] = column[lo:hi]
+        return rows
+
+
+class IndexedStore(Store):
+    """
+    Read-only rdflib store over a TripleIndex, so rdflib's SPARQL engine can query it.
+
+    `deadline` (a time.monotonic() value) is checked while triples are produced and
+    aborts a query running past it with SPARQLTimeoutError.
+    """
+
+    def __init__(self, index: TripleIndex):
+        super().__init__()
+        self.index = index
+        self.deadline = None
+
+    def triples(self, triple_pattern, context=None):
+        ids = []
+        for term in triple_pattern:
+            if term is None:
+                ids.append(None)
+                continue
+            term_id = self.index.term_id(term)
+            if term_id is None:
+                return
+            ids.append(term_id)
+        rows = self.index.match(tuple(ids))
+        term = self.index.term
+        for n, (s, p, o) in enumerate(rows.tolist()):
+            if self.deadline is not None and n % 1024 == 0 and time.monotonic() > self.deadline:
+                raise SPARQLTimeoutError("The local query exceeded the timeout")
+            yield (term(s), term(p), term(o)), iter(())
+
+    def __len__(self, context=None) -> int:
+        return len(self.index)
+
+
+class LocalSPARQLClient:
+    """
+    Answers queries from a local index with the interface of SPARQLClient (query,
+    query_answer, reset), so evaluations run offline with deterministic latency.
+    rdflib's SPARQL engine is not thread-safe; queries run one at a time (see RDFLIB_LOCK).
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.endpoint = LOCAL_SCHEME + path
+        self.timeout = timeout
+        self.store = IndexedStore(TripleIndex(path))
+        self.graph = Graph(store=self.store)
+        self.lock = RDFLIB_LOCK
+
+    def reset(self):
+        pass
+
+    def _serialize(self, sparql_query: str, timeout: Optional[float]) -> bytes:
+        """
+        The JSON result of a query. Raises SPARQLSyntaxError if the query does not parse,
+        SPARQLTimeoutError past the timeout and SPARQLQueryError for other engine failures.
+        """
+        with self.lock:
+            try:
+                query = translateQuery(parseQuery(sparql_query))
+            except Exception as e:
+                raise SPARQLSyntaxError(str(e))
+            self.store.deadline = time.monotonic() + (timeout or self.timeout)
+            try:
+                return self.graph.query(query).serialize(format='json')
+            except SPARQLTimeoutError:
+                raise
+            except Exception as e:
+                raise SPARQLQueryError(f"{type(e).__name__}: {e}") from e
+            finally:
+                self.store.deadline = None
+
+    def query(self, sparql_query: str, timeout: Optional[float] = None) -> dict:
+        return json.loads(self._serialize(sparql_query, timeout))
+
+    def query_answer(self, sparql_query: str, timeout: Optional[float] = None,
+                     max_rows: Optional[int] = None) -> Union[bool, List[dict]]:
+        stream = ResultStream([self._serialize(sparql_query, timeout)], max_rows)
+        rows = list(stream)
+        return stream.boolean if stream.boolean is not None else rows
+
+
+def _patterns(node, triples: list):
+    if isinstance(node, CompValue):
+        if node.name == 'BGP':
+            triples.extend(node.get('triples', []))
+            return
+        for key, value in node.items():
+            if not key.startswith('_'):
+                _patterns(value, triples)
+    elif isinstance(node, (list, tuple)):
+        for item in node:
+            _patterns(item, triples)
+
+
+def _group_pattern(body: str) -> Optional[str]:
+    """The first top-level { ... } of a query body, skipping IRIs and string literals."""
+    start = body.find('{')
+    if start < 0:
+        return None
+    depth = 0
+    i = start
+    while i < len(body):
+        char = body[i]
+        if char in '"\'':
+            end = body.find(char, i + 1)
+            while end > 0 and body[end - 1] == '\\':
+                end = body.find(char, end + 1)
+            if end < 0:
+                return None
+            i = end
+        elif char == '<' and re.match(r'<[^\s<>"{}]*>', body[i:]):
+            i = body.index('>', i)
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return body[start:i + 1]
+        i += 1
+    return None
+
+
+def _path_chain(subject, path, obj, prefix: str) -> Optional[list]:
+    """Triple patterns through fresh variables for a sequence/inverse path of plain IRIs, else None."""
+    if isinstance(path, URIRef):
+        return [(subject, path, obj)]
+    if isinstance(path, InvPath):
+        return _path_chain(obj, path.arg, subject, prefix)
+    if isinstance(path, SequencePath):
+        nodes = [subject] + [Variable(f"{prefix}_{i}") for i in range(len(path.args) - 1)] + [obj]
+        chain = []
+        for i, step in enumerate(path.args):
+            links = _path_chain(nodes[i], step, nodes[i + 1], f"{prefix}_{i}")
+            if links is None:
+                return None
+            chain.extend(links)
+        return chain
+    return None
+
+
+def subgraph_query(sparql_query: str, max_rows: Optional[int] = None) -> Optional[Tuple[str, list, int]]:
+    """
+    A SELECT over all variables of the query's triple patterns, and the patterns to
+    instantiate with its rows; together they yield every triple the query can match.
+    Solution modifiers (ORDER BY, LIMIT, aggregates) are dropped, so the subgraph is
+    a superset. Sequence paths of IRIs are spelled out in an OPTIONAL group; other
+    paths and patterns with blank nodes are left out, and their number is the third
+    item. Triples that only MINUS / FILTER NOT EXISTS patterns match are not fetched.
+    Returns None if the query cannot be parsed.
+    """
+    try:
+        with RDFLIB_LOCK:
+            algebra = translateQuery(parseQuery(sparql_query)).algebra
+    except Exception:
+        return None
+    triples = []
+    _patterns(algebra, triples)
+    templates, chains = [], []
+    skipped = 0
+    for s, p, o in triples:
+        if isinstance(s, BNode) or isinstance(o, BNode):
+            skipped += 1
+        elif isinstance(p, Path):
+            chain = _path_chain(s, p, o, f"_path{len(chains)}")
+            if chain is None:
+                skipped += 1
+            else:
+                chains.append(chain)
+                templates.extend(chain)
+        else:
+            templates.append((s, p, o))
+    variables = sorted({term for triple in templates for term in triple if isinstance(term, Variable)})
+    prologue = PROLOGUE_PATTERN.match(sparql_query).group(0)
+    where = _group_pattern(sparql_query[len(prologue):])
+    if where is None:
+        return None
+    if chains:
+        optional = ' '.join('OPTIONAL { ' + ' . '.join(' '.join(term.n3() for term in triple) for triple in chain)
+                            + ' }' for chain in chains)
+        where = where[:-1] + ' ' + optional + ' }'
+    projection = ' '.join(v.n3() for v in variables) if variables else '*'
+    select = f"{prologue}\nSELECT DISTINCT {projection} WHERE {where}"
+    if max_rows:
+        select += f"\nLIMIT {max_rows}"
+    return select, templates, skipped
+
+
+def gold_query(record: dict) -> Optional[str]:
+    """The SPARQL of a dataset record: `sparql`, `query`, or DBLP-QuAD's {"query": {"sparql": ...}}."""
+    query = record.get('sparql') or record.get('query')
+    return query.get('sparql') if isinstance(query, dict) else query
+
+
+def _binding_term(value: dict):
+    if value['type'] == 'uri':
+        return URIRef(value['value'])
+    if value['type'] in ('literal', 'typed-literal'):
+        datatype = value.get('datatype')
+        return Literal(value['value'], lang=value.get('xml:lang'), datatype=URIRef(datatype) if datatype else None)
+    return None
+
+
+def extract_subgraph(queries: Iterable[str], client, output_path: str, timeout: float = 60.0,
+                     max_rows: Optional[int] = 100000) -> dict:
+    """
+    Fetches the triples the given (gold) queries need from `client` (a SPARQLClient on
+    the full endpoint, or a LocalSPARQLClient) and writes them as N-Triples.
+
+    Returns counts of queries, failures, patterns left out and triples written. A query
+    whose rows reach `max_rows` was cut off by the LIMIT, so the subset may miss triples
+    it needs; those are counted as truncated and logged.
+    """
+    stats = {'queries': 0, 'unparsed': 0, 'failed': 0, 'truncated': 0, 'skipped_patterns': 0, 'triples': 0}
+    seen = set()
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for sparql in queries:
+            stats['queries'] += 1
+            plan = subgraph_query(sparql, max_rows)
+            if plan is None:
+                stats['unparsed'] += 1
+                continue
+            select, templates, skipped = plan
+            stats['skipped_patterns'] += skipped
+            try:
+                bindings = client.query(select, timeout).get('results', {}).get('bindings', [])
+            except Exception as e:
+                logging.warning(f"Subgraph query failed: {e}")
+                stats['failed'] += 1
+                continue
+            if max_rows is not None and len(bindings) >= max_rows:
+                logging.warning(f"Subgraph query hit the {max_rows} row limit, the subset may be incomplete: {sparql}")
+                stats['truncated'] += 1
+            for binding in bindings:
+                row = {Variable(name): _binding_term(value) for name, value in binding.items()}
+                for template in templates:
+                    triple = tuple(row.get(term) if isinstance(term, Variable) else term for term in template)
+                    if any(term is None for term in triple) or triple in seen:
+                        continue
+                    seen.add(triple)
+                    f.write(f"{triple[0].n3()} {triple[1].n3()} {triple[2].n3()} .\n")
+    stats['triples'] = len(seen)
+    return stats
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(sparql_endpoint: str, timeout: float = 60.0) -> LocalSPARQLClient:
+    """One client per local index, shared by all threads."""
+    with _clients_lock:
+        if sparql_endpoint not in _clients:
+            _clients[sparql_endpoint] = LocalSPARQLClient(sparql_endpoint[len(LOCAL_SCHEME):], timeout)
+        return _clients[sparql_endpoint]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline SPARQL over a local triple index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Index RDF files (N-Triples are streamed)")
+    build_parser.add_argument("data", nargs='+')
+    build_parser.add_argument("--output", required=True, help="Index directory")
+    extract_parser = subparsers.add_parser('extract', help="Fetch the subgraph the gold queries of a split need")
+    extract_parser.add_argument("input_json", help="Records with sparql (or query)")
+    extract_parser.add_argument("output_nt")
+    extract_parser.add_argument("--endpoint", required=True, help="Endpoint URL or local:<index directory>")
+    extract_parser.add_argument("--records-key", default=None)
+    extract_parser.add_argument("--timeout", type=float, default=60.0)
+    extract_parser.add_argument("--max-rows", type=int, default=100000)
+    query_parser = subparsers.add_parser('query')
+    query_parser.add_argument("index")
+    query_parser.add_argument("sparql")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        print(build_index((triple for path in args.data for triple in iter_triples(path)), args.output))
+    elif args.command == 'extract':
+        import columnar_dataset
+        import utils
+        client = utils.get_sparql_client(args.endpoint, args.timeout)
+        queries = (gold_query(record) for record in columnar_dataset.iter_records(args.input_json, args.records_key))
+        stats = extract_subgraph(queries, client, args.output_nt, args.timeout, args.max_rows)
+        print(stats)
+        if stats['truncated']:
+            print(f"Warning: {stats['truncated']} queries hit --max-rows {args.max_rows}; "
+                  f"local answers for them may differ from the endpoint's")
+    else:
+        started = time.perf_counter()
+        answer = LocalSPARQLClient(args.index).query_answer(args.sparql)
+        print(json.dumps(answer, ensure_ascii=False, indent=2))
+        print(f"{time.perf_counter() - started:.3f}s")
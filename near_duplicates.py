@@ -0,0 +1,181 @@
+import argparse
+import re
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from deduplicate import split_leading_string
+
+# IRIs in these namespaces describe the query template; every other IRI is an entity.
+SCHEMA_NAMESPACES = (
+    'https://dblp.org/rdf/schema#',
+    'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'http://www.w3.org/2000/01/rdf-schema#',
+    'http://www.w3.org/2001/XMLSchema#',
+    'http://www.w3.org/2002/07/owl#',
+    'http://purl.org/dc/terms/',
+)
+
+PROLOGUE_PATTERN = re.compile(r'\b(?:PREFIX\s+[\w\-.]*:\s*<[^>]*>|BASE\s*<[^>]*>)', re.IGNORECASE)
+TOKEN_PATTERN = re.compile(r'''<[^<>\s]*>|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[?$]\w+|[A-Za-z_][\w\-]*:[\w\-]*|\d+(?:\.\d+)?|\w+|[^\s\w]''')
+
+# A prime just above 2**32: a * x + b stays below 2**64 for 32-bit a, b and x.
+MERSENNE_LIKE_PRIME = np.uint64(4294967311)
+
+
+def query_shape(sparql_query: str) -> List[str]:
+    """
+    Tokenizes a SPARQL query into its template shape: prefix declarations are dropped,
+    variables, entity IRIs, literals and numbers become placeholders, keywords are upper-cased.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(PROLOGUE_PATTERN.sub(' ', sparql_query)):
+        if token[0] in '?$':
+            tokens.append('?VAR')
+        elif token[0] == '<' and len(token) > 1:
+            tokens.append(token if token[1:].startswith(SCHEMA_NAMESPACES) else '<ENT>')
+        elif token[0] in '"\'':
+            tokens.append('"LIT"')
+        elif token[0].isdigit():
+            tokens.append('NUM')
+        elif ':' in token:
+            tokens.append(token)
+        else:
+            tokens.append(token.upper())
+    return tokens
+
+
+def shingle_hashes(tokens: List[str], k: int = 3) -> np.ndarray:
+    """32-bit hashes of the token k-grams of a query shape."""
+    if len(tokens) <= k:
+        grams = {' '.join(tokens)}
+    else:
+        grams = {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+    return np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash_signatures(shingle_sets: List[np.ndarray], num_perm: int = 128, seed: int = 1,
+                       block_size: int = 2048) -> np.ndarray:
+    """
+    Computes MinHash signatures for many shingle sets at once.
+
+    Each block of queries is concatenated into one array so the `num_perm` universal
+    hashes are evaluated as a single (num_perm, total_shingles) NumPy operation and
+    reduced per query with np.minimum.reduceat.
+
+    Returns:
+      np.ndarray: (len(shingle_sets), num_perm) uint64 signatures.
+    """
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 2 ** 32 - 1, size=(num_perm, 1), dtype=np.int64).astype(np.uint64)
+    b = rng.randint(0, 2 ** 32 - 1, size=(num_perm, 1), dtype=np.int64).astype(np.uint64)
+
+    signatures = np.empty((len(shingle_sets), num_perm), dtype=np.uint64)
+    for start in range(0, len(shingle_sets), block_size):
+        block = [s if len(s) else np.zeros(1, dtype=np.uint64) for s in shingle_sets[start:start + block_size]]
+        offsets = np.cumsum([0] + [len(s) for s in block[:-1]])
+        values = np.concatenate(block)[None, :]
+        hashed = (a * values + b) % MERSENNE_LIKE_PRIME
+        signatures[start:start + len(block)] = np.minimum.reduceat(hashed, offsets, axis=1).T
+    return signatures
+
+
+def lsh_parameters(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Picks (bands, rows) with bands * rows == num_perm whose S-curve midpoint is closest to threshold."""
+    candidates = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(candidates, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+def lsh_clusters(signatures: np.ndarray, threshold: float = 0.8, bands: Optional[int] = None) -> np.ndarray:
+    """
+    Groups items whose signatures collide in at least one LSH band.
+
+    Within a bucket an item is only linked to the bucket leader (its first item) when the
+    estimated Jaccard similarity of the two signatures reaches `threshold`, which keeps
+    chains of loosely similar queries from collapsing into one cluster. Connected
+    components are resolved by vectorized min-label propagation.
+
+    Returns:
+      np.ndarray: cluster label per item, equal to the index of its first member.
+    """
+    n, num_perm = signatures.shape
+    if bands is None:
+        bands, rows = lsh_parameters(num_perm, threshold)
+    else:
+        rows = num_perm // bands
+
+    mixer = np.random.RandomState(0).randint(1, 2 ** 62, size=rows, dtype=np.int64).astype(np.uint64)
+    edges = []
+    for band in range(bands):
+        band_slice = signatures[:, band * rows:(band + 1) * rows]
+        with np.errstate(over='ignore'):
+            keys = (band_slice * mixer).sum(axis=1)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        leaders = order[np.repeat(starts, np.diff(np.r_[starts, n]))]
+        members = order
+        candidates = members != leaders
+        leaders, members = leaders[candidates], members[candidates]
+        similarity = (signatures[leaders] == signatures[members]).mean(axis=1)
+        keep = similarity >= threshold
+        edges.append(np.stack([leaders[keep], members[keep]]))
+
+    labels = np.arange(n)
+    if not edges:
+        return labels
+    edges = np.concatenate(edges, axis=1)
+    while True:
+        smaller = np.minimum(labels[edges[0]], labels[edges[1]])
+        updated = labels.copy()
+        np.minimum.at(updated, edges[0], smaller)
+        np.minimum.at(updated, edges[1], smaller)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def cluster_queries(sparql_queries: List[str], threshold: float = 0.8, num_perm: int = 128,
+                    shingle_size: int = 3) -> np.ndarray:
+    """Cluster label per query; the label is the index of the cluster's first query."""
+    shingle_sets = [shingle_hashes(query_shape(query), shingle_size) for query in sparql_queries]
+    return lsh_clusters(minhash_signatures(shingle_sets, num_perm), threshold)
+
+
+def cluster_log(input_csv: str, output_csv: str, representatives_csv: Optional[str] = None,
+                threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 3) -> dict:
+    """
+    Adds `cluster_id` and `is_representative` columns to a deduplicated query CSV.
+
+    The representative of each cluster is its first row, so the output of
+    `deduplicate.py`/`dedup_pipeline.py` keeps its first-seen order. Optionally writes
+    the representatives alone, ready for `utils.convert_csv_to_json` and question generation.
+    """
+    data = pd.read_csv(input_csv, dtype=str, keep_default_na=False)
+    queries = [split_leading_string(query)[1] or query for query in data['query']]
+    labels = cluster_queries(queries, threshold, num_perm, shingle_size)
+
+    data['cluster_id'] = pd.Series(labels).rank(method='dense').astype(int).values - 1
+    data['is_representative'] = labels == np.arange(len(labels))
+    data.to_csv(output_csv, index=False)
+    if representatives_csv:
+        data[data['is_representative']].drop(columns=['is_representative']).to_csv(representatives_csv, index=False)
+    return {'queries': len(data), 'clusters': int(data['is_representative'].sum())}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate SPARQL queries with MinHash/LSH.")
+    parser.add_argument("input_csv", help="deduplicated query CSV")
+    parser.add_argument("--output", default="log_data/dedup/query_clusters.csv")
+    parser.add_argument("--representatives", default="log_data/dedup/cluster_representatives.csv")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Jaccard similarity of query shapes")
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--shingle-size", type=int, default=3)
+    args = parser.parse_args()
+
+    result = cluster_log(args.input_csv, args.output, args.representatives, args.threshold, args.num_perm,
+                         args.shingle_size)
+    print(f"{result['queries']} queries in {result['clusters']} clusters")
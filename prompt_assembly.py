@@ -0,0 +1,106 @@
+import logging
+import string
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+import utils
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledPrompt:
+    """
+    A str.format template whose static fields (schema text, few-shot examples, fixed
+    instructions) are substituted once at compile time.
+
+    Rendering only joins the precompiled pieces with the per-call fields, and every
+    prompt of a template starts with the same `prefix`: the text before the first
+    per-call field. Providers that cache prompt prefixes can reuse it across calls as
+    long as the per-call fields come last in the template.
+    """
+
+    def __init__(self, name: str, template: str, **static_fields):
+        self.name = name
+        self.parts: List[Union[str, Tuple[str, str, Optional[str]]]] = []
+        literal = []
+        for text, field, format_spec, conversion in string.Formatter().parse(template):
+            literal.append(text)
+            if field is None:
+                continue
+            if field in static_fields:
+                value = static_fields[field]
+                value = {'r': repr, 's': str, 'a': ascii}[conversion](value) if conversion else value
+                literal.append(format(value, format_spec))
+            else:
+                self.parts.append(''.join(literal))
+                self.parts.append((field, format_spec, conversion))
+                literal = []
+        self.parts.append(''.join(literal))
+        self.fields = [part[0] for part in self.parts if isinstance(part, tuple)]
+        self.prefix = self.parts[0]
+        self.prefix_tokens = utils.estimate_tokens(self.prefix)
+        self.static_tokens = utils.estimate_tokens(''.join(part for part in self.parts if isinstance(part, str)))
+        if self.fields and self.prefix_tokens < self.static_tokens // 2:
+            logger.warning(f"Prompt '{self.name}': only {self.prefix_tokens} of {self.static_tokens} static tokens "
+                           f"precede the first per-call field; move {self.fields[0]!r} towards the end "
+                           f"of the template for prefix caching")
+
+    def render(self, **fields) -> str:
+        """The prompt for one call; its token count goes into PROMPT_STATS."""
+        prompt = self.build(**fields)
+        PROMPT_STATS.record(self.name, utils.estimate_tokens(prompt), self.prefix_tokens)
+        return prompt
+
+    def build(self, **fields) -> str:
+        """Like render, without recording stats (e.g. to size a batch)."""
+        pieces = []
+        for part in self.parts:
+            if isinstance(part, str):
+                pieces.append(part)
+                continue
+            field, format_spec, conversion = part
+            value = fields[field]
+            if conversion:
+                value = {'r': repr, 's': str, 'a': ascii}[conversion](value)
+            pieces.append(format(value, format_spec))
+        return ''.join(pieces)
+
+
+class PromptStats:
+    """Estimated prompt tokens per template, and how many of them are the shared prefix."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.templates: Dict[str, dict] = {}
+
+    def record(self, name: str, prompt_tokens: int, prefix_tokens: int):
+        with self.lock:
+            row = self.templates.setdefault(name, {'calls': 0, 'prompt_tokens': 0, 'prefix_tokens': 0,
+                                                   'max_prompt_tokens': 0})
+            row['calls'] += 1
+            row['prompt_tokens'] += prompt_tokens
+            row['prefix_tokens'] += prefix_tokens
+            row['max_prompt_tokens'] = max(row['max_prompt_tokens'], prompt_tokens)
+        logger.debug(f"Prompt '{name}': {prompt_tokens} tokens, {prefix_tokens} in the shared prefix")
+
+    def summary(self) -> Dict[str, dict]:
+        with self.lock:
+            report = {}
+            for name, row in self.templates.items():
+                report[name] = dict(row, mean_prompt_tokens=round(row['prompt_tokens'] / row['calls'], 1),
+                                    prefix_share=round(row['prefix_tokens'] / max(row['prompt_tokens'], 1), 3))
+            return report
+
+
+PROMPT_STATS = PromptStats()
+
+_compiled: Dict[Hashable, CompiledPrompt] = {}
+_compiled_lock = threading.Lock()
+
+
+def compiled(key: Hashable, build: Callable[[], CompiledPrompt]) -> CompiledPrompt:
+    """The prompt compiled for `key`, built on first use."""
+    with _compiled_lock:
+        if key not in _compiled:
+            _compiled[key] = build()
+        return _compiled[key]
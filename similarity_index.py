@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import columnar_dataset
+from config import Config
+
+INDEX_FORMAT = 1
+SEARCH_BLOCK = 65536
+
+
+def load_embedder(model_name: Optional[str] = None, batch_size: int = 64) -> Callable[[List[str]], np.ndarray]:
+    """
+    Sentence-transformers encoder returning L2-normalized float32 rows. The package is
+    only needed to build an index or to embed queries, not to load one.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name or Config.SIMILARITY_MODEL)
+
+    def embed(texts: List[str]) -> np.ndarray:
+        return model.encode(texts, batch_size=batch_size, normalize_embeddings=True,
+                            convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+    return embed
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _text(value) -> str:
+    """Questions and queries may be nested, e.g. DBLP-QuAD's {"string": ...} and {"sparql": ...}."""
+    if isinstance(value, dict):
+        value = next((v for v in value.values() if isinstance(v, str)), '')
+    return value if isinstance(value, str) else ''
+
+
+def kmeans(vectors: np.ndarray, clusters: int, iterations: int = 20, sample: int = 100000,
+           seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids of (a sample of) unit vectors."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=clusters) == 0
+        # Re-seed empty clusters with random points
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def build_index(records: Iterable[dict], output_dir: str, embed: Callable[[List[str]], np.ndarray],
+                quantize: bool = False, clusters: int = 0, batch_size: int = 1024,
+                question_key: str = 'question', sparql_key: str = 'sparql', entities_key: str = 'entities',
+                id_key: str = 'id') -> dict:
+    """
+    Embeds the training questions once and stores them for SimilarityIndex.
+
+    Output directory:
+      vectors.npy      float32 unit vectors, or int8 codes with scales.npy when quantized
+      metadata/        id, question, sparql and entities per row (columnar_dataset layout)
+      centroids.npy, ivf_order.npy, ivf_offsets.npy   inverted lists, when clusters > 0
+      index.json       format, dimensions, options
+
+    `clusters` is capped at the number of rows.
+
+    Returns:
+      dict: rows, dimensions, seconds.
+    """
+    start = time.perf_counter()
+    metadata = []
+    for record in records:
+        metadata.append({'id': record.get(id_key), 'question': _text(record.get(question_key)),
+                         'sparql': _text(record.get(sparql_key)), 'entities': record.get(entities_key) or []})
+    questions = [item['question'] for item in metadata]
+    blocks = [_normalize(embed(questions[i:i + batch_size])) for i in range(0, len(questions), batch_size)]
+    vectors = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+
+    os.makedirs(output_dir, exist_ok=True)
+    columnar_dataset.write_records(metadata, os.path.join(output_dir, 'metadata'))
+    if quantize:
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        np.save(os.path.join(output_dir, 'vectors.npy'), codes)
+        np.save(os.path.join(output_dir, 'scales.npy'), scales.astype(np.float32))
+    else:
+        np.save(os.path.join(output_dir, 'vectors.npy'), vectors)
+    clusters = min(clusters, len(vectors))
+    if clusters:
+        centroids = kmeans(vectors, clusters)
+        assignment = np.concatenate([np.argmax(vectors[i:i + SEARCH_BLOCK] @ centroids.T, axis=1)
+                                     for i in range(0, len(vectors), SEARCH_BLOCK)])
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.zeros(clusters + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=clusters), out=offsets[1:])
+        np.save(os.path.join(output_dir, 'centroids.npy'), centroids)
+        np.save(os.path.join(output_dir, 'ivf_order.npy'), order.astype(np.int64))
+        np.save(os.path.join(output_dir, 'ivf_offsets.npy'), offsets)
+    info = {'format': INDEX_FORMAT, 'rows': len(vectors), 'dimensions': int(vectors.shape[1]) if len(vectors) else 0,
+            'quantized': quantize, 'clusters': clusters}
+    with open(os.path.join(output_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2)
+    info['seconds'] = round(time.perf_counter() - start, 3)
+    return info
+
+
+def _merge_top_k(scores: np.ndarray, indices: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keeps the k best columns of each row, sorted by descending score."""
+    if scores.shape[1] > k:
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, best, axis=1)
+        indices = np.take_along_axis(indices, best, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+class SimilarityIndex:
+    """
+    Memory-mapped nearest-neighbour index over the training questions.
+
+    Loading maps the vectors and metadata without reading them, so startup is
+    near-instant. `search` embeds a batch of questions in one call and scores it
+    against all rows with one matrix product per block of rows (exact search), or
+    only against the rows of the `nprobe` closest clusters when the index was built
+    with clusters (IVF). Results have the (id, question, score, sparql, entities)
+    shape of question_similarity.identify_similar_questions.
+    """
+
+    def __init__(self, path: str, embed: Optional[Callable[[List[str]], np.ndarray]] = None, nprobe: int = 8):
+        self.path = path
+        with open(os.path.join(path, 'index.json'), 'r', encoding='utf-8') as f:
+            self.info = json.load(f)
+        if self.info['format'] != INDEX_FORMAT:
+            raise ValueError(f"Unsupported index format {self.info['format']}")
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.scales = np.load(os.path.join(path, 'scales.npy'), mmap_mode='r') if self.info['quantized'] else None
+        self.metadata = columnar_dataset.ColumnarDataset(os.path.join(path, 'metadata'))
+        if self.info['clusters']:
+            self.centroids = np.load(os.path.join(path, 'centroids.npy'))
+            self.ivf_order = np.load(os.path.join(path, 'ivf_order.npy'), mmap_mode='r')
+            self.ivf_offsets = np.load(os.path.join(path, 'ivf_offsets.npy'))
+        self.nprobe = nprobe
+        self._embed = embed
+        self.lock = threading.Lock()
+        self.prefetched: Dict[Tuple[str, int], list] = {}
+
+    def embed(self, questions: List[str]) -> np.ndarray:
+        with self.lock:
+            if self._embed is None:
+                self._embed = load_embedder()
+        return _normalize(self._embed(questions))
+
+    def _rows(self, start: int, end: int) -> np.ndarray:
+        rows = np.asarray(self.vectors[start:end], dtype=np.float32)
+        if self.scales is not None:
+            rows *= self.scales[start:end, None]
+        return rows
+
+    def _exact(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_indices = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self.vectors), SEARCH_BLOCK):
+            end = min(start + SEARCH_BLOCK, len(self.vectors))
+            scores = queries @ self._rows(start, end).T
+            indices = np.broadcast_to(np.arange(start, end), scores.shape)
+            best_scores, best_indices = _merge_top_k(np.hstack([best_scores, scores]),
+                                                     np.hstack([best_indices, indices]), k)
+        return best_scores, best_indices
+
+    def _ivf(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_indices = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([self.ivf_order[self.ivf_offsets[c]:self.ivf_offsets[c + 1]]
+                                         for c in probes[i]])
+            if not len(candidates):
+                continue
+            candidates.sort()
+            rows = np.asarray(self.vectors[candidates], dtype=np.float32)
+            if self.scales is not None:
+                rows *= self.scales[candidates][:, None]
+            scores, indices = _merge_top_k((rows @ query)[None, :], candidates[None, :], k)
+            all_scores[i, :scores.shape[1]] = scores[0]
+            all_indices[i, :indices.shape[1]] = indices[0]
+        return all_scores, all_indices
+
+    def search_vectors(self, queries: np.ndarray, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """(scores, row indices) of the top_k rows per query vector; missing hits have index -1."""
+        queries = _normalize(np.atleast_2d(queries))
+        k = min(top_k, len(self.vectors))
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+        if self.info['clusters']:
+            return self._ivf(queries, k)
+        return self._exact(queries, k)
+
+    def search(self, questions: Sequence[str], top_k: int = 5) -> List[list]:
+        """Similar training questions for each question, best first."""
+        results = [self.prefetched.get((question, top_k)) for question in questions]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            scores, indices = self.search_vectors(self.embed([questions[i] for i in missing]), top_k)
+            for i, row_scores, row_indices in zip(missing, scores, indices):
+                results[i] = []
+                for score, index in zip(row_scores, row_indices):
+                    if index < 0:
+                        continue
+                    item = self.metadata[int(index)]
+                    results[i].append((item['id'], item['question'], float(score), item['sparql'], item['entities']))
+        return results
+
+    def prefetch(self, questions: Sequence[str], top_k: int = 5, batch_size: int = 256):
+        """Searches many questions ahead of time in large batches; `search` then answers from memory."""
+        for start in range(0, len(questions), batch_size):
+            batch = list(questions[start:start + batch_size])
+            for question, result in zip(batch, self.search(batch, top_k)):
+                self.prefetched[(question, top_k)] = result
+
+    def discard(self, questions: Sequence[str], top_k: int = 5):
+        """Drops prefetched results that are no longer needed."""
+        for question in questions:
+            self.prefetched.pop((question, top_k), None)
+
+
+def get_default_index() -> Optional[SimilarityIndex]:
+    """The index at SIMILARITY_INDEX_PATH, or None when it is not configured."""
+    if not Config.SIMILARITY_INDEX_PATH:
+        return None
+    return SimilarityIndex(Config.SIMILARITY_INDEX_PATH)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or query the similar-question index.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build')
+    build_parser.add_argument("input_json", help="Training pool: JSON/zip file or columnar dataset")
+    build_parser.add_argument("output_dir")
+    build_parser.add_argument("--records-key", default=None)
+    build_parser.add_argument("--model", default=None)
+    build_parser.add_argument("--quantize", action="store_true", help="Store int8 codes instead of float32")
+    build_parser.add_argument("--clusters", type=int, default=0, help="IVF lists (0: exact search only)")
+    build_parser.add_argument("--question-key", default='question')
+    build_parser.add_argument("--sparql-key", default='sparql')
+    build_parser.add_argument("--entities-key", default='entities')
+    query_parser = subparsers.add_parser('query')
+    query_parser.add_argument("index_dir")
+    query_parser.add_argument("questions", nargs='+')
+    query_parser.add_argument("--top-k", type=int, default=5)
+    query_parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        records = columnar_dataset.iter_records(args.input_json, args.records_key)
+        print(build_index(records, args.output_dir, load_embedder(args.model), args.quantize, args.clusters,
+                          question_key=args.question_key, sparql_key=args.sparql_key,
+                          entities_key=args.entities_key))
+    else:
+        index = SimilarityIndex(args.index_dir, nprobe=args.nprobe)
+        for question, similar in zip(args.questions, index.search(args.questions, args.top_k)):
+            print(question)
+            for qid, text, score, _, _ in similar:
+                print(f"  {score:.3f}  {qid}  {text}")
@@ -0,0 +1,90 @@
+import hashlib
+import re
+import threading
+from typing import Optional
+
+from config import Config
+from disk_cache import DiskCache
+
+
+def normalize_query(sparql_query: str) -> str:
+    """
+    Cache key form of a query: rdflib's canonical form with variable names kept (they
+    name the result columns), or the whitespace-collapsed text if rdflib cannot parse it.
+    """
+    # rdflib's SPARQL parser takes a few hundred ms to import; only pay for it once a cache is in use
+    from sparql_canonical import canonicalize_with_rdflib
+    canonical = canonicalize_with_rdflib(sparql_query, rename_variables=False)
+    if canonical is not None:
+        return canonical
+    return re.sub(r'\s+', ' ', sparql_query).strip()
+
+
+class SPARQLResultCache(DiskCache):
+    """
+    SPARQL JSON results keyed by endpoint and normalized query.
+
+    Flattened answers (see utils.run_sparql_answer) are cached under keys of their own.
+    Failures can be cached too (negative caching) with their own, usually shorter,
+    time-to-live, so a query that timed out is not re-sent on every eval run.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, ttl: Optional[float] = None,
+                 negative_ttl: Optional[float] = None):
+        super().__init__(path, max_bytes=max_bytes, ttl=ttl)
+        self.negative_ttl = negative_ttl
+
+    @staticmethod
+    def key(sparql_endpoint: str, sparql_query: str, form: str = 'result') -> str:
+        payload = sparql_endpoint + '\n' + normalize_query(sparql_query)
+        if form != 'result':
+            payload = form + '\n' + payload
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_result(self, key: str):
+        """
+        Returns (found, result, error) for a key from `key(endpoint, query)`: a cached
+        result, or the cached error message of a failed query. Callers compute the key
+        once per query, since it costs an rdflib parse.
+        """
+        found, value = self.lookup(key)
+        if not found:
+            return False, None, None
+        return True, value.get('result'), value.get('error')
+
+    def put_result(self, key: str, result: dict):
+        self.put(key, {'result': result})
+
+    def get_answer(self, key: str):
+        """Returns (found, answer, error) for a flattened answer under a key from `key(..., 'answer')`."""
+        found, value = self.lookup(key)
+        if not found:
+            return False, None, None
+        return True, value.get('answer'), value.get('error')
+
+    def put_answer(self, key: str, answer):
+        self.put(key, {'answer': answer})
+
+    def put_error(self, key: str, error: str):
+        if self.negative_ttl:
+            self.put(key, {'error': error}, ttl=self.negative_ttl)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[SPARQLResultCache]:
+    """The cache configured via the SPARQL_CACHE_* settings, or None."""
+    global _default_cache
+    if not Config.SPARQL_CACHE_PATH:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SPARQLResultCache(
+                Config.SPARQL_CACHE_PATH,
+                max_bytes=int(Config.SPARQL_CACHE_MAX_MB * 1024 * 1024) or None,
+                ttl=Config.SPARQL_CACHE_TTL or None,
+                negative_ttl=Config.SPARQL_CACHE_NEGATIVE_TTL or None,
+            )
+    return _default_cache
@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from rdflib.plugins.sparql.algebra import translateQuery
+from rdflib.plugins.sparql.parser import parseQuery
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.term import BNode, Literal, URIRef, Variable
+
+import tracing
+
+# rdflib's SPARQL grammar is shared pyparsing state and breaks under concurrent parses; every
+# parse (and rdflib query) in the process holds this lock
+RDFLIB_LOCK = threading.RLock()
+
+
+class _AlgebraSerializer:
+    """
+    Serializes an rdflib algebra tree into a stable string.
+
+    Variables are renamed to ?v0, ?v1, ... in traversal order (blank nodes to _:b0, ...),
+    keys are emitted in sorted order and the triples of every BGP are sorted, so queries
+    that differ only in whitespace, keyword case, prefix declarations, variable names or
+    triple order serialize identically.
+
+    With `template_namespaces`, IRIs outside those namespaces and literals are
+    abstracted to <ENT> and "LIT", which leaves the query template.
+    """
+
+    def __init__(self, rename_variables: bool = True, projection: Optional[list] = None,
+                 template_namespaces: Optional[Sequence[str]] = None):
+        self.rename_variables = rename_variables
+        self.template_namespaces = tuple(template_namespaces) if template_namespaces is not None else None
+        # rdflib derives the projection of SELECT *, sub-selects, ASK and CONSTRUCT from a
+        # set, so only an explicit top-level SELECT projection keeps its order.
+        self.projection = projection
+        self.variables = {}
+        self.bnodes = {}
+
+    def term(self, term) -> str:
+        if isinstance(term, Variable):
+            if not self.rename_variables:
+                return term.n3()
+            if term not in self.variables:
+                self.variables[term] = f"?v{len(self.variables)}"
+            return self.variables[term]
+        if isinstance(term, BNode):
+            if term not in self.bnodes:
+                self.bnodes[term] = f"_:b{len(self.bnodes)}"
+            return self.bnodes[term]
+        if self.template_namespaces is not None:
+            if isinstance(term, URIRef) and not str(term).startswith(self.template_namespaces):
+                return '<ENT>'
+            if isinstance(term, Literal):
+                return '"LIT"' + (f"^^<{term.datatype}>" if term.datatype else '')
+        return term.n3()
+
+    def _triple_sort_key(self, triple):
+        shape = tuple('?' if isinstance(t, (Variable, BNode)) else self.term(t) for t in triple)
+        named = tuple(self.variables.get(t, self.bnodes.get(t, '~')) if isinstance(t, (Variable, BNode)) else ''
+                      for t in triple)
+        return shape, named
+
+    def serialize(self, node) -> str:
+        if isinstance(node, CompValue):
+            if node.name == 'BGP':
+                triples = sorted(node.get('triples', []), key=self._triple_sort_key)
+                return 'BGP(' + ' . '.join(' '.join(self.serialize(t) for t in triple) for triple in triples) + ')'
+            keys = sorted(key for key in node if not key.startswith('_') and key != 'PV')
+            parts = [f"{key}={self.serialize(node[key])}" for key in keys]
+            if 'PV' in node:
+                parts.append(f"PV={self.serialize_projection(node['PV'])}")
+            return f"{node.name}({','.join(parts)})"
+        if isinstance(node, (Variable, BNode, URIRef, Literal)):
+            return self.term(node)
+        if isinstance(node, dict):
+            return '{' + ','.join(f"{self.serialize(k)}:{self.serialize(v)}" for k, v in node.items()) + '}'
+        if isinstance(node, (list, tuple)):
+            return '[' + ','.join(self.serialize(item) for item in node) + ']'
+        if isinstance(node, (set, frozenset)):
+            return '{' + ','.join(sorted(self.serialize(item) for item in node)) + '}'
+        return repr(node)
+
+    def serialize_projection(self, variables) -> str:
+        if self.projection is not None and list(variables) == self.projection:
+            return self.serialize(list(variables))
+        return self.serialize(set(variables))
+
+
+def canonicalize_with_rdflib(sparql_query: str, rename_variables: bool = True) -> Optional[str]:
+    """
+    Canonicalizes a SPARQL query in-process via rdflib's algebra.
+
+    Parameters:
+        sparql_query (str): The SPARQL query.
+        rename_variables (bool): Normalize variable names. Disable when the projected
+            variable names matter, e.g. when the canonical form keys query results.
+
+    Returns:
+        Optional[str]: The canonical form, or None if rdflib cannot parse the query.
+    """
+    return _canonicalize(sparql_query, rename_variables)
+
+
+def canonical_template(sparql_query: str, template_namespaces: Sequence[str]) -> Optional[str]:
+    """
+    The canonical form with variables renamed and every IRI outside `template_namespaces`
+    (entities) and every literal abstracted, so all queries instantiated from one template
+    share it, whatever their triple order, spacing or prefixes. None if rdflib cannot parse it.
+    """
+    return _canonicalize(sparql_query, True, template_namespaces)
+
+
+def _canonicalize(sparql_query: str, rename_variables: bool,
+                  template_namespaces: Optional[Sequence[str]] = None) -> Optional[str]:
+    try:
+        with RDFLIB_LOCK:
+            parsed = parseQuery(sparql_query)
+            query = translateQuery(parsed)
+        projection = None
+        if parsed[1].name == 'SelectQuery' and 'projection' in parsed[1]:
+            projection = list(query.algebra['PV'])
+        return _AlgebraSerializer(rename_variables, projection, template_namespaces).serialize(query.algebra)
+    except Exception:
+        return None
+
+
+def canonicalize(sparql_query: str, jena_fallback: Optional[Callable[[str], Optional[str]]] = None) -> Optional[str]:
+    """
+    Canonicalizes with rdflib and falls back to Jena for the queries rdflib cannot handle.
+    """
+    canonical = canonicalize_with_rdflib(sparql_query)
+    if canonical is None and jena_fallback is not None:
+        canonical = jena_fallback(sparql_query)
+    return canonical
+
+
+def canonicalize_batch(sparql_queries: List[str],
+                       jena_fallback_many: Optional[Callable[[List[str]], List[Optional[str]]]] = None
+                       ) -> List[Optional[str]]:
+    """
+    Batch version of `canonicalize`; the rdflib failures are sent to `jena_fallback_many`
+    (e.g. JenaCanonicalizerPool.canonicalize_many) in a single call.
+    """
+    with tracing.span('canonicalize', queries=len(sparql_queries)):
+        results = [canonicalize_with_rdflib(query) for query in sparql_queries]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing and jena_fallback_many is not None:
+        with tracing.span('canonicalize.jena', queries=len(missing)):
+            fallbacks = jena_fallback_many([sparql_queries[i] for i in missing])
+        for i, canonical in zip(missing, fallbacks):
+            results[i] = canonical
+    return results
+
+
+def _clusters(canonical_forms: List[Optional[str]], indices: Iterable[int]):
+    groups = defaultdict(list)
+    for i in indices:
+        groups[hashlib.sha1(canonical_forms[i].encode('utf-8')).hexdigest()].append(i)
+    cluster_of = {}
+    for members in groups.values():
+        for i in members:
+            cluster_of[i] = frozenset(members)
+    return cluster_of
+
+
+def agreement_report(sparql_queries: List[str],
+                     jena_canonicalize_many: Callable[[List[str]], List[Optional[str]]]) -> dict:
+    """
+    Compares the dedup decisions of the rdflib canonicalizer with Jena on a sample.
+
+    For every query that both canonicalizers handle, its rdflib duplicate cluster is
+    compared with its Jena duplicate cluster. `rdflib_merges_more` counts queries that
+    rdflib groups with a query Jena keeps apart (would be wrongly dropped);
+    `rdflib_merges_less` counts the opposite (duplicates rdflib would keep).
+    """
+    rdflib_forms = [canonicalize_with_rdflib(query) for query in sparql_queries]
+    jena_forms = jena_canonicalize_many(sparql_queries)
+
+    both = [i for i in range(len(sparql_queries)) if rdflib_forms[i] is not None and jena_forms[i] is not None]
+    rdflib_clusters = _clusters(rdflib_forms, both)
+    jena_clusters = _clusters(jena_forms, both)
+
+    agree = merges_more = merges_less = 0
+    for i in both:
+        if rdflib_clusters[i] == jena_clusters[i]:
+            agree += 1
+        if rdflib_clusters[i] - jena_clusters[i]:
+            merges_more += 1
+        if jena_clusters[i] - rdflib_clusters[i]:
+            merges_less += 1
+
+    return {
+        'queries': len(sparql_queries),
+        'rdflib_handled': sum(form is not None for form in rdflib_forms),
+        'jena_handled': sum(form is not None for form in jena_forms),
+        'jena_only': sum(r is None and j is not None for r, j in zip(rdflib_forms, jena_forms)),
+        'compared': len(both),
+        'rdflib_unique': len(set(rdflib_clusters.values())),
+        'jena_unique': len(set(jena_clusters.values())),
+        'agree': agree,
+        'agreement_rate': round(agree / len(both), 4) if both else None,
+        'rdflib_merges_more': merges_more,
+        'rdflib_merges_less': merges_less,
+    }
+
+
+if __name__ == '__main__':
+    from jena_pool import JenaCanonicalizerPool, load_sample_queries
+
+    parser = argparse.ArgumentParser(description="Agreement report of the rdflib canonicalizer against Jena.")
+    parser.add_argument("input_csv", help="query log with a 'query' column")
+    parser.add_argument("--sample", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    sample = load_sample_queries(args.input_csv, args.sample)
+    with JenaCanonicalizerPool(args.workers) as pool:
+        report = agreement_report(sample, pool.canonicalize_many)
+    for key, value in report.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,165 @@
+import http.client
+import json
+import socket
+import threading
+import time
+import urllib.parse
+from typing import Iterator, List, Optional, Union
+
+from sparql_results import READ_SIZE, ResultStream
+
+# Endpoints written as local:<index directory> are answered in-process by local_sparql
+LOCAL_SCHEME = 'local:'
+
+
+def is_local(sparql_endpoint: str) -> bool:
+    return bool(sparql_endpoint) and sparql_endpoint.startswith(LOCAL_SCHEME)
+
+
+class SPARQLQueryError(Exception):
+    """A query failed; the subclass tells why."""
+
+
+class SPARQLTimeoutError(SPARQLQueryError):
+    pass
+
+
+class SPARQLSyntaxError(SPARQLQueryError):
+    pass
+
+
+class SPARQLEndpointError(SPARQLQueryError):
+    pass
+
+
+class SPARQLClient:
+    """
+    Minimal SPARQL protocol client with one keep-alive HTTP connection per thread.
+
+    `query` enforces a wall-clock timeout per query and raises SPARQLTimeoutError,
+    SPARQLSyntaxError or SPARQLEndpointError instead of printing and returning None.
+    """
+
+    def __init__(self, endpoint: str, timeout: float = 60.0):
+        url = urllib.parse.urlsplit(endpoint)
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.path = (url.path or '/') + (f"?{url.query}" if url.query else '')
+        self.local = threading.local()
+
+    def _connection(self, timeout: float):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.connection_class(self.netloc, timeout=timeout)
+            self.local.connection = connection
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection
+
+    def reset(self):
+        """Drops this thread's connection, e.g. after a timeout left it mid-response."""
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    def request(self, sparql_query: str, timeout: Optional[float] = None):
+        """
+        Sends the query and returns the open response with its deadline; `query` reads it whole.
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        body = urllib.parse.urlencode({'query': sparql_query})
+        headers = {
+            'Accept': 'application/sparql-results+json',
+            'Content-Type': 'application/x-www-form-urlencoded',
+        }
+        for attempt in range(2):
+            reused = getattr(self.local, 'connection', None) is not None
+            connection = self._connection(timeout)
+            try:
+                connection.request('POST', self.path, body, headers)
+                return connection.getresponse(), deadline
+            except (socket.timeout, TimeoutError):
+                self.reset()
+                raise SPARQLTimeoutError(f"No response within {timeout}s")
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.CannotSendRequest) as e:
+                # The server closed an idle keep-alive connection; reconnect once.
+                self.reset()
+                if attempt or not reused:
+                    raise SPARQLEndpointError(str(e))
+            except OSError as e:
+                self.reset()
+                raise SPARQLEndpointError(str(e))
+
+    def iter_content(self, response, deadline: float) -> Iterator[bytes]:
+        """Yields the response body in chunks as it arrives, enforcing the deadline."""
+        try:
+            while True:
+                if time.monotonic() > deadline:
+                    self.reset()
+                    raise SPARQLTimeoutError("Reading the result exceeded the timeout")
+                chunk = response.read1(READ_SIZE)
+                if not chunk:
+                    # read1 does not mark a fully read response closed, which keep-alive needs
+                    response.close()
+                    break
+                yield chunk
+        except (socket.timeout, TimeoutError):
+            self.reset()
+            raise SPARQLTimeoutError("Reading the result exceeded the timeout")
+        except (http.client.IncompleteRead, ConnectionError) as e:
+            self.reset()
+            raise SPARQLEndpointError(str(e))
+
+    def read(self, response, deadline: float) -> bytes:
+        return b''.join(self.iter_content(response, deadline))
+
+    def check_status(self, response, payload: bytes):
+        if response.status == 200:
+            return
+        message = payload.decode('utf-8', errors='replace')[:500]
+        lowered = message.lower()
+        if response.status in (408, 504) or 'timeout' in lowered or 'timed out' in lowered:
+            raise SPARQLTimeoutError(message)
+        if response.status == 400:
+            raise SPARQLSyntaxError(message)
+        raise SPARQLEndpointError(f"HTTP {response.status}: {message}")
+
+    def query(self, sparql_query: str, timeout: Optional[float] = None) -> dict:
+        """Runs a query and returns the parsed SPARQL JSON result."""
+        response, deadline = self.request(sparql_query, timeout)
+        payload = self.read(response, deadline)
+        self.check_status(response, payload)
+        try:
+            return json.loads(payload)
+        except ValueError as e:
+            raise SPARQLEndpointError(f"Invalid JSON result: {e}")
+
+    def query_answer(self, sparql_query: str, timeout: Optional[float] = None,
+                     max_rows: Optional[int] = None) -> Union[bool, List[dict]]:
+        """
+        Runs a query and returns its flattened rows (like utils.extruct_values), or the
+        boolean of an ASK query. Rows are parsed while the response streams in, and once
+        `max_rows` rows are read the rest of the response is not downloaded.
+        """
+        response, deadline = self.request(sparql_query, timeout)
+        if response.status != 200:
+            self.check_status(response, self.read(response, deadline))
+        content = self.iter_content(response, deadline)
+        stream = ResultStream(content, max_rows)
+        try:
+            rows = list(stream)
+        except ValueError as e:
+            self.reset()
+            raise SPARQLEndpointError(f"Invalid JSON result: {e}")
+        if stream.truncated:
+            # The connection is mid-response; a fresh one is cheaper than draining it
+            self.reset()
+        else:
+            for _ in content:
+                pass
+        return stream.boolean if stream.boolean is not None else rows
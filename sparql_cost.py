@@ -0,0 +1,256 @@
+import argparse
+import json
+import logging
+import re
+import sys
+from typing import Dict, List, Optional
+
+from rdflib.paths import MulPath, Path
+from rdflib.plugins.sparql.algebra import translateQuery
+from rdflib.plugins.sparql.parser import parseQuery
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.term import BNode, Variable
+
+from config import Config
+from sparql_canonical import RDFLIB_LOCK
+
+COST_CLASSES = ('cheap', 'moderate', 'expensive', 'unparsed')
+# Expensive queries get the shortest timeout so they fail fast instead of blocking a worker
+DEFAULT_TIMEOUTS = {'cheap': 60.0, 'moderate': 30.0, 'expensive': 10.0, 'unparsed': 30.0}
+LIMIT_PATTERN = re.compile(r'(\bLIMIT\s+)(\d+)(?=(\s+OFFSET\s+\d+)?\s*$)', re.IGNORECASE)
+
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """'cheap=60,expensive=5' -> DEFAULT_TIMEOUTS with those classes overridden."""
+    timeouts = dict(DEFAULT_TIMEOUTS)
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, seconds = item.partition('=')
+        if name.strip() not in timeouts:
+            raise ValueError(f"Unknown cost class {name.strip()!r}, expected one of {COST_CLASSES}")
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+def _is_variable(term) -> bool:
+    return isinstance(term, (Variable, BNode))
+
+
+def _is_transitive(path) -> bool:
+    if isinstance(path, MulPath):
+        return path.mod in ('*', '+')
+    return any(_is_transitive(arg) for arg in getattr(path, 'args', ()))
+
+
+def _collect(node, scope: list, scopes: List[list], values: set):
+    """Gathers the triple patterns of `node` into scopes; UNION branches get scopes of their own."""
+    if isinstance(node, CompValue):
+        if node.name == 'BGP':
+            scope.extend(node.get('triples', []))
+            return
+        if node.name == 'Union':
+            for branch in (node.p1, node.p2):
+                branch_scope = []
+                scopes.append(branch_scope)
+                _collect(branch, branch_scope, scopes, values)
+            return
+        if node.name == 'values':
+            for row in node.get('res') or []:
+                values.update(row)
+            return
+        for key, value in node.items():
+            if not key.startswith('_'):
+                _collect(value, scope, scopes, values)
+    elif isinstance(node, (list, tuple)):
+        for item in node:
+            _collect(item, scope, scopes, values)
+
+
+def _components(triples: list) -> List[list]:
+    """Triple patterns grouped by shared variables (union-find)."""
+    parent = list(range(len(triples)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, triple in enumerate(triples):
+        for term in triple:
+            if _is_variable(term):
+                if term in owner:
+                    parent[find(i)] = find(owner[term])
+                else:
+                    owner[term] = i
+    groups = {}
+    for i, triple in enumerate(triples):
+        groups.setdefault(find(i), []).append(triple)
+    return list(groups.values())
+
+
+def analyze(sparql_query: str) -> dict:
+    """
+    Static cost estimate of a query from the shape of its basic graph patterns.
+
+    Triple patterns are grouped into components by shared variables. A component is
+    anchored when one of its patterns has a constant (or VALUES-bound) subject or
+    object; an unanchored one such as `?p dblp:authoredBy ?a` scans a whole predicate.
+
+    Returns a dict with the query `form`, the `cost` class (see COST_CLASSES), the
+    `issues` found (unbound_pattern, unanchored, cartesian_product, property_path,
+    transitive_path, missing_limit), the top-level `limit` and whether the query
+    returns a single aggregate row.
+    """
+    try:
+        with RDFLIB_LOCK:
+            query = translateQuery(parseQuery(sparql_query))
+    except Exception:
+        return {'form': None, 'cost': 'unparsed', 'issues': [], 'limit': None, 'single_row': False}
+    algebra = query.algebra
+    form = algebra.name.replace('Query', '').upper()
+    scopes, values = [[]], set()
+    _collect(algebra, scopes[0], scopes, values)
+
+    issues = set()
+    expensive = False
+    for scope in scopes:
+        components = _components(scope)
+        if len(components) > 1:
+            issues.add('cartesian_product')
+        for component in components:
+            anchored = any(not _is_variable(s) or not _is_variable(o) or s in values or o in values
+                           for s, _, o in component)
+            unbound = any(all(_is_variable(term) for term in triple) for triple in component)
+            transitive = any(isinstance(p, Path) and _is_transitive(p) for _, p, _ in component)
+            if unbound:
+                issues.add('unbound_pattern')
+            if transitive:
+                issues.add('transitive_path')
+            if any(isinstance(p, Path) for _, p, _ in component):
+                issues.add('property_path')
+            if not anchored:
+                issues.add('unanchored')
+                expensive = expensive or unbound or transitive or len(components) > 1
+
+    limit = algebra.p.length if algebra.p.name == 'Slice' else None
+    # An aggregate without GROUP BY yields exactly one row
+    single_row = any(isinstance(node, CompValue) and node.name == 'Group' and not node.get('expr')
+                     for node in _walk(algebra))
+    if form == 'SELECT' and limit is None and not single_row:
+        issues.add('missing_limit')
+
+    if expensive:
+        cost = 'expensive'
+    elif issues & {'unanchored', 'cartesian_product', 'transitive_path', 'unbound_pattern'}:
+        cost = 'moderate'
+    else:
+        cost = 'cheap'
+    return {'form': form, 'cost': cost, 'issues': sorted(issues), 'limit': limit, 'single_row': single_row}
+
+
+def _walk(node):
+    if isinstance(node, CompValue):
+        yield node
+        for key, value in node.items():
+            if not key.startswith('_'):
+                yield from _walk(value)
+    elif isinstance(node, (list, tuple)):
+        for item in node:
+            yield from _walk(item)
+
+
+def _slice(sparql_query: str):
+    try:
+        with RDFLIB_LOCK:
+            algebra = translateQuery(parseQuery(sparql_query)).algebra
+    except Exception:
+        return None
+    return (algebra.p.start, algebra.p.length) if algebra.p.name == 'Slice' else None
+
+
+def cap_limit(sparql_query: str, max_rows: int, current: Optional[int]) -> Optional[str]:
+    """
+    The query with its top-level LIMIT injected or lowered to `max_rows`, or None when
+    the rewrite cannot be done safely. The rewrite is textual and is only accepted if
+    the re-parsed query has exactly the intended LIMIT (and the same OFFSET).
+    """
+    before = _slice(sparql_query)
+    start = before[0] if before else 0
+    if current is None:
+        rewritten = sparql_query.rstrip() + f"\nLIMIT {max_rows}"
+    else:
+        matches = list(LIMIT_PATTERN.finditer(sparql_query))
+        if len(matches) != 1:
+            return None
+        rewritten = LIMIT_PATTERN.sub(lambda m: m.group(1) + str(max_rows), sparql_query)
+    return rewritten if _slice(rewritten) == (start, max_rows) else None
+
+
+class QueryPlan:
+    """
+    How a generated query is executed: possibly with a LIMIT cap, with a timeout of its
+    cost class and at most `max_rows` rows read. `changes` lists every rewrite, and
+    `report` records them next to a prediction so capped answers stay identifiable.
+    """
+
+    def __init__(self, sparql: str, analysis: dict, timeout: float, max_rows: Optional[int]):
+        self.original = sparql
+        self.sparql = sparql
+        self.cost = analysis['cost']
+        self.issues = analysis['issues']
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.changes: List[str] = []
+
+    def report(self, answer=None) -> dict:
+        report = {'cost': self.cost, 'issues': self.issues, 'timeout': self.timeout, 'changes': self.changes}
+        if self.sparql != self.original:
+            report['executed_sparql'] = self.sparql
+        if self.max_rows is not None and isinstance(answer, list) and len(answer) >= self.max_rows:
+            report['truncated'] = True
+        return report
+
+
+def plan(sparql_query: str, timeouts: Optional[Dict[str, float]] = None,
+         max_rows: Optional[int] = None) -> QueryPlan:
+    """
+    Plans the execution of one (LLM-generated) query.
+
+    Cheap queries run unchanged. For the others a SELECT without LIMIT gets LIMIT
+    `max_rows` and a larger LIMIT is lowered to it; ASK, CONSTRUCT, DESCRIBE and single
+    aggregate rows are never rewritten.
+
+    Parameters:
+        timeouts (Dict[str, float]): Seconds per cost class; Config.SPARQL_COST_TIMEOUTS
+            (or DEFAULT_TIMEOUTS) by default.
+        max_rows (int): Row cap; Config.SPARQL_MAX_ROWS by default, 0 disables it.
+    """
+    if timeouts is None:
+        timeouts = parse_timeouts(Config.SPARQL_COST_TIMEOUTS)
+    if max_rows is None:
+        max_rows = Config.SPARQL_MAX_ROWS
+    analysis = analyze(sparql_query)
+    query_plan = QueryPlan(sparql_query, analysis, timeouts[analysis['cost']], max_rows or None)
+    limit = analysis['limit']
+    if (max_rows and analysis['cost'] != 'cheap' and analysis['form'] == 'SELECT' and not analysis['single_row']
+            and (limit is None or limit > max_rows)):
+        rewritten = cap_limit(sparql_query, max_rows, limit)
+        if rewritten is None:
+            logging.warning(f"Could not cap the LIMIT of a {analysis['cost']} query; it runs unchanged")
+        else:
+            query_plan.sparql = rewritten
+            query_plan.changes.append(f"limit {'injected' if limit is None else f'lowered from {limit}'}: {max_rows}")
+    return query_plan
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Estimate the cost of SPARQL queries and show how they would run.")
+    parser.add_argument("queries", nargs='*', help="Queries (default: one per line on stdin)")
+    parser.add_argument("--max-rows", type=int, default=None)
+    args = parser.parse_args()
+
+    queries = args.queries or [line for line in sys.stdin.read().splitlines() if line.strip()]
+    for sparql in queries:
+        query_plan = plan(sparql, max_rows=args.max_rows)
+        print(json.dumps(dict(query_plan.report(), sparql=query_plan.sparql), ensure_ascii=False))
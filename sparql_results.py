@@ -0,0 +1,210 @@
+import argparse
+import codecs
+import json
+import re
+import time
+import tracemalloc
+from typing import Iterable, Iterator, List, Optional, Union
+
+READ_SIZE = 65536
+
+_SEPARATOR = re.compile(r'[\s,]*')
+_RESULT_START = re.compile(r'(?<!\\)"(?:boolean"\s*:\s*(true|false)\b|bindings"\s*:\s*\[)')
+_decoder = json.JSONDecoder()
+
+
+def _texts(chunks: Iterable[Union[bytes, str]]) -> Iterator[str]:
+    """Decodes byte chunks incrementally, so multi-byte characters may span chunks."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _scan(texts: Iterator[str], pattern) -> tuple:
+    """Reads until `pattern` matches; returns the match and the text after it."""
+    buffer = ''
+    for text in texts:
+        buffer += text
+        match = pattern.search(buffer)
+        if match:
+            return match, buffer[match.end():]
+        # Keep a tail in case the pattern spans two chunks
+        buffer = buffer[-256:]
+    return None, ''
+
+
+def _iter_elements(texts: Iterator[str], buffer: str) -> Iterator:
+    """Decodes the elements of a JSON array whose opening bracket has been consumed."""
+    position = 0
+    while True:
+        position = _SEPARATOR.match(buffer, position).end()
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            if position == len(buffer):
+                raise ValueError("need more input")
+            value, position = _decoder.raw_decode(buffer, position)
+        except ValueError:
+            # The element is not complete yet: drop what was consumed and read on
+            text = next(texts, None)
+            if text is None:
+                raise ValueError("JSON array ended prematurely")
+            buffer = buffer[position:] + text
+            position = 0
+            continue
+        yield value
+
+
+def iter_json_array(chunks: Iterable[Union[bytes, str]], key: Optional[str] = None) -> Iterator:
+    """
+    Yields the elements of the array stored under `key` in a streamed JSON document
+    (or of the top-level array if `key` is None), one at a time, without holding the
+    whole document in memory.
+
+    The first `"key": [` outside a string value is used. Elements must be objects,
+    arrays or strings (a bare number could be cut off at a chunk boundary).
+    """
+    if key is None:
+        pattern = re.compile(r'^\ufeff?\s*\[')
+    else:
+        pattern = re.compile(r'(?<!\\)"' + re.escape(key) + r'"\s*:\s*\[')
+    texts = _texts(chunks)
+    match, buffer = _scan(texts, pattern)
+    if match is None:
+        return
+    yield from _iter_elements(texts, buffer)
+
+
+def flatten_binding(binding: dict) -> dict:
+    """One row in the shape of utils.extruct_values: variable -> value, unbound or empty values dropped."""
+    row = {}
+    for key, value_info in binding.items():
+        value = value_info.get('value')
+        if value:
+            row[key] = value
+    return row
+
+
+class ResultStream:
+    """
+    Incremental reader of a SPARQL JSON result.
+
+    Iterating yields flattened rows as the `results.bindings` array arrives, at most
+    `max_rows` of them. For ASK results nothing is yielded and `boolean` is set
+    instead. `truncated` tells whether rows were left unread because of the cap.
+    """
+
+    def __init__(self, chunks: Iterable[Union[bytes, str]], max_rows: Optional[int] = None):
+        self.texts = _texts(chunks)
+        self.max_rows = max_rows
+        self.boolean = None
+        self.truncated = False
+        self.rows = 0
+
+    def __iter__(self) -> Iterator[dict]:
+        match, buffer = _scan(self.texts, _RESULT_START)
+        if match is None:
+            raise ValueError("Not a SPARQL JSON result: neither bindings nor boolean found")
+        if match.group(1) is not None:
+            self.boolean = match.group(1) == 'true'
+            return
+        for binding in _iter_elements(self.texts, buffer):
+            if self.max_rows is not None and self.rows >= self.max_rows:
+                self.truncated = True
+                return
+            self.rows += 1
+            yield flatten_binding(binding)
+
+
+def read_answer(chunks: Iterable[Union[bytes, str]], max_rows: Optional[int] = None) -> Union[bool, List[dict]]:
+    """The flattened rows of a streamed result, or its boolean for ASK queries."""
+    stream = ResultStream(chunks, max_rows)
+    rows = list(stream)
+    return stream.boolean if stream.boolean is not None else rows
+
+
+def synthetic_response(rows: int, chunk_size: int = READ_SIZE) -> Iterator[bytes]:
+    """A DBLP-like SELECT result with `rows` bindings, produced in byte chunks."""
+    def parts():
+        yield '{"head": {"vars": ["publication", "title", "year"]}, "results": {"bindings": ['
+        for i in range(rows):
+            binding = {
+                'publication': {'type': 'uri', 'value': f"https://dblp.org/rec/conf/venue/Author{i:07d}"},
+                'title': {'type': 'literal', 'value': f"On the streaming of SPARQL results, part {i} – revisited"},
+                'year': {'type': 'literal', 'datatype': 'http://www.w3.org/2001/XMLSchema#gYear',
+                         'value': str(1990 + i % 35)},
+            }
+            yield (', ' if i else '') + json.dumps(binding, ensure_ascii=False)
+        yield ']}}'
+
+    buffer = bytearray()
+    for part in parts():
+        buffer += part.encode('utf-8')
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def _measure(run) -> tuple:
+    """(seconds, seconds to first row, peak MiB) of `run(on_row)`; memory is traced in a second pass."""
+    first_row = []
+    start = time.perf_counter()
+    run(lambda: first_row or first_row.append(time.perf_counter() - start))
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    run(lambda: None)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(seconds, 3), round(first_row[0] if first_row else seconds, 4), round(peak / 2 ** 20, 1)
+
+
+def benchmark(rows: int, max_rows: Optional[int] = None) -> dict:
+    """
+    Time, time to first row and peak memory of json.loads + utils.extruct_values versus
+    ResultStream on a synthetic response. Chunks are generated lazily, as if read from a socket.
+
+    `stream` keeps every row, like read_answer and the clients' query_answer, so it is
+    compared like for like with `full`; `stream_discard` drops each row once seen, the
+    bound for consumers that aggregate rows on the fly.
+    """
+    from utils import extruct_values
+
+    def full(on_row):
+        answer = extruct_values(json.loads(b''.join(synthetic_response(rows))))
+        for _ in answer[:max_rows]:
+            on_row()
+        return answer
+
+    def stream(on_row):
+        answer = []
+        for row in ResultStream(synthetic_response(rows), max_rows):
+            answer.append(row)
+            on_row()
+        return answer
+
+    def stream_discard(on_row):
+        for _ in ResultStream(synthetic_response(rows), max_rows):
+            on_row()
+
+    report = {'rows': rows, 'max_rows': max_rows}
+    for name, run in (('full', full), ('stream', stream), ('stream_discard', stream_discard)):
+        seconds, first_row, peak_mb = _measure(run)
+        report.update({f"{name}_seconds": seconds, f"{name}_first_row_seconds": first_row,
+                       f"{name}_peak_mb": peak_mb})
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the streaming SPARQL result reader.")
+    parser.add_argument("--rows", type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument("--max-rows", type=int, default=None)
+    args = parser.parse_args()
+
+    for n in args.rows:
+        print(json.dumps(benchmark(n, args.max_rows)))
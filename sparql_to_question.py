@@ -1,10 +1,15 @@
 import json
+import os
 from typing import List
-import llms
 import utils
 import csv
 from config import Config
+from answer_materializer import STATUS_EMPTY, STATUS_OK, latest_records, materialize_answers
+from llm_cache import cached_llm_call
+from llm_runner import RateLimiter, pending_items, run_batches
+import prompt_assembly
 
+llms = utils.LazyModule('llms')
 
 
 def chunk_list(lst, batch_size):
@@ -12,7 +17,31 @@ def chunk_list(lst, batch_size):
         yield lst[i:i + batch_size]
 
 
-def format_prompt(input_batch: List[dict]):
+def item_tokens(item):
+    return utils.estimate_tokens(json.dumps(item, ensure_ascii=False, indent=2))
+
+
+def chunk_by_token_budget(lst, max_prompt_tokens, max_items=50):
+    """
+    Packs items in order into batches whose estimated prompt size (the fixed few-shot
+    prompt plus the serialized items) stays within `max_prompt_tokens`. An item that is
+    too large on its own still gets a batch of its own.
+    """
+    overhead = utils.estimate_tokens(format_prompt([], record_stats=False))
+    batch, batch_tokens = [], overhead
+    for item in lst:
+        tokens = item_tokens(item)
+        if batch and (batch_tokens + tokens > max_prompt_tokens or len(batch) >= max_items):
+            yield batch
+            batch, batch_tokens = [], overhead
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def format_prompt_template():
+    """The batch prompt as a str.format template with a single {input_batch} field at the end."""
     INPUT_FORMAT = '''\
     Input format: JSON objects, each with at least query and sparql fields.
     Batch processing: Handle a list (array) of JSON objects per batch.
@@ -59,11 +88,7 @@ def format_prompt(input_batch: List[dict]):
       ]
     }}
     If no entities are present or mappable, return an empty list for entities.
-    Input batch (array of examples):
-    json
-    {input_batch}
-
-    Expected Output (for above input):
+    Expected Output (for the input example above):
     json
     [
       {{
@@ -101,49 +126,146 @@ def format_prompt(input_batch: List[dict]):
 
     Always deliver the output as a JSON array in the specified format, matching the batch size of the input.
     '''
-    input_json = json.dumps(input_batch, ensure_ascii=False, indent=2)
-    prompt = INPUT_FORMAT + OUTPUT_FORMAT + PROMPT_TEMPLATE.format(input_batch=input_json) + INSTRUCTIONS
-    return prompt
+
+    INPUT_BATCH = '''
+    Input batch (array of examples):
+    json
+    {input_batch}
+    '''
+    # Everything static comes first and is byte-identical across batches; the batch goes last
+    return INPUT_FORMAT + OUTPUT_FORMAT + PROMPT_TEMPLATE + INSTRUCTIONS + INPUT_BATCH
+
+
+def format_prompt(input_batch: List[dict], record_stats=True):
+    template = prompt_assembly.compiled('sparql_to_question', lambda: prompt_assembly.CompiledPrompt(
+        'sparql_to_question', format_prompt_template()))
+    render = template.render if record_stats else template.build
+    return render(input_batch=json.dumps(input_batch, ensure_ascii=False, indent=2))
 
 
 def process_batch(input_batch):
     prompt = format_prompt(input_batch)
     try:
-        result = llms.chatgpt(prompt, 3)
+        result = cached_llm_call('openai', Config.LLMS['openai']['model'], prompt, {'n': 3},
+                                 lambda: llms.chatgpt(prompt, 3),
+                                 validate=lambda result: is_complete(input_batch, result))
         return result
     except Exception as e:
-        print("Failed to parse output:", result)
+        print("Failed to get output for batch:", e)
         raise e
 
 
-def main(input_filename, output_filename, batch_size=10):
+def validate_outputs(input_batch, outputs):
+    """
+    Matches LLM outputs to the input batch by id.
+
+    Returns:
+      (valid, missing): well-formed output records for ids of the batch, and the input
+      items that got no well-formed output.
+    """
+    expected = {str(item['id']): item for item in input_batch}
+    valid = {}
+    for record in outputs if isinstance(outputs, list) else []:
+        if not isinstance(record, dict):
+            continue
+        qid = str(record.get('id'))
+        if qid in expected and qid not in valid \
+                and isinstance(record.get('formal_question'), str) and isinstance(record.get('entities'), list):
+            valid[qid] = record
+    missing = [item for qid, item in expected.items() if qid not in valid]
+    return list(valid.values()), missing
+
+
+def is_complete(input_batch, result):
+    """Whether an LLM result has a well-formed output for every item of the batch; only those are cached."""
+    outputs = result.get('outputs') if isinstance(result, dict) else None
+    return not validate_outputs(input_batch, outputs)[1]
+
+
+def process_items(input_batch, max_resends=2, acquire=None):
+    """
+    Like process_batch, but checks the returned array against the input ids and re-sends
+    only the missing or malformed items, halving the re-sent batch each round. Errors of
+    the first call propagate so the caller can back off and retry; items that still fail
+    after `max_resends` rounds are left out and picked up by the next run.
+
+    `acquire(batch)` is called before every re-send, e.g. to take it from the rate limit
+    (the first call is limited by the caller).
+    """
+    result = process_batch(input_batch)
+    valid, missing = validate_outputs(input_batch, result.get('outputs') if isinstance(result, dict) else None)
+    if missing and max_resends > 0:
+        half = (len(missing) + 1) // 2
+        for resend in (missing[:half], missing[half:]):
+            if not resend:
+                continue
+            try:
+                if acquire is not None:
+                    acquire(resend)
+                valid.extend(process_items(resend, max_resends - 1, acquire))
+            except Exception as e:
+                print(f"Re-sending {len(resend)} items failed: {e}")
+    elif missing:
+        print(f"No valid output for ids {[item['id'] for item in missing]}")
+    return valid
+
+
+def main(input_filename, output_filename, batch_size=10, concurrency=4, requests_per_minute=None,
+         tokens_per_minute=None, max_prompt_tokens=None):
     input_data = utils.load_json_data(file_name=input_filename)
-    output_data = utils.load_json_data(file_name=output_filename)
-    id_counter = 0
-    for batch in chunk_list(input_data[32:], batch_size):
-        print(f"Processing batch {id_counter // batch_size + 1} ...")
-        batch_result = process_batch(batch)
-        output_data.extend(batch_result['outputs'])
-        utils.write_to_json(output_data,output_filename)
+    journal_path = os.path.splitext(output_filename)[0] + ".jsonl"
+    if not os.path.exists(journal_path) and os.path.exists(output_filename):
+        # Seed the journal with the output of runs made before journaling existed
+        utils.append_jsonl(utils.load_json_data(file_name=output_filename), journal_path)
 
+    pending = pending_items(input_data, journal_path)
+    print(f"{len(input_data) - len(pending)} of {len(input_data)} queries already processed")
+    if max_prompt_tokens:
+        batches = chunk_by_token_budget(pending, max_prompt_tokens)
+    else:
+        batches = chunk_list(pending, batch_size)
+    rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    prompt_tokens = lambda batch: utils.estimate_tokens(format_prompt(batch, record_stats=False))
+    stats = run_batches(
+        batches,
+        lambda batch: process_items(batch, acquire=lambda resend: rate_limiter.acquire(prompt_tokens(resend))),
+        journal_path,
+        concurrency=concurrency,
+        rate_limiter=rate_limiter,
+        prompt_tokens=prompt_tokens,
+    )
+    print(f"Processed {stats['batches']} batches, {stats['failed_batches']} failed")
+    utils.write_to_json(utils.load_jsonl(journal_path), output_filename)
 
-def generate_answer(out_file="log_data/question_sparql_answer.json"):
+
+def generate_answer(out_file="log_data/question_sparql_answer.json", workers=8, timeout=60.0):
     questions = utils.load_json_data("log_data/generated_questions.json")
     question_sparql = utils.load_json_data("log_data/filter_queries_by_jaccard_similarity.json")
     questions_sparql_ids = {}
-    question_sparql_answer = utils.load_json_data(out_file)
     for item in question_sparql:
         questions_sparql_ids.update({str(item['id']):item['query']})
 
-    for qs in questions[516:]:
-        if qs['entities']:
-            sparql = questions_sparql_ids[qs['id']]
-            result = utils.run_sparql_query(sparql_endpoint=Config.SPARQL_ENDPOINT,sparql_query=sparql)
-            if result:
-                answer = utils.extruct_values(result)
-                qs.update({'answer':answer, 'sparql':sparql})
-                question_sparql_answer.append(qs)
-                utils.write_to_json(question_sparql_answer,out_file)
+    answers_file = os.path.splitext(out_file)[0] + ".jsonl"
+    if not os.path.exists(answers_file) and os.path.exists(out_file):
+        # Seed the journal with answers from runs made before journaling existed
+        utils.append_jsonl([{'id': qs['id'], 'sparql': qs['sparql'], 'answer': qs['answer'],
+                             'status': STATUS_OK if qs['answer'] else STATUS_EMPTY}
+                            for qs in utils.load_json_data(out_file)], answers_file)
+
+    questions = [qs for qs in questions if qs['entities']]
+    counts = materialize_answers(({'id': qs['id'], 'sparql': questions_sparql_ids[qs['id']]} for qs in questions),
+                                 answers_file, Config.SPARQL_ENDPOINT, workers, timeout)
+    print(f"Answered queries by status: {counts}")
+
+    answers = {str(record['id']): record for record in latest_records(answers_file)
+               if record['status'] in (STATUS_OK, STATUS_EMPTY)}
+    question_sparql_answer = []
+    for qs in questions:
+        record = answers.get(str(qs['id']))
+        if record:
+            qs.update({'answer': record['answer'], 'sparql': record['sparql']})
+            question_sparql_answer.append(qs)
+    utils.write_to_json(question_sparql_answer, out_file)
 
 
 def update_data():
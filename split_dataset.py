@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import json
+import os
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import columnar_dataset
+import sparql_results
+from local_sparql import gold_query
+from near_duplicates import SCHEMA_NAMESPACES, query_shape
+from sparql_canonical import canonical_template
+
+DEFAULT_RATIOS = 'train=0.8,test=0.2'
+
+
+def parse_ratios(spec: str) -> List[Tuple[str, float]]:
+    """'train=0.8,dev=0.1,test=0.1' -> [(split, share)], shares normalized to sum to 1."""
+    ratios = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, share = item.partition('=')
+        ratios.append((name.strip(), float(share)))
+    total = sum(share for _, share in ratios)
+    if not ratios or total <= 0 or any(share < 0 for _, share in ratios):
+        raise ValueError(f"Invalid split ratios: {spec!r}")
+    return [(name, share / total) for name, share in ratios]
+
+
+def _chunks(path: str) -> Iterator[bytes]:
+    """Raw bytes of a JSON file, or of the single JSON file inside a .zip archive."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = [name for name in archive.namelist() if not name.endswith('/')]
+            with archive.open(names[0]) as f:
+                yield from iter(lambda: f.read(sparql_results.READ_SIZE), b'')
+        return
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(sparql_results.READ_SIZE), b'')
+
+
+def iter_dataset(path: str, records_key: Optional[str] = None) -> Iterator[dict]:
+    """
+    Records of a dataset one at a time: a columnar directory, JSONL, or a (zipped) JSON
+    array, streamed so that memory does not grow with the dataset.
+    """
+    if columnar_dataset.is_columnar(path):
+        yield from columnar_dataset.ColumnarDataset(path)
+    elif path.endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from sparql_results.iter_json_array(_chunks(path), records_key)
+
+
+def bucket(value, salt: str = '') -> float:
+    """A stable position in [0, 1) for a key; the same key always lands in the same place."""
+    digest = hashlib.blake2b(f"{salt}\n{value}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+def template_key(record: dict) -> str:
+    """
+    The template of a record's gold query: its canonical form (sparql_canonical) with
+    variables, entities and literals abstracted, so reordered triples or a different
+    prefix spelling stay in one template. Queries rdflib cannot parse fall back to
+    their token shape (near_duplicates.query_shape).
+    """
+    sparql = gold_query(record)
+    if not sparql:
+        return ''
+    canonical = canonical_template(sparql, SCHEMA_NAMESPACES)
+    return canonical if canonical is not None else 'shape:' + ' '.join(query_shape(sparql))
+
+
+def split_key(by: str, id_key: str = 'id') -> Callable[[dict], object]:
+    """
+    The record key to hash: 'id', 'template' (see template_key, keeps template families
+    in one split), or 'field:<name>' for a field such as DBLP-QuAD's template_id.
+    """
+    if by == 'id':
+        return lambda record: record[id_key]
+    if by == 'template':
+        return template_key
+    if by.startswith('field:'):
+        name = by[len('field:'):]
+        return lambda record: json.dumps(record.get(name), sort_keys=True)
+    raise ValueError(f"Unknown split key {by!r}")
+
+
+def assign(position: float, ratios: List[Tuple[str, float]]) -> str:
+    cumulative = 0.0
+    for name, share in ratios:
+        cumulative += share
+        if position < cumulative:
+            return name
+    return ratios[-1][0]
+
+
+class _ArrayWriter:
+    """Writes a JSON array (optionally wrapped as {records_key: [...]}) or JSONL, one record at a time."""
+
+    def __init__(self, path: str, records_key: Optional[str] = None, indent: Optional[int] = 4):
+        self.jsonl = path.endswith('.jsonl')
+        self.indent = indent
+        self.records_key = records_key
+        self.count = 0
+        self.f = open(path, 'w', encoding='utf-8')
+        if not self.jsonl:
+            self.f.write(f'{{{json.dumps(records_key)}: [\n' if records_key else '[\n')
+
+    def write(self, record):
+        if self.jsonl:
+            self.f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            self.f.write((',\n' if self.count else '') + json.dumps(record, ensure_ascii=False, indent=self.indent))
+        self.count += 1
+
+    def close(self):
+        if not self.jsonl:
+            self.f.write('\n]}\n' if self.records_key else '\n]\n')
+        self.f.close()
+
+
+def split_file(input_path: str, output_dir: str, ratios: List[Tuple[str, float]], by: str = 'id',
+               records_key: Optional[str] = None, salt: str = '', id_key: str = 'id',
+               name_pattern: str = '{split}.json') -> Dict[str, int]:
+    """
+    Streams a dataset into splits, record by record.
+
+    Each record goes to the split its hashed key falls into, so an assignment never
+    depends on the other records: re-running on a grown dataset keeps every existing
+    record where it was and only places the new ones. Changing `salt` or `ratios`
+    reshuffles. Splitting by template keeps all questions of a query template together.
+
+    Parameters:
+        ratios (list): (split name, share) pairs, e.g. from parse_ratios.
+        by (str): Key to hash, see split_key.
+        records_key (str): Array key of dict-shaped inputs such as DBLP-QuAD's
+            "questions"; the outputs keep that shape.
+        name_pattern (str): Output file name per split; end it in .jsonl for JSONL.
+
+    Returns:
+        Dict[str, int]: Records written per split.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    key = split_key(by, id_key)
+    writers = {name: _ArrayWriter(os.path.join(output_dir, name_pattern.format(split=name)), records_key)
+               for name, _ in ratios}
+    try:
+        for record in iter_dataset(input_path, records_key):
+            writers[assign(bucket(key(record), salt), ratios)].write(record)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    counts = {name: writer.count for name, writer in writers.items()}
+    manifest = {'input': input_path, 'by': by, 'salt': salt, 'ratios': dict(ratios), 'counts': counts}
+    with open(os.path.join(output_dir, 'splits.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Split a dataset into stable, hash-assigned splits.")
+    parser.add_argument("input", help="JSON array, JSONL, zipped JSON or columnar directory")
+    parser.add_argument("output_dir")
+    parser.add_argument("--ratios", default=DEFAULT_RATIOS, help="e.g. train=0.8,dev=0.1,test=0.1")
+    parser.add_argument("--by", default='id', help="id, template or field:<name>")
+    parser.add_argument("--records-key", default=None, help="Array key of dict-shaped inputs, e.g. questions")
+    parser.add_argument("--salt", default='')
+    parser.add_argument("--id-key", default='id')
+    parser.add_argument("--format", choices=('json', 'jsonl'), default='json')
+    args = parser.parse_args()
+
+    print(split_file(args.input, args.output_dir, parse_ratios(args.ratios), args.by, args.records_key, args.salt,
+                     args.id_key, '{split}.' + args.format))
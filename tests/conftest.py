@@ -0,0 +1,39 @@
+import os
+import sys
+import threading
+import time
+import zlib
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class RecordingLLM:
+    """benchmarks.StandInLLM that records the questions it was asked and answers some of them late."""
+
+    def __init__(self):
+        import benchmarks
+        self.llm = benchmarks.StandInLLM(latency=0)
+        self.questions = []
+        self.lock = threading.Lock()
+
+    def chatai_models(self, prompt: str, model: str):
+        question = prompt.rsplit('Question: ', 1)[-1]
+        with self.lock:
+            self.questions.append(question)
+        # Uneven latencies make questions finish out of input order
+        time.sleep(0.002 * (zlib.crc32(question.encode('utf-8')) % 10))
+        return self.llm.chatai_models(prompt, model)
+
+
+@pytest.fixture
+def stand_in_baseline():
+    """The baseline wired to benchmarks.py's stand-ins over a small local index; yields the LLM."""
+    import benchmarks
+    llm = RecordingLLM()
+    graph = benchmarks.synthetic_graph(papers=100, authors=20)
+    with benchmarks.sparql_backend('local', 0, graph) as endpoint, \
+            benchmarks.stand_ins(endpoint, llm, benchmarks.StandInLinker(latency=0)):
+        yield llm
@@ -0,0 +1,49 @@
+import pytest
+from rdflib import Graph, Literal, URIRef
+
+import utils
+from answer_materializer import (STATUS_EMPTY, STATUS_OK, STATUS_SYNTAX_ERROR, latest_records,
+                                 materialize_answers)
+from local_endpoint import serve_graph
+
+DBLP = 'https://dblp.org/rdf/schema#'
+
+
+@pytest.fixture
+def endpoint():
+    graph = Graph()
+    for p in range(3):
+        paper = URIRef(f"https://dblp.org/rec/{p}")
+        graph.add((paper, URIRef(DBLP + 'title'), Literal(f"Title {p}")))
+        graph.add((paper, URIRef(DBLP + 'authoredBy'), URIRef('https://dblp.org/pid/0')))
+    server, url = serve_graph(graph)
+    yield url
+    server.shutdown()
+
+
+ITEMS = [
+    {'id': 'titles', 'sparql': f"SELECT ?title WHERE {{ ?paper <{DBLP}title> ?title }}"},
+    {'id': 'none', 'sparql': f"SELECT ?title WHERE {{ <https://dblp.org/rec/9> <{DBLP}title> ?title }}"},
+    {'id': 'ask', 'sparql': f"ASK {{ <https://dblp.org/rec/1> <{DBLP}authoredBy> <https://dblp.org/pid/0> }}"},
+    {'id': 'broken', 'sparql': "SELECT ?title WHERE { ?paper"},
+]
+
+
+def test_materialize_answers_statuses(endpoint, tmp_path):
+    out_file = str(tmp_path / 'answers.jsonl')
+    counts = materialize_answers(ITEMS, out_file, endpoint, workers=4, timeout=10)
+    assert counts == {STATUS_OK: 2, STATUS_EMPTY: 1, STATUS_SYNTAX_ERROR: 1}
+
+    records = {record['id']: record for record in latest_records(out_file)}
+    assert sorted(row['title'] for row in records['titles']['answer']) == ['Title 0', 'Title 1', 'Title 2']
+    assert records['none']['answer'] == []
+    assert records['ask']['answer'] is True
+    assert records['broken']['status'] == STATUS_SYNTAX_ERROR
+
+
+def test_materialize_answers_resumes(endpoint, tmp_path):
+    out_file = str(tmp_path / 'answers.jsonl')
+    materialize_answers(ITEMS[:2], out_file, endpoint, workers=2, timeout=10)
+    assert materialize_answers(ITEMS, out_file, endpoint, workers=2, timeout=10) == {STATUS_OK: 1,
+                                                                                    STATUS_SYNTAX_ERROR: 1}
+    assert len(utils.load_jsonl(out_file)) == len(ITEMS)
@@ -0,0 +1,91 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import baseline
+import benchmarks
+from baseline_server import BaselineService, ask, serve
+
+
+class BatchRecordingSimilarity(benchmarks.StandInSimilarity):
+    """A stand-in with SimilarityIndex's prefetch/discard that records each prefetched batch."""
+
+    def __init__(self):
+        super().__init__(latency=0)
+        self.batches = []
+        self.prefetched = {}
+        self.lock = threading.Lock()
+
+    def prefetch(self, questions, top_k=5):
+        with self.lock:
+            self.batches.append(list(questions))
+            for question, result in zip(questions, self.search(questions, top_k)):
+                self.prefetched[(question, top_k)] = result
+
+    def discard(self, questions, top_k=5):
+        with self.lock:
+            for question in questions:
+                self.prefetched.pop((question, top_k), None)
+
+
+@pytest.fixture
+def service(stand_in_baseline, monkeypatch):
+    # The stand-ins replace the heavy modules, so there is nothing to preload
+    monkeypatch.setattr(baseline, 'HEAVY_MODULES', ())
+    qsim = BatchRecordingSimilarity()
+    service = BaselineService(qsim, max_batch=4, batch_window=0.2)
+    yield service
+    service.close()
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.status, json.load(response)
+
+
+def test_questions_are_prefetched_in_micro_batches(service):
+    questions = [question for _, question in benchmarks.synthetic_questions(6)]
+    answers = service.answer(questions, timeout=30)
+    assert len(answers) == 6 and all(answer['sparql'].startswith('PREFIX') for answer in answers)
+    qsim = service.engine.qsim
+    assert qsim.batches == [questions[:4], questions[4:]]
+    assert service.counters['batches'] == 2
+    assert qsim.prefetched == {}
+
+
+def test_answers_match_the_baseline(service):
+    question = benchmarks.synthetic_questions(1)[0][1]
+    answer = service.answer([question], timeout=30)[0]
+    expected = baseline.answer_questions(benchmarks.StandInSimilarity(latency=0), question)
+    assert answer['sparql'] == expected['sparql'] and answer['answer'] == expected['answer']
+
+
+def test_http_endpoints(service):
+    server, url = serve(service)
+    try:
+        status, health = get_json(url + '/health')
+        assert status == 200 and health['status'] == 'ok' and health['queued'] == 0
+        assert {'uptime_s', 'load_s'} <= set(health)
+
+        questions = [question for _, question in benchmarks.synthetic_questions(3)]
+        answers = ask(url, questions, timeout=30)
+        assert len(answers) == 3
+
+        status, metrics = get_json(url + '/metrics')
+        assert status == 200
+        assert (metrics['requests'], metrics['questions'], metrics['errors']) == (1, 3, 0)
+        assert metrics['batches'] >= 1
+        assert metrics['latency']['question']['count'] == 3 and 'llm' in metrics['latency']
+        assert 'prompts' in metrics
+
+        for path, body, status in (('/answer', b'{"questions": [1]}', 400), ('/answer', b'not json', 400),
+                                   ('/other', b'{}', 404)):
+            request = urllib.request.Request(url + path, body, {'Content-Type': 'application/json'})
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(request, timeout=10)
+            assert error.value.code == status
+    finally:
+        server.shutdown()
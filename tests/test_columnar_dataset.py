@@ -0,0 +1,69 @@
+import json
+import zipfile
+
+import pytest
+
+from columnar_dataset import ColumnarDataset, convert, is_columnar, iter_records, write_records
+
+RECORDS = [
+    {'id': 'Q1', 'question': {'string': 'Who wrote “Über SPARQL”?'}, 'paraphrased_question': {'string': ''},
+     'query': {'sparql': 'SELECT ?x WHERE { ?x ?p "o" }'}, 'entities': ['<https://dblp.org/pid/1>'],
+     'template_id': 'TP11', 'answer': {'head': {'vars': ['x']}}, 'temporal': False, 'held_out': True},
+    {'id': 'Q2', 'question': {'string': 'How many?'}, 'entities': [], 'count': -42, 'score': 0.125,
+     'big': 2 ** 62, 'none': None, 'nested': [[1, [2, {}]], {'a': []}]},
+    {'id': 3, 'question': {'string': 'Numeric id'}},
+]
+DOCUMENT = {'version': '1.0', 'questions': RECORDS, 'license': 'CC BY 4.0'}
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / 'train.json'
+    path.write_text(json.dumps(DOCUMENT, ensure_ascii=False), encoding='utf-8')
+    output_dir = str(tmp_path / 'train')
+    stats = convert(str(path), output_dir)
+    assert stats['records'] == len(RECORDS)
+    return ColumnarDataset(output_dir)
+
+
+def test_round_trip(dataset, tmp_path):
+    assert is_columnar(dataset.path)
+    assert len(dataset) == len(RECORDS)
+    assert list(dataset) == RECORDS
+    assert dataset[-1] == RECORDS[-1]
+    with pytest.raises(IndexError):
+        dataset[len(RECORDS)]
+    assert dataset.to_python() == DOCUMENT
+    exported = str(tmp_path / 'export.json')
+    dataset.export_json(exported)
+    with open(exported, 'r', encoding='utf-8') as f:
+        assert list(json.load(f)) == list(DOCUMENT)
+
+
+def test_lookup_by_id_and_column(dataset):
+    assert dataset.get('Q2') == RECORDS[1]
+    assert dataset.get(3) == RECORDS[2] and dataset.get('3') == RECORDS[2]
+    assert dataset.get('missing') is None
+    assert dataset.column('template_id') == ['TP11', None, None]
+    assert dataset.field(0, 'query') == {'sparql': 'SELECT ?x WHERE { ?x ?p "o" }'}
+
+
+def test_zip_and_top_level_arrays(tmp_path):
+    archive = tmp_path / 'train.json.zip'
+    with zipfile.ZipFile(archive, 'w') as f:
+        f.writestr('train.json', json.dumps(RECORDS))
+    convert(str(archive), str(tmp_path / 'from_zip'))
+    assert ColumnarDataset(str(tmp_path / 'from_zip')).to_python() == RECORDS
+    assert list(iter_records(str(archive))) == RECORDS
+
+    write_records(iter(RECORDS[:1]), str(tmp_path / 'written'))
+    assert list(iter_records(str(tmp_path / 'written'))) == RECORDS[:1]
+
+
+def test_ambiguous_container_needs_records_key(tmp_path):
+    path = tmp_path / 'two.json'
+    path.write_text(json.dumps({'train': RECORDS, 'test': RECORDS}), encoding='utf-8')
+    with pytest.raises(ValueError):
+        convert(str(path), str(tmp_path / 'out'))
+    convert(str(path), str(tmp_path / 'out'), records_key='test')
+    assert ColumnarDataset(str(tmp_path / 'out')).to_python() == {'train': RECORDS, 'test': RECORDS}
@@ -0,0 +1,63 @@
+import csv
+
+import pytest
+
+from dedup_pipeline import HashStore, deduplicate_logs
+
+PREFIX = "PREFIX dblp: <https://dblp.org/rdf/schema#> "
+
+
+def author_query(author, spelling=0):
+    body = [f"SELECT ?t WHERE {{ ?p dblp:authoredBy <https://dblp.org/pid/{author}> . ?p dblp:title ?t }}",
+            f"select ?title where {{ ?paper dblp:title ?title . ?paper dblp:authoredBy <https://dblp.org/pid/{author}> }}",
+            f"SELECT  ?t  WHERE {{ ?p dblp:authoredBy <https://dblp.org/pid/{author}> .  ?p dblp:title ?t }}"]
+    return PREFIX + body[spelling]
+
+
+def write_log(path, queries, start=0):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'datetime', 'query'])
+        writer.writeheader()
+        for i, query in enumerate(queries, start):
+            writer.writerow({'id': i, 'datetime': f"2024-01-01T00:00:{i % 60:02d}", 'query': query})
+    return str(path)
+
+
+def read_ids(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return [row['id'] for row in csv.DictReader(f)]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'dedup.csv'), str(tmp_path / 'store.sqlite')
+
+
+def test_deduplicate_logs(tmp_path, paths):
+    queries = [author_query(a, spelling) for a in range(5) for spelling in range(3)]
+    queries += ['just some text', 'papers by ' + author_query(9), PREFIX + 'SELECT ?x WHERE { ?x']
+    log = write_log(tmp_path / 'log.csv', queries)
+
+    stats = deduplicate_logs([log], *paths, processes=1, chunk_size=4)
+    assert stats['rows'] == len(queries)
+    assert stats['written'] == 6 and stats['unique_total'] == 6
+    assert stats['lexical_duplicates'] == 5 and stats['canonical_duplicates'] == 5
+    assert stats['no_sparql'] == 1 and stats['not_canonicalized'] == 1
+    assert read_ids(paths[0]) == ['0', '3', '6', '9', '12', '16']
+
+
+def test_rerun_and_new_logs_resume(tmp_path, paths):
+    first = write_log(tmp_path / 'first.csv', [author_query(a) for a in range(4)])
+    deduplicate_logs([first], *paths, processes=1, chunk_size=3)
+
+    # A crash after the last checkpoint leaves output the store does not back
+    with open(paths[0], 'a', encoding='utf-8') as f:
+        f.write('99,partial,row\n')
+    second = write_log(tmp_path / 'second.csv', [author_query(a, 1) for a in range(2, 6)], start=100)
+    stats = deduplicate_logs([first, second], *paths, processes=1, chunk_size=3)
+
+    assert stats['rows'] == 4 and stats['written'] == 2 and stats['canonical_duplicates'] == 2
+    assert read_ids(paths[0]) == ['0', '1', '2', '3', '102', '103']
+    store = HashStore(paths[1])
+    assert store.rows_done(str(tmp_path / 'first.csv')) == 4 and len(store) == 6
+    store.close()
@@ -0,0 +1,88 @@
+import pytest
+
+from disk_cache import DiskCache
+from entity_index import EntityLinker, LabelIndex, normalize_label
+
+BAST = 'https://dblp.org/pid/b/HannahBast'
+HOGAN = 'https://dblp.org/pid/h/AidanHogan'
+WWW = 'https://dblp.org/streams/conf/www'
+RECORDS = [
+    {'formal_question': 'What are the publications of Hannah Bast?',
+     'entities': [{'mention': 'Hannah Bast', 'uri': f"<{BAST}>"}]},
+    {'formal_question': 'Which papers did Aidan Hogan publish at the World Wide Web conference?',
+     'entities': [{'mention': 'Aidan Hogan', 'uri': f"<{HOGAN}>"},
+                  {'mention': 'World Wide Web', 'uri': f"<{WWW}>"}]},
+    {'original_query': 'hannah bast papers', 'entities': [{'mention': 'hannah bast', 'uri': BAST}]},
+]
+
+
+class FakeRemote:
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def __call__(self, question):
+        self.calls.append(question)
+        if question in self.fail:
+            raise ConnectionError('linker unavailable')
+        return [{'uri': 'remote'}], [{'uri': 'remote'}]
+
+
+@pytest.fixture
+def index():
+    return LabelIndex.from_records(RECORDS)
+
+
+def test_normalize_label():
+    assert normalize_label('  Ömer  Çetin-Smith! ') == 'omer cetin smith'
+
+
+def test_index_labels_and_context_words(index):
+    assert index.exact('hannah bast') == {BAST: 2}
+    assert index.candidates('world wide') == {WWW: 1}
+    assert {'publications', 'papers', 'conference', 'publish'} <= index.words
+    assert not {'hannah', 'bast', 'web'} & index.words
+
+
+def test_covered_question_is_resolved_locally(index):
+    remote = FakeRemote()
+    linker = EntityLinker(index, remote)
+    all_entities, selected = linker.link('Publications of Hannah Bast since 2015?')
+    assert [entity['uri'] for entity in selected] == [BAST]
+    assert remote.calls == [] and linker.stats['local'] == 1
+
+
+def test_partly_covered_question_goes_remote(index):
+    remote = FakeRemote()
+    linker = EntityLinker(index, remote)
+    # Hannah Bast is indexed, Ruben Verborgh is not and must not be dropped silently
+    assert linker.link('Papers of Hannah Bast and Ruben Verborgh') == ([{'uri': 'remote'}], [{'uri': 'remote'}])
+    assert remote.calls == ['Papers of Hannah Bast and Ruben Verborgh']
+
+
+def test_offline_linker_returns_partial_result(index):
+    _, selected = EntityLinker(index).link('Papers of Hannah Bast and Ruben Verborgh')
+    assert [entity['uri'] for entity in selected] == [BAST]
+
+
+def test_link_many_memoizes_and_survives_failures(index, tmp_path):
+    remote = FakeRemote(fail={'Papers by Jane Doe'})
+    linker = EntityLinker(index, remote, DiskCache(str(tmp_path / 'entities.sqlite')))
+    questions = ['Papers by John Roe', 'papers by john roe!', 'Papers by Jane Doe', 'Publications of Hannah Bast']
+    results = linker.link_many(questions)
+    assert results[0] == results[1] == ([{'uri': 'remote'}], [{'uri': 'remote'}])
+    assert results[2] is None
+    assert [entity['uri'] for entity in results[3][1]] == [BAST]
+    assert sorted(remote.calls) == ['Papers by Jane Doe', 'Papers by John Roe']
+
+    # The memo answers the first question; the failed one is asked again
+    linker.link_many(questions)
+    assert sorted(remote.calls) == ['Papers by Jane Doe', 'Papers by Jane Doe', 'Papers by John Roe']
+    assert linker.stats['cached'] == 1
+
+
+def test_save_and_load(index, tmp_path):
+    path = str(tmp_path / 'index.json')
+    index.save(path)
+    loaded = LabelIndex.load(path)
+    assert loaded.labels == index.labels and loaded.words == index.words
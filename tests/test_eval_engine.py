@@ -0,0 +1,97 @@
+import json
+
+import benchmarks
+import eval_engine
+import utils
+from eval_engine import EvaluationEngine, StageTimer
+
+QUESTIONS = benchmarks.synthetic_questions(24)
+
+
+class PrefetchingSimilarity(benchmarks.StandInSimilarity):
+    """A stand-in with SimilarityIndex's prefetch/discard."""
+
+    def __init__(self):
+        super().__init__(latency=0)
+        self.prefetched = {}
+
+    def prefetch(self, questions, top_k=5):
+        for question, result in zip(questions, self.search(questions, top_k)):
+            self.prefetched[(question, top_k)] = result
+
+    def discard(self, questions, top_k=5):
+        for question in questions:
+            self.prefetched.pop((question, top_k), None)
+
+
+def run(qsim, questions, journal, concurrency=None):
+    engine = EvaluationEngine(qsim, concurrency)
+    try:
+        return engine.run(questions, journal)
+    finally:
+        engine.close()
+
+
+def test_run_journals_every_question_once(stand_in_baseline, tmp_path):
+    journal = str(tmp_path / 'predictions.jsonl')
+    result = run(PrefetchingSimilarity(), QUESTIONS, journal, {'llm': 6, 'sparql': 3})
+    assert result['answered'] == len(QUESTIONS)
+
+    with open(journal, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    # One complete line per question; concurrent writers append in completion order
+    ids = [qid for record in records for qid in record]
+    assert sorted(ids) == [qid for qid, _ in QUESTIONS]
+    for record in records:
+        prediction = next(iter(record.values()))
+        assert prediction['sparql'].startswith('PREFIX') and prediction['top_k'] == 5
+    assert sorted(stand_in_baseline.questions) == sorted(question for _, question in QUESTIONS)
+
+
+def test_run_resumes_after_the_journaled_questions(stand_in_baseline, tmp_path):
+    journal = str(tmp_path / 'predictions.jsonl')
+    utils.append_jsonl([{qid: {'answer': 'earlier'}} for qid, _ in QUESTIONS[:10]], journal)
+    result = run(benchmarks.StandInSimilarity(latency=0), QUESTIONS, journal)
+
+    assert result['answered'] == len(QUESTIONS) - 10
+    assert sorted(stand_in_baseline.questions) == sorted(question for _, question in QUESTIONS[10:])
+    records = utils.load_jsonl(journal)
+    assert [qid for record in records for qid in record][:10] == [qid for qid, _ in QUESTIONS[:10]]
+    assert len(records) == len(QUESTIONS)
+
+    # Nothing left to do on a second run
+    assert run(benchmarks.StandInSimilarity(latency=0), QUESTIONS, journal)['answered'] == 0
+    assert len(utils.load_jsonl(journal)) == len(QUESTIONS)
+
+
+def test_prefetched_results_are_discarded_once_used(stand_in_baseline, tmp_path):
+    qsim = PrefetchingSimilarity()
+    run(qsim, QUESTIONS, str(tmp_path / 'predictions.jsonl'))
+    assert qsim.prefetched == {}
+
+
+def test_per_stage_latencies_are_reported(stand_in_baseline, tmp_path, capsys):
+    result = run(PrefetchingSimilarity(), QUESTIONS[:8], str(tmp_path / 'predictions.jsonl'))
+    latency = result['latency']
+    for stage in eval_engine.STAGES + ('question',):
+        assert latency[stage]['count'] == 8
+        assert {'total_s', 'p50_ms', 'p90_ms', 'p95_ms', 'p99_ms', 'max_ms'} <= set(latency[stage])
+    assert latency['similarity_prefetch']['count'] == 1
+    output = capsys.readouterr().out
+    assert '0 of 8 questions already answered' in output
+    assert all(f"{stage:>16}: count=8" in output for stage in eval_engine.STAGES)
+
+
+def test_stage_timer_summary():
+    timer = StageTimer()
+    for seconds in (0.001, 0.002, 0.003, 0.004):
+        timer.record('llm', seconds)
+    report = timer.summary(percentiles=(50,))
+    assert report == {'llm': {'count': 4, 'total_s': 0.01, 'p50_ms': 2.5, 'max_ms': 4.0}}
+
+
+def test_evaluate_writes_the_prediction_file(stand_in_baseline, tmp_path):
+    prediction_file = str(tmp_path / 'predictions.json')
+    eval_engine.evaluate(QUESTIONS[:5], prediction_file, qsim=benchmarks.StandInSimilarity(latency=0))
+    predictions = utils.load_json_data(prediction_file)
+    assert sorted(qid for record in predictions for qid in record) == [qid for qid, _ in QUESTIONS[:5]]
@@ -0,0 +1,79 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from evaluation import AnswerSetEvaluator, answer_pairs, answer_tokens, bootstrap_ci, evaluate_files, summarize
+
+
+def reference(gold, predicted, ks):
+    """Per-question scores computed the straightforward way."""
+    gold_set, seen = set(gold), []
+    for answer in predicted:
+        if answer not in seen:
+            seen.append(answer)
+    if not gold_set and not seen:
+        return dict(precision=1.0, recall=1.0, f1=1.0, exact_match=1.0, **{f"hits@{k}": 1.0 for k in ks})
+    tp = len(gold_set & set(seen))
+    precision = tp / len(seen) if seen else 0.0
+    recall = tp / len(gold_set) if gold_set else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    scores = dict(precision=precision, recall=recall, f1=f1, exact_match=float(gold_set == set(seen)))
+    for k in ks:
+        scores[f"hits@{k}"] = float(any(answer in gold_set for answer in seen[:k]))
+    return scores
+
+
+def test_answer_tokens():
+    assert answer_tokens(True) == ['true']
+    assert answer_tokens({'boolean': False}) == ['false']
+    assert answer_tokens([{'x': 'a', 'y': 'b'}, {'x': 'c'}]) == ['a', 'b', 'c']
+    assert answer_tokens({'results': {'bindings': [{'x': {'type': 'literal', 'value': '3'}}]}}) == ['3']
+    assert answer_tokens(None) == [] and answer_tokens('x') == ['x']
+
+
+def test_answer_pairs_reads_both_layouts():
+    assert answer_pairs([{'id': 1, 'answer': [{'x': 'a'}]}, 'junk']) == {'1': ['a']}
+    assert answer_pairs([{'7': {'answer': True, 'sparql': 'ASK {}'}}, {'8': {}}]) == {'7': ['true'], '8': []}
+
+
+def test_scores_match_reference():
+    rng = random.Random(1)
+    ks = (1, 3)
+    gold = {str(i): [f"e{rng.randrange(30)}" for _ in range(rng.randrange(4))] for i in range(300)}
+    predictions = {qid: [f"e{rng.randrange(30)}" if rng.random() < 0.6 else f"new{rng.randrange(5)}"
+                         for _ in range(rng.randrange(5))]
+                   for qid in gold if rng.random() < 0.9}
+    predictions['not in gold'] = ['e1']
+    frame = AnswerSetEvaluator(gold).score(predictions, ks)
+    assert list(frame['id']) == list(gold)
+    for row in frame.to_dict('records'):
+        expected = reference(gold[row['id']], predictions.get(row['id'], []), ks)
+        assert {metric: row[metric] for metric in expected} == pytest.approx(expected)
+
+
+def test_bootstrap_ci():
+    values = np.r_[np.ones(50), np.zeros(50)]
+    (low, high), = bootstrap_ci(values, resamples=500)
+    assert low < 0.5 < high and 0.3 < low and high < 0.7
+    assert np.array_equal(bootstrap_ci(values, seed=3), bootstrap_ci(values, seed=3))
+    assert np.isnan(bootstrap_ci(np.zeros((0, 2)))).all()
+
+
+def test_evaluate_files_per_template(tmp_path):
+    gold = [{'id': '1', 'answer': [{'x': 'a'}]}, {'id': '2', 'answer': True}, {'id': '3', 'answer': [{'x': 'c'}]}]
+    predictions = [{'1': {'answer': [{'x': 'a'}, {'x': 'b'}]}}, {'2': {'answer': True}}]
+    (tmp_path / 'gold.json').write_text(json.dumps(gold))
+    (tmp_path / 'pred.json').write_text(json.dumps(predictions))
+    report = evaluate_files(str(tmp_path / 'gold.json'), [str(tmp_path / 'pred.json')],
+                            {'1': 'T1', '2': 'T2', '3': 'T1'}, resamples=100, details_dir=str(tmp_path / 'details'))
+    summary = report[str(tmp_path / 'pred.json')]
+    assert summary['overall']['questions'] == 3
+    assert summary['overall']['recall']['mean'] == pytest.approx(2 / 3, abs=1e-4)
+    assert summary['templates']['T2']['exact_match']['mean'] == 1.0
+    assert summary['templates']['T1']['hits@1']['mean'] == 0.5
+    assert (tmp_path / 'details' / 'pred_scores.csv').exists()
+
+    frame = AnswerSetEvaluator({'1': ['a']}).score({})
+    assert 'templates' not in summarize(frame, resamples=10)
@@ -0,0 +1,73 @@
+import sys
+import time
+
+from jena_pool import JenaCanonicalizerPool, JenaWorker
+
+# Speaks JenaWorker.java's protocol without a JVM: echoes queries upper-cased,
+# fails on "bad", hangs on "hang" and exits on "crash".
+FAKE_WORKER = r'''
+import sys, time
+stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+while True:
+    header = stdin.readline()
+    if not header:
+        break
+    query = stdin.read(int(header)).decode('utf-8')
+    if query == 'hang':
+        time.sleep(60)
+    if query == 'crash':
+        sys.exit(1)
+    code, output = (1, 'syntax error') if query == 'bad' else (0, query.upper() + '\n')
+    payload = output.encode('utf-8')
+    stdout.write(f"{code} {len(payload)}\n".encode('utf-8') + payload)
+    stdout.flush()
+'''
+
+
+def fake_worker(timeout=1.0):
+    worker = JenaWorker(timeout=timeout)
+    worker.command = [sys.executable, '-c', FAKE_WORKER]
+    return worker
+
+
+def test_worker_answers_over_one_process():
+    worker = fake_worker()
+    try:
+        assert worker.canonicalize('select ?x') == 'SELECT ?X'
+        process = worker.process
+        assert worker.canonicalize('bad') is None
+        assert worker.canonicalize('ask {}') == 'ASK {}'
+        assert worker.process is process
+    finally:
+        worker.close()
+
+
+def test_hung_query_times_out_and_the_worker_restarts():
+    worker = fake_worker(timeout=0.5)
+    try:
+        assert worker.canonicalize('first') == 'FIRST'
+        hung = worker.process
+        start = time.monotonic()
+        assert worker.canonicalize('hang') is None
+        assert time.monotonic() - start < 5
+        assert hung.poll() is not None
+        assert worker.canonicalize('after') == 'AFTER'
+    finally:
+        worker.close()
+
+
+def test_crashed_worker_is_restarted_and_the_query_retried_once():
+    worker = fake_worker()
+    try:
+        assert worker.canonicalize('crash') is None
+        assert worker.canonicalize('next') == 'NEXT'
+    finally:
+        worker.close()
+
+
+def test_pool_keeps_input_order_when_a_query_hangs():
+    pool = JenaCanonicalizerPool(workers=2, timeout=0.5)
+    for worker in pool.workers:
+        worker.command = [sys.executable, '-c', FAKE_WORKER]
+    with pool:
+        assert pool.canonicalize_many(['a', 'hang', 'b', 'bad', 'c']) == ['A', None, 'B', None, 'C']
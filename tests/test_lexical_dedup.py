@@ -0,0 +1,40 @@
+import pandas as pd
+
+from lexical_dedup import lexical_hashes, lexical_normalize, lexical_tier_counts, read_log_chunks, split_queries
+
+PREFIXES = "PREFIX dblp: <https://dblp.org/rdf/schema#> PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#> "
+
+
+def test_split_queries():
+    descriptions, sparql = split_queries(pd.Series(['papers of bast select ?x where { ?x ?p ?o }', 'no query here']))
+    assert descriptions.tolist() == ['papers of bast', 'no query here']
+    assert sparql.tolist() == ['select ?x where { ?x ?p ?o }', '']
+
+
+def test_lexical_normalize():
+    queries = pd.Series([
+        PREFIXES + "SELECT ?t WHERE { ?p dblp:title ?t }",
+        "prefix dblp: <https://dblp.org/rdf/schema#>\nselect ?t\n  where {   ?p dblp:title ?t }",
+        "SELECT ?t WHERE { ?p <https://dblp.org/rdf/schema#title> \"Where  Select\" }",
+    ])
+    normalized = lexical_normalize(queries)
+    # The unused rdfs declaration is dropped, case and whitespace outside literals normalized
+    assert normalized[0] == normalized[1] == "PREFIX dblp: <https://dblp.org/rdf/schema#> SELECT ?t WHERE { ?p dblp:title ?t }"
+    assert normalized[2].endswith('"Where  Select" }')
+    hashes = lexical_hashes(normalized)
+    assert hashes[0] == hashes[1] != hashes[2]
+
+
+def test_lexical_normalize_when_every_row_has_prefixes():
+    queries = pd.Series([PREFIXES + "SELECT ?t WHERE { ?p dblp:title ?t }"] * 2, index=[5, 7])
+    assert lexical_normalize(queries).tolist() == [
+        "PREFIX dblp: <https://dblp.org/rdf/schema#> SELECT ?t WHERE { ?p dblp:title ?t }"] * 2
+
+
+def test_read_log_chunks_skips_records(tmp_path):
+    path = tmp_path / 'log.csv'
+    pd.DataFrame({'id': range(7), 'query': ['SELECT ?x WHERE {\n ?x ?p ?o }'] * 7}).to_csv(path, index=False)
+    chunks = list(read_log_chunks(str(path), chunk_size=3, skip_rows=4))
+    assert [chunk['id'].tolist() for chunk in chunks] == [['4', '5'], ['6']]
+    assert lexical_tier_counts(str(path), chunk_size=3) == {'rows': 7, 'no_sparql': 0, 'lexical_duplicates': 6,
+                                                           'lexically_unique': 1}
@@ -0,0 +1,73 @@
+import pytest
+
+import sparql_to_question
+from llm_cache import CacheMissError, LLMCache
+
+
+class Model:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def test_responses_are_cached_by_prompt_and_params(tmp_path):
+    cache = LLMCache(str(tmp_path / 'llm.sqlite'))
+    model = Model('a', 'b')
+    assert cache.cached_call('openai', 'm', 'prompt', {'n': 3}, model) == 'a'
+    assert cache.cached_call('openai', 'm', 'prompt', {'n': 3}, model) == 'a'
+    assert cache.cached_call('openai', 'm', 'prompt', {'n': 1}, model) == 'b'
+    assert model.calls == 2
+
+
+def test_rejected_responses_are_not_cached(tmp_path):
+    path = str(tmp_path / 'llm.sqlite')
+    cache = LLMCache(path)
+    model = Model({'outputs': []}, {'outputs': ['ok']})
+    complete = lambda result: bool(result['outputs'])
+    assert cache.cached_call('openai', 'm', 'prompt', None, model, complete) == {'outputs': []}
+    assert cache.cached_call('openai', 'm', 'prompt', None, model, complete) == {'outputs': ['ok']}
+    assert cache.cached_call('openai', 'm', 'prompt', None, model, complete) == {'outputs': ['ok']}
+    assert model.calls == 2
+
+    # A bad entry stored without a validator is treated as a miss by one
+    cache.cached_call('openai', 'm', 'other', None, Model({'outputs': []}))
+    assert cache.cached_call('openai', 'm', 'other', None, Model({'outputs': ['new']}), complete) == {'outputs': ['new']}
+
+
+def test_rejected_cached_values_count_as_misses(tmp_path):
+    cache = LLMCache(str(tmp_path / 'llm.sqlite'))
+    cache.cached_call('openai', 'm', 'prompt', None, Model({'outputs': []}))
+    complete = lambda result: bool(result['outputs'])
+    cache.cached_call('openai', 'm', 'prompt', None, Model({'outputs': ['ok']}), complete)
+    cache.cached_call('openai', 'm', 'prompt', None, Model(), complete)
+    stats = cache.stats()
+    # First call misses, the rejected replay misses, the last call hits
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+
+def test_replay_mode(tmp_path):
+    path = str(tmp_path / 'llm.sqlite')
+    LLMCache(path).cached_call('openai', 'm', 'prompt', None, Model('a'))
+    replay = LLMCache(path, replay=True)
+    assert replay.cached_call('openai', 'm', 'prompt', None, Model()) == 'a'
+    with pytest.raises(CacheMissError):
+        replay.cached_call('openai', 'm', 'unseen', None, Model())
+
+
+def test_replay_mode_never_creates_the_database(tmp_path):
+    path = tmp_path / 'missing.sqlite'
+    with pytest.raises(FileNotFoundError):
+        LLMCache(str(path), replay=True)
+    assert not path.exists()
+
+
+def test_question_batches_are_complete_only_with_every_item():
+    batch = [{'id': '1'}, {'id': '2'}]
+    outputs = [{'id': item['id'], 'formal_question': 'Q?', 'entities': []} for item in batch]
+    assert sparql_to_question.is_complete(batch, {'outputs': outputs})
+    assert not sparql_to_question.is_complete(batch, {'outputs': outputs[:1]})
+    assert not sparql_to_question.is_complete(batch, 'not json')
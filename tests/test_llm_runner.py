@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+import llm_runner
+import utils
+from llm_runner import RateLimiter, call_with_retries, pending_items, run_batches
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping advances the clock instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        with self.lock:
+            return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_runner, 'time', clock)
+    monkeypatch.setattr(llm_runner.random, 'random', lambda: 1.0)
+    return clock
+
+
+def test_rate_limiter_holds_the_request_ceiling(clock):
+    limiter = RateLimiter(requests_per_minute=60)
+    for _ in range(60):
+        limiter.acquire()
+    # The full bucket lets a burst of 60 through, then one request per second
+    assert clock.now == 0
+    for _ in range(30):
+        limiter.acquire()
+    assert clock.now == pytest.approx(30)
+
+
+def test_rate_limiter_holds_the_token_ceiling(clock):
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=600)
+    limiter.acquire(500)
+    limiter.acquire(300)
+    assert clock.now == pytest.approx(20)
+    # A request larger than the bucket waits for a full bucket instead of forever
+    limiter.acquire(10 ** 6)
+    assert clock.now == pytest.approx(80)
+
+
+def test_rate_limiter_without_limits_never_waits(clock):
+    limiter = RateLimiter()
+    for _ in range(1000):
+        limiter.acquire(10 ** 6)
+    assert clock.sleeps == []
+
+
+def test_call_with_retries_backs_off_exponentially(clock):
+    calls = []
+
+    def flaky(argument):
+        calls.append(argument)
+        if len(calls) < 4:
+            raise RuntimeError('rate limited')
+        return argument * 2
+
+    assert call_with_retries(flaky, 21, max_retries=5, base_delay=1.0, max_delay=3.0) == 42
+    assert len(calls) == 4 and clock.sleeps == [1.0, 2.0, 3.0]
+
+
+def test_call_with_retries_gives_up(clock):
+    calls = []
+
+    def broken(argument):
+        calls.append(argument)
+        raise RuntimeError('down')
+
+    with pytest.raises(RuntimeError):
+        call_with_retries(broken, 1, max_retries=2, base_delay=0.5)
+    assert len(calls) == 3 and clock.sleeps == [0.5, 1.0]
+
+
+def test_run_batches_journals_finished_batches_and_counts_failures(clock, tmp_path):
+    journal = str(tmp_path / 'journal.jsonl')
+    items = [{'id': str(i)} for i in range(10)]
+    batches = [items[i:i + 2] for i in range(0, len(items), 2)]
+    attempts = {}
+
+    def process(batch):
+        first = batch[0]['id']
+        attempts[first] = attempts.get(first, 0) + 1
+        if first == '4' or (first == '6' and attempts[first] == 1):
+            raise RuntimeError('bad batch')
+        return [dict(item, output=True) for item in batch]
+
+    limiter = RateLimiter(requests_per_minute=600)
+    stats = run_batches(batches, process, journal, concurrency=3, rate_limiter=limiter, max_retries=2)
+    assert stats == {'batches': 4, 'failed_batches': 1, 'records': 8}
+    assert attempts['4'] == 3 and attempts['6'] == 2 and attempts['0'] == 1
+    assert sorted(record['id'] for record in utils.load_jsonl(journal)) == ['0', '1', '2', '3', '6', '7', '8', '9']
+    assert pending_items(items, journal) == items[4:6]
+
+
+def test_append_jsonl_after_a_truncated_line(tmp_path):
+    journal = tmp_path / 'journal.jsonl'
+    journal.write_text('{"id": "1"}\n{"id": "2", "out', encoding='utf-8')
+    utils.append_jsonl([{'id': '3'}], str(journal))
+    utils.append_jsonl([{'id': '4'}], str(journal))
+    assert [record['id'] for record in utils.load_jsonl(str(journal))] == ['1', '3', '4']
@@ -0,0 +1,94 @@
+import pytest
+
+from local_sparql import (LOCAL_SCHEME, LocalSPARQLClient, build_index, extract_subgraph, get_client, is_local,
+                          iter_triples, subgraph_query)
+from sparql_client import SPARQLQueryError, SPARQLSyntaxError
+
+DBLP = 'https://dblp.org/rdf/schema#'
+PREFIX = f"PREFIX dblp: <{DBLP}> "
+TITLES = PREFIX + "SELECT ?paper ?title WHERE { ?paper dblp:authoredBy <https://dblp.org/pid/0> . ?paper dblp:title ?title }"
+COUNT = PREFIX + "SELECT (COUNT(?paper) AS ?n) WHERE { ?paper dblp:yearOfPublication \"2001\" }"
+COAUTHORS = PREFIX + "SELECT DISTINCT ?name WHERE { <https://dblp.org/rec/1> dblp:authoredBy/dblp:name ?name }"
+
+
+def write_graph(path):
+    lines = []
+    for p in range(6):
+        paper = f"<https://dblp.org/rec/{p}>"
+        lines.append(f'{paper} <{DBLP}title> "Title {p}" .')
+        lines.append(f'{paper} <{DBLP}yearOfPublication> "{2000 + p % 2}" .')
+        lines.append(f'{paper} <{DBLP}authoredBy> <https://dblp.org/pid/{p % 3}> .')
+    for a in range(3):
+        lines.append(f'<https://dblp.org/pid/{a}> <{DBLP}name> "Author {a}"@en .')
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    directory = str(tmp_path / 'index')
+    build_index(iter_triples(write_graph(tmp_path / 'graph.nt')), directory)
+    return directory
+
+
+def titles(answer):
+    return sorted(row['title'] for row in answer)
+
+
+def test_query_index(index_dir):
+    client = LocalSPARQLClient(index_dir)
+    assert titles(client.query_answer(TITLES)) == ['Title 0', 'Title 3']
+    assert client.query_answer(COUNT) == [{'n': '3'}]
+    assert client.query_answer(COAUTHORS) == [{'name': 'Author 1'}]
+    assert client.query_answer(PREFIX + "ASK { <https://dblp.org/rec/2> dblp:authoredBy <https://dblp.org/pid/2> }")
+    assert len(client.query_answer(TITLES, max_rows=1)) == 1
+    assert client.query(TITLES)['head']['vars'] == ['paper', 'title']
+
+
+def test_errors(index_dir, monkeypatch):
+    client = LocalSPARQLClient(index_dir)
+    with pytest.raises(SPARQLSyntaxError):
+        client.query_answer("SELECT ?x WHERE { ?x")
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('engine bug')
+
+    monkeypatch.setattr(client.store, 'triples', broken)
+    with pytest.raises(SPARQLQueryError) as error:
+        client.query_answer(TITLES)
+    assert not isinstance(error.value, SPARQLSyntaxError)
+
+
+def test_local_endpoints(index_dir):
+    endpoint = LOCAL_SCHEME + index_dir
+    assert is_local(endpoint) and not is_local('https://sparql.dblp.org/sparql')
+    assert get_client(endpoint) is get_client(endpoint)
+
+
+def test_subgraph_query():
+    select, templates, skipped = subgraph_query(COAUTHORS)
+    assert skipped == 0 and len(templates) == 2
+    assert subgraph_query("SELECT ?x WHERE { ?x") is None
+
+
+def test_extract_subgraph_round_trip(index_dir, tmp_path):
+    client = LocalSPARQLClient(index_dir)
+    output = str(tmp_path / 'subgraph.nt')
+    stats = extract_subgraph([TITLES, COUNT, COAUTHORS, "SELECT ?x WHERE { ?x"], client, output)
+    assert stats['queries'] == 4 and stats['unparsed'] == 1 and stats['failed'] == 0
+
+    subset_dir = str(tmp_path / 'subset')
+    build_index(iter_triples(output), subset_dir)
+    subset = LocalSPARQLClient(subset_dir)
+    for query in (TITLES, COUNT, COAUTHORS):
+        assert subset.query_answer(query) == client.query_answer(query)
+    assert len(list(iter_triples(output))) == stats['triples'] < 27
+
+
+def test_extract_subgraph_counts_truncated_queries(index_dir, tmp_path):
+    client = LocalSPARQLClient(index_dir)
+    stats = extract_subgraph([TITLES, COUNT], client, str(tmp_path / 'subgraph.nt'), max_rows=2)
+    # TITLES binds 2 rows, exactly the limit; COUNT binds 3 and is cut to 2
+    assert stats['truncated'] == 2
+    stats = extract_subgraph([TITLES, COUNT], client, str(tmp_path / 'subgraph.nt'), max_rows=10)
+    assert stats['truncated'] == 0
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from near_duplicates import cluster_log, cluster_queries, lsh_parameters, minhash_signatures, query_shape, shingle_hashes
+
+PREFIX = "PREFIX dblp: <https://dblp.org/rdf/schema#> "
+AUTHOR_PAPERS = PREFIX + "SELECT ?paper WHERE {{ ?paper dblp:authoredBy <https://dblp.org/pid/{pid}> . ?paper dblp:yearOfPublication \"{year}\" }}"
+VENUE_COUNT = PREFIX + "SELECT (COUNT(DISTINCT ?paper) AS ?n) WHERE {{ ?paper dblp:publishedIn '{venue}' . ?paper dblp:title ?title . FILTER(CONTAINS(?title, \"{word}\")) }} GROUP BY ?venue ORDER BY DESC(?n) LIMIT {limit}"
+COAUTHORS = "SELECT DISTINCT ?name WHERE {{ <https://dblp.org/rec/{rec}> <https://dblp.org/rdf/schema#authoredBy> ?a . ?a <https://dblp.org/rdf/schema#primaryCreatorName> ?name . OPTIONAL {{ ?a <https://dblp.org/rdf/schema#orcid> ?orcid }} }}"
+
+QUERIES = (
+    [AUTHOR_PAPERS.format(pid=f"{i}/{i * 7}", year=2000 + i) for i in range(5)]
+    + [VENUE_COUNT.format(venue=venue, word=word, limit=limit)
+       for venue, word, limit in (('ISWC', 'graph', 10), ('ESWC', 'SPARQL', 5), ('WWW', 'web', 100))]
+    + [COAUTHORS.format(rec=f"conf/iswc/X{i}") for i in range(4)]
+)
+
+
+def test_query_shape_abstracts_entities_literals_and_variables():
+    shape = query_shape(AUTHOR_PAPERS.format(pid='1', year=2001))
+    assert 'PREFIX' not in shape and '<ENT>' in shape and '"LIT"' in shape and '?VAR' in shape
+    variant = AUTHOR_PAPERS.format(pid='2', year=2020).replace('?paper', '?p').replace('SELECT', 'select')
+    assert query_shape(variant) == shape
+    assert '<https://dblp.org/rdf/schema#authoredBy>' in query_shape(COAUTHORS.format(rec='x'))
+
+
+def test_literal_and_iri_variants_share_a_cluster():
+    labels = cluster_queries(QUERIES)
+    assert set(labels[:5]) == {0}
+    assert set(labels[5:8]) == {5}
+    assert set(labels[8:]) == {8}
+
+
+def test_different_structures_are_kept_apart():
+    labels = cluster_queries([
+        AUTHOR_PAPERS.format(pid='1', year=2001),
+        PREFIX + "ASK { <https://dblp.org/pid/1> dblp:primaryCreatorName \"Name\" }",
+        PREFIX + "SELECT ?venue WHERE { ?paper dblp:publishedIn ?venue . ?paper dblp:numberOfCreators ?n . FILTER(?n > 3) }",
+    ])
+    assert labels.tolist() == [0, 1, 2]
+
+
+def test_clusters_are_stable_across_runs():
+    first = cluster_queries(QUERIES)
+    assert cluster_queries(QUERIES).tolist() == first.tolist()
+    shingles = [shingle_hashes(query_shape(query)) for query in QUERIES]
+    assert (minhash_signatures(shingles) == minhash_signatures(shingles, block_size=2)).all()
+    # Reversing the input only renames the clusters after their new first members
+    reversed_labels = cluster_queries(QUERIES[::-1])[::-1]
+    assert (pd.Series(reversed_labels).groupby(first).nunique() == 1).all()
+
+
+def test_lsh_parameters_cover_all_permutations():
+    bands, rows = lsh_parameters(128, 0.8)
+    assert bands * rows == 128 and 0.7 < (1 / bands) ** (1 / rows) < 0.9
+
+
+def test_cluster_log_marks_representatives(tmp_path):
+    input_csv, output_csv, representatives_csv = (str(tmp_path / name) for name in ('in.csv', 'out.csv', 'rep.csv'))
+    pd.DataFrame({'query': [f"query {i} {query}" for i, query in enumerate(QUERIES)]}).to_csv(input_csv, index=False)
+    result = cluster_log(input_csv, output_csv, representatives_csv)
+    assert result == {'queries': len(QUERIES), 'clusters': 3}
+    output = pd.read_csv(output_csv)
+    assert output['cluster_id'].tolist() == [0] * 5 + [1] * 3 + [2] * 4
+    assert pd.read_csv(representatives_csv)['query'].str.startswith(('query 0 ', 'query 5 ', 'query 8 ')).all()
@@ -0,0 +1,87 @@
+import json
+import logging
+from types import SimpleNamespace
+
+import baseline
+import prompt_assembly
+import sparql_to_question
+from prompt_assembly import CompiledPrompt, compiled
+
+TEMPLATE = "Schema: {schema}\nExamples:\n{examples!r}\nTop {k:>3} for: {question}\nEntities: {entities}\n"
+STATIC = {'schema': 'dblp:title, dblp:authoredBy', 'examples': ['q1', 'q2'], 'k': 5}
+
+
+def test_render_matches_str_format():
+    prompt = CompiledPrompt('test', TEMPLATE, **STATIC)
+    assert prompt.fields == ['question', 'entities']
+    for question, entities in (('Who wrote X?', ''), ('{braces} stay literal', 'E1; E2')):
+        assert prompt.render(question=question, entities=entities) == TEMPLATE.format(
+            question=question, entities=entities, **STATIC)
+
+
+def test_static_prefix_is_shared_by_every_render():
+    prompt = CompiledPrompt('test', TEMPLATE, **STATIC)
+    first = prompt.build(question='a', entities='b')
+    second = prompt.build(question='a much longer question', entities='')
+    assert prompt.prefix == "Schema: dblp:title, dblp:authoredBy\nExamples:\n['q1', 'q2']\nTop   5 for: "
+    assert first.startswith(prompt.prefix) and second.startswith(prompt.prefix)
+
+
+def test_render_records_prompt_stats():
+    prompt = CompiledPrompt('stats_test', TEMPLATE, **STATIC)
+    prompt.render(question='a', entities='b')
+    prompt.render(question='c', entities='d')
+    row = prompt_assembly.PROMPT_STATS.summary()['stats_test']
+    assert row['calls'] == 2 and row['prefix_tokens'] == 2 * prompt.prefix_tokens
+
+
+def test_compiled_builds_once_per_key():
+    builds = []
+
+    def build():
+        builds.append(1)
+        return CompiledPrompt('cached', TEMPLATE, **STATIC)
+
+    first = compiled(('cached', 'key'), build)
+    assert compiled(('cached', 'key'), build) is first
+    assert compiled(('cached', 'other'), build) is not first
+    assert len(builds) == 2
+
+
+def test_question_to_sparql_template_is_compiled_once(tmp_path, monkeypatch):
+    # The prompt and schema modules are not part of this tree; stand-ins with their attributes
+    prompt_text = "Schema:\n{dblp_schema}\nExamples:\n{examples}\nSimilar: {similar_questions_pool}\n" \
+                  "Entities: {entities}\nQuestion: {question}\n"
+    monkeypatch.setattr(baseline, 'question_to_sparql_prompt', SimpleNamespace(QUESTION_TO_SPARQL_PROMPT=prompt_text))
+    monkeypatch.setattr(baseline, 'dblp_schema', SimpleNamespace(properties_uri_and_description='dblp:title'))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'examples.json').write_text(json.dumps({'build_sparql': [{'question': 'Q', 'sparql': 'S'}]}))
+
+    template = baseline.question_to_sparql_template('build_sparql')
+    assert baseline.question_to_sparql_template('build_sparql') is template
+    fields = {'question': 'Who wrote X?', 'entities': '', 'similar_questions_pool': {'Q1': 'S1'}}
+    assert template.render(**fields) == prompt_text.format(
+        dblp_schema='dblp:title', examples='question: Q\nsparql: S', **fields)
+
+
+def test_warns_when_a_per_call_field_precedes_static_text(caplog):
+    with caplog.at_level(logging.WARNING, logger='prompt_assembly'):
+        CompiledPrompt('late_static', "{question}\n" + "Long fixed instructions. " * 50)
+    assert "move 'question' towards the end" in caplog.text
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger='prompt_assembly'):
+        CompiledPrompt('early_static', "Long fixed instructions. " * 50 + "{question}\n")
+    assert caplog.text == ''
+
+
+def test_sparql_to_question_prompt_puts_the_batch_last():
+    template = prompt_assembly.compiled('sparql_to_question', lambda: CompiledPrompt(
+        'sparql_to_question', sparql_to_question.format_prompt_template()))
+    assert template.fields == ['input_batch']
+    assert 'Expected Output (for the input example above):' in template.prefix
+    assert template.prefix.rstrip().endswith('Input batch (array of examples):\n    json')
+    batch = [{'id': '1', 'query': 'bast papers', 'sparql': 'SELECT ?x WHERE { ?x ?p ?o }'}]
+    prompt = sparql_to_question.format_prompt(batch, record_stats=False)
+    assert prompt == sparql_to_question.format_prompt_template().format(
+        input_batch=json.dumps(batch, ensure_ascii=False, indent=2))
+    assert prompt.startswith(template.prefix) and prompt.rstrip().endswith(json.dumps(batch, indent=2))
@@ -0,0 +1,79 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from similarity_index import SimilarityIndex, build_index
+
+QUESTIONS = [f"Which papers did author {i} publish in venue {i % 7}?" for i in range(200)]
+RECORDS = [{'id': f"Q{i}", 'question': {'string': question}, 'sparql': {'sparql': f"SELECT * WHERE {{ ?x ?p {i} }}"},
+            'entities': [f"<https://dblp.org/pid/{i}>"]} for i, question in enumerate(QUESTIONS)]
+
+
+class Embedder:
+    """Deterministic random vector per text; counts how many texts it embedded."""
+
+    def __init__(self, dimensions=32):
+        self.dimensions = dimensions
+        self.texts = 0
+
+    def __call__(self, texts):
+        self.texts += len(texts)
+        seeds = [int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little') for text in texts]
+        return np.stack([np.random.default_rng(seed).standard_normal(self.dimensions) for seed in seeds])
+
+
+def build(tmp_path, name, **options):
+    path = str(tmp_path / name)
+    info = build_index(RECORDS, path, Embedder(), **options)
+    return path, info
+
+
+def test_exact_and_ivf_search_agree_when_every_list_is_probed(tmp_path):
+    exact_path, _ = build(tmp_path, 'exact')
+    ivf_path, info = build(tmp_path, 'ivf', clusters=8)
+    assert info['clusters'] == 8
+    queries = QUESTIONS[:5] + ["A question that is not in the pool"]
+    exact = SimilarityIndex(exact_path, Embedder()).search(queries, top_k=10)
+    ivf = SimilarityIndex(ivf_path, Embedder(), nprobe=8).search(queries, top_k=10)
+    assert [[hit[0] for hit in hits] for hits in ivf] == [[hit[0] for hit in hits] for hits in exact]
+    for hits, question in zip(exact[:5], QUESTIONS):
+        qid, text, score, sparql, entities = hits[0]
+        assert text == question and score == pytest.approx(1.0, abs=1e-5)
+        assert sparql.startswith('SELECT') and entities == [f"<https://dblp.org/pid/{qid[1:]}>"]
+    assert all(a[2] >= b[2] for hits in exact for a, b in zip(hits, hits[1:]))
+
+
+def test_quantized_search_keeps_the_ranking(tmp_path):
+    exact_path, _ = build(tmp_path, 'exact')
+    quantized_path, info = build(tmp_path, 'quantized', quantize=True)
+    assert info['quantized']
+    exact = SimilarityIndex(exact_path, Embedder()).search(QUESTIONS[:20], top_k=3)
+    quantized = SimilarityIndex(quantized_path, Embedder()).search(QUESTIONS[:20], top_k=3)
+    for exact_hits, quantized_hits in zip(exact, quantized):
+        assert quantized_hits[0][0] == exact_hits[0][0]
+        for a, b in zip(exact_hits, quantized_hits):
+            assert b[2] == pytest.approx(a[2], abs=0.02)
+
+
+def test_clusters_are_capped_at_the_number_of_rows(tmp_path):
+    path = str(tmp_path / 'small')
+    info = build_index(RECORDS[:3], path, Embedder(), clusters=16)
+    assert info['clusters'] == 3
+    hits = SimilarityIndex(path, Embedder()).search([QUESTIONS[1]], top_k=5)[0]
+    assert len(hits) == 3 and hits[0][0] == 'Q1'
+
+
+def test_prefetched_results_are_served_from_memory_until_discarded(tmp_path):
+    path, _ = build(tmp_path, 'exact')
+    embedder = Embedder()
+    index = SimilarityIndex(path, embedder)
+    index.prefetch(QUESTIONS[:10], top_k=3, batch_size=4)
+    assert embedder.texts == 10 and len(index.prefetched) == 10
+    expected = index.search(QUESTIONS[:2], top_k=3)
+    assert embedder.texts == 10
+
+    index.discard(QUESTIONS[:2], top_k=3)
+    assert len(index.prefetched) == 8
+    assert index.search(QUESTIONS[:2], top_k=3) == expected
+    assert embedder.texts == 12
@@ -0,0 +1,46 @@
+import pytest
+from rdflib import Graph, Literal, URIRef
+
+import sparql_cache
+import utils
+from local_endpoint import serve_graph
+from sparql_cache import SPARQLResultCache, normalize_query
+
+QUERY = "SELECT ?o WHERE { <https://dblp.org/rec/0> <https://dblp.org/rdf/schema#title> ?o }"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = SPARQLResultCache(str(tmp_path / 'sparql.sqlite'))
+    monkeypatch.setattr(sparql_cache, 'get_default_cache', lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def endpoint():
+    graph = Graph()
+    graph.add((URIRef('https://dblp.org/rec/0'), URIRef('https://dblp.org/rdf/schema#title'), Literal('Title 0')))
+    server, url = serve_graph(graph)
+    yield url
+    server.shutdown()
+
+
+def test_normalize_query_ignores_spelling():
+    assert normalize_query(QUERY) == normalize_query(QUERY.replace(' WHERE', '\n  where'))
+    assert normalize_query('not   sparql') == 'not sparql'
+
+
+def test_run_sparql_answer_parses_key_once_per_call(cache, endpoint, monkeypatch):
+    calls = []
+
+    def counting(sparql_query):
+        calls.append(sparql_query)
+        return normalize_query(sparql_query)
+
+    monkeypatch.setattr(sparql_cache, 'normalize_query', counting)
+    assert utils.run_sparql_answer(endpoint, QUERY) == [{'o': 'Title 0'}]
+    assert len(calls) == 1
+    # The same query spelled differently is served from the cache
+    monkeypatch.setattr(utils, 'get_sparql_client', None)
+    assert utils.run_sparql_answer(endpoint, QUERY.replace(' WHERE', ' where')) == [{'o': 'Title 0'}]
+    assert len(calls) == 2
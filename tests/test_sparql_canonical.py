@@ -0,0 +1,43 @@
+from sparql_canonical import agreement_report, canonicalize, canonicalize_batch, canonicalize_with_rdflib
+
+QUERY = ("PREFIX dblp: <https://dblp.org/rdf/schema#> SELECT ?title WHERE { "
+         "?paper dblp:authoredBy <https://dblp.org/pid/b/HannahBast> . ?paper dblp:title ?title }")
+SAME = ("select ?t\nwhere {\n  ?p <https://dblp.org/rdf/schema#title> ?t .\n"
+        "  ?p <https://dblp.org/rdf/schema#authoredBy> <https://dblp.org/pid/b/HannahBast>\n}")
+OTHER_ENTITY = QUERY.replace('b/HannahBast', 'h/AidanHogan')
+BROKEN = "SELECT ?title WHERE { ?paper"
+
+
+def test_spelling_variants_share_a_canonical_form():
+    assert canonicalize_with_rdflib(QUERY) == canonicalize_with_rdflib(SAME)
+    assert canonicalize_with_rdflib(QUERY) != canonicalize_with_rdflib(OTHER_ENTITY)
+
+
+def test_projection_order_and_names():
+    swapped = QUERY.replace('SELECT ?title', 'SELECT ?paper ?title')
+    reordered = QUERY.replace('SELECT ?title', 'SELECT ?title ?paper')
+    assert canonicalize_with_rdflib(swapped) != canonicalize_with_rdflib(reordered)
+    # Variable names are kept when asked, e.g. for cache keys over result columns
+    assert (canonicalize_with_rdflib(QUERY, rename_variables=False)
+            != canonicalize_with_rdflib(SAME, rename_variables=False))
+
+
+def test_jena_fallback_only_for_unparsed_queries():
+    assert canonicalize_with_rdflib(BROKEN) is None
+    assert canonicalize(BROKEN, lambda query: 'jena') == 'jena'
+    calls = []
+
+    def fallback_many(queries):
+        calls.append(queries)
+        return ['jena'] * len(queries)
+
+    results = canonicalize_batch([QUERY, BROKEN, SAME], fallback_many)
+    assert calls == [[BROKEN]]
+    assert results[0] == results[2] and results[1] == 'jena'
+
+
+def test_agreement_report():
+    report = agreement_report([QUERY, SAME, OTHER_ENTITY, BROKEN],
+                              lambda queries: ['a', 'a', 'b', 'c'])
+    assert report['compared'] == 3 and report['jena_only'] == 1
+    assert report['agreement_rate'] == 1.0 and report['rdflib_unique'] == report['jena_unique'] == 2
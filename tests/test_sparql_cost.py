@@ -0,0 +1,65 @@
+import pytest
+
+from sparql_cost import DEFAULT_TIMEOUTS, analyze, cap_limit, parse_timeouts, plan
+
+PREFIX = "PREFIX dblp: <https://dblp.org/rdf/schema#> "
+ANCHORED = PREFIX + "SELECT ?title WHERE { ?p dblp:authoredBy <https://dblp.org/pid/1> . ?p dblp:title ?title } LIMIT 10"
+UNANCHORED = PREFIX + "SELECT ?p ?a WHERE { ?p dblp:authoredBy ?a }"
+EXPENSIVE = "SELECT * WHERE { ?s ?p ?o }"
+TIMEOUTS = {'cheap': 60.0, 'moderate': 30.0, 'expensive': 5.0, 'unparsed': 20.0}
+
+
+def test_analyze_cost_classes():
+    assert analyze(ANCHORED) == {'form': 'SELECT', 'cost': 'cheap', 'issues': [], 'limit': 10, 'single_row': False}
+    assert analyze(UNANCHORED)['cost'] == 'moderate'
+    assert analyze(UNANCHORED)['issues'] == ['missing_limit', 'unanchored']
+    assert analyze(EXPENSIVE)['cost'] == 'expensive'
+    assert analyze("SELECT ?x WHERE {")['cost'] == 'unparsed'
+
+
+def test_analyze_issues():
+    cartesian = PREFIX + "SELECT * WHERE { ?p dblp:title ?t . ?q dblp:title ?u } LIMIT 5"
+    assert 'cartesian_product' in analyze(cartesian)['issues'] and analyze(cartesian)['cost'] == 'expensive'
+    transitive = PREFIX + "SELECT ?x WHERE { <https://dblp.org/pid/1> (dblp:coauthor)+ ?x } LIMIT 5"
+    assert {'property_path', 'transitive_path'} <= set(analyze(transitive)['issues'])
+    values = PREFIX + "SELECT ?t WHERE { VALUES ?a { <https://dblp.org/pid/1> } ?p dblp:authoredBy ?a . ?p dblp:title ?t }"
+    assert analyze(values)['issues'] == ['missing_limit']
+    count = PREFIX + "SELECT (COUNT(?p) AS ?n) WHERE { ?p dblp:authoredBy ?a }"
+    assert analyze(count)['single_row'] and 'missing_limit' not in analyze(count)['issues']
+    union = PREFIX + ("SELECT ?t WHERE { { <https://dblp.org/rec/1> dblp:title ?t } UNION "
+                      "{ <https://dblp.org/rec/2> dblp:title ?t } }")
+    assert 'cartesian_product' not in analyze(union)['issues']
+
+
+def test_cap_limit():
+    assert cap_limit(UNANCHORED, 100, None) == UNANCHORED + "\nLIMIT 100"
+    assert cap_limit(UNANCHORED + " LIMIT 5000 OFFSET 20", 100, 5000) == UNANCHORED + " LIMIT 100 OFFSET 20"
+    # Only the top-level LIMIT changes, not one of a sub-select
+    nested = "SELECT ?s WHERE { { SELECT ?s WHERE { ?s ?p ?o } LIMIT 5000 } }"
+    assert cap_limit(nested + " LIMIT 5000", 100, 5000) == nested + " LIMIT 100"
+    assert cap_limit(nested, 100, None) == nested + "\nLIMIT 100"
+    # Refused when the top-level LIMIT is not where the textual rewrite can find it
+    assert cap_limit("SELECT ?s WHERE { ?s ?p ?o } LIMIT 5000 VALUES ?s { <https://dblp.org/pid/1> }", 100, 5000) is None
+
+
+def test_plan():
+    cheap = plan(ANCHORED, TIMEOUTS, 100)
+    assert cheap.sparql == ANCHORED and cheap.timeout == 60.0 and cheap.changes == []
+
+    capped = plan(UNANCHORED, TIMEOUTS, 100)
+    assert capped.sparql.endswith('LIMIT 100') and capped.timeout == 30.0 and capped.changes
+    report = capped.report([{}] * 100)
+    assert report['executed_sparql'] == capped.sparql and report['truncated'] and report['cost'] == 'moderate'
+
+    assert plan(UNANCHORED + " LIMIT 50", TIMEOUTS, 100).sparql == UNANCHORED + " LIMIT 50"
+    assert plan(UNANCHORED, TIMEOUTS, 0).sparql == UNANCHORED
+    ask = "ASK { ?s ?p ?o }"
+    assert plan(ask, TIMEOUTS, 100).sparql == ask and plan(ask, TIMEOUTS, 100).timeout == 5.0
+    assert plan("SELECT ?x WHERE {", TIMEOUTS, 100).timeout == 20.0
+
+
+def test_parse_timeouts():
+    assert parse_timeouts('') == DEFAULT_TIMEOUTS
+    assert parse_timeouts('expensive=2, cheap=90')['expensive'] == 2.0
+    with pytest.raises(ValueError):
+        parse_timeouts('slow=1')
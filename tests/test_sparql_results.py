@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from sparql_results import ResultStream, iter_json_array, read_answer, synthetic_response
+
+RESULT = {'head': {'vars': ['s', 'label']}, 'results': {'bindings': [
+    {'s': {'type': 'uri', 'value': 'https://dblp.org/pid/1'}, 'label': {'type': 'literal', 'value': 'Zoë "Z" Ünal'}},
+    {'s': {'type': 'uri', 'value': 'https://dblp.org/pid/2'}, 'label': {'type': 'literal', 'value': ''}},
+    {'s': {'type': 'uri', 'value': 'https://dblp.org/pid/3'}},
+]}}
+ROWS = [{'s': 'https://dblp.org/pid/1', 'label': 'Zoë "Z" Ünal'}, {'s': 'https://dblp.org/pid/2'},
+        {'s': 'https://dblp.org/pid/3'}]
+
+
+def chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 64, 10 ** 6])
+def test_rows_across_any_chunk_boundary(size):
+    # Multi-byte characters and escaped quotes are split between chunks at size 1 and 2
+    data = json.dumps(RESULT, ensure_ascii=False).encode('utf-8')
+    assert read_answer(chunks(data, size)) == ROWS
+
+
+def test_row_cap_and_truncation():
+    stream = ResultStream(synthetic_response(1000, chunk_size=512), max_rows=10)
+    rows = list(stream)
+    assert len(rows) == 10 and stream.truncated and stream.rows == 10
+    assert rows[3]['publication'].endswith('Author0000003') and rows[3]['year'] == '1993'
+
+    stream = ResultStream(synthetic_response(10), max_rows=10)
+    assert len(list(stream)) == 10 and not stream.truncated
+
+
+def test_ask_and_invalid_results():
+    assert read_answer([b'{"head": {}, "boo', b'lean": true}']) is True
+    assert read_answer(['{"head": {}, "boolean": false}']) is False
+    assert read_answer(['{"head": {"vars": []}, "results": {"bindings": []}}']) == []
+    with pytest.raises(ValueError):
+        read_answer(['{"error": "bindings"}'])
+    with pytest.raises(ValueError):
+        read_answer(['{"results": {"bindings": [{"s": {"value": "x"}}'])
+
+
+def test_iter_json_array():
+    document = json.dumps({'note': '"questions": [', 'questions': [{'id': 1}, {'id': 2}], 'tail': [3]})
+    assert list(iter_json_array(chunks(document.encode('utf-8'), 3), 'questions')) == [{'id': 1}, {'id': 2}]
+    assert list(iter_json_array(['﻿  [{"a": 1}, ["b"], "c"]'])) == [{'a': 1}, ['b'], 'c']
+    assert list(iter_json_array(['{"other": []}'], 'questions')) == []
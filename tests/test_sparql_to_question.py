@@ -0,0 +1,50 @@
+import sparql_to_question
+import utils
+from sparql_to_question import chunk_by_token_budget, format_prompt, item_tokens, process_items, validate_outputs
+
+
+def items(count, size=40):
+    return [{'id': str(i), 'query': 'x' * size, 'sparql': 'SELECT ?x WHERE { ?x ?p ?o }'} for i in range(count)]
+
+
+def output(item, question='Q?'):
+    return {'id': item['id'], 'formal_question': question, 'entities': []}
+
+
+def test_chunk_by_token_budget():
+    overhead = utils.estimate_tokens(format_prompt([], record_stats=False))
+    budget = overhead + 3 * item_tokens(items(1)[0])
+    batches = list(chunk_by_token_budget(items(10), budget))
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+    assert [item for batch in batches for item in batch] == items(10)
+    assert [len(batch) for batch in chunk_by_token_budget(items(10), 10 ** 6, max_items=4)] == [4, 4, 2]
+    # An item over the budget on its own still gets a batch
+    assert [len(batch) for batch in chunk_by_token_budget(items(2, size=10 ** 5), budget)] == [1, 1]
+
+
+def test_validate_outputs():
+    batch = items(4)
+    outputs = [output(batch[0]), output(batch[0], 'again'), {'id': '1', 'formal_question': None, 'entities': []},
+               'junk', output(batch[3]), {'id': '9', 'formal_question': 'Q?', 'entities': []}]
+    valid, missing = validate_outputs(batch, outputs)
+    assert [record['id'] for record in valid] == ['0', '3'] and valid[0]['formal_question'] == 'Q?'
+    assert missing == batch[1:3]
+    assert validate_outputs(batch, None) == ([], batch)
+
+
+def test_process_items_resends_missing_items(monkeypatch):
+    sent = []
+
+    def process_batch(batch):
+        sent.append([item['id'] for item in batch])
+        # The model only answers the first item of every batch
+        return {'outputs': [output(batch[0])]}
+
+    monkeypatch.setattr(sparql_to_question, 'process_batch', process_batch)
+    acquired = []
+    valid = process_items(items(4), max_resends=2, acquire=lambda batch: acquired.append(len(batch)))
+
+    assert sorted(record['id'] for record in valid) == ['0', '1', '2', '3']
+    assert sent == [['0', '1', '2', '3'], ['1', '2'], ['2'], ['3']]
+    assert acquired == [2, 1, 1]
+
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from split_dataset import assign, bucket, iter_dataset, parse_ratios, split_file, template_key
+
+DBLP = 'https://dblp.org/rdf/schema#'
+
+
+def record(i, author, reordered=False):
+    triples = [f"?paper <{DBLP}authoredBy> <https://dblp.org/pid/{author}>", f"?paper <{DBLP}title> ?title"]
+    if reordered:
+        triples.reverse()
+    return {'id': str(i), 'question': {'string': f"Papers of author {author}?"},
+            'query': {'sparql': f"SELECT ?title WHERE {{ {' . '.join(triples)} }}"}}
+
+
+def test_parse_ratios():
+    assert parse_ratios('train=8, test=2') == [('train', 0.8), ('test', 0.2)]
+    with pytest.raises(ValueError):
+        parse_ratios('train=0')
+
+
+def test_bucket_is_stable_and_salted():
+    assert bucket('42') == bucket('42')
+    assert bucket('42') != bucket('42', salt='other')
+    ratios = parse_ratios('train=0.8,test=0.2')
+    shares = [assign(bucket(i), ratios) for i in range(10000)].count('train') / 10000
+    assert 0.77 < shares < 0.83
+
+
+def test_template_key_ignores_entities_triple_order_and_prefixes():
+    prefixed = {'sparql': f"PREFIX dblp: <{DBLP}> PREFIX pid: <https://dblp.org/pid/> "
+                          "SELECT ?t WHERE { ?p dblp:title ?t . ?p dblp:authoredBy pid:Someone }"}
+    assert template_key(record(1, 'a')) == template_key(record(2, 'b', reordered=True)) == template_key(prefixed)
+    other = {'sparql': f"SELECT ?title WHERE {{ ?paper <{DBLP}title> ?title }}"}
+    assert template_key(other) != template_key(record(1, 'a'))
+    assert template_key({'sparql': 'SELECT ?x WHERE {'}).startswith('shape:')
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['questions']
+
+
+def test_split_file_keeps_assignments_when_the_dataset_grows(tmp_path):
+    records = [record(i, i % 7, reordered=i % 2) for i in range(200)]
+    ratios = parse_ratios('train=0.7,dev=0.1,test=0.2')
+    (tmp_path / 'v1.json').write_text(json.dumps({'questions': records[:150]}), encoding='utf-8')
+    (tmp_path / 'v2.json').write_text(json.dumps({'questions': records}), encoding='utf-8')
+
+    counts = split_file(str(tmp_path / 'v1.json'), str(tmp_path / 'v1'), ratios, records_key='questions')
+    split_file(str(tmp_path / 'v2.json'), str(tmp_path / 'v2'), ratios, records_key='questions')
+    assert sum(counts.values()) == 150
+    for name, _ in ratios:
+        before = {r['id'] for r in read(tmp_path / 'v1' / f"{name}.json")}
+        after = {r['id'] for r in read(tmp_path / 'v2' / f"{name}.json")}
+        assert before <= after
+
+
+def test_split_by_template_keeps_templates_together(tmp_path):
+    records = [record(i, i % 7, reordered=i % 2) for i in range(50)]
+    records += [{'id': f"c{i}", 'sparql': f"SELECT (COUNT(?p) AS ?n) WHERE {{ ?p <{DBLP}title> \"T{i}\" }}"}
+                for i in range(50)]
+    path = tmp_path / 'records.jsonl'
+    path.write_text(''.join(json.dumps(r) + '\n' for r in records), encoding='utf-8')
+
+    split_file(str(path), str(tmp_path / 'out'), parse_ratios('train=0.5,test=0.5'), by='template',
+               name_pattern='{split}.jsonl')
+    templates = {}
+    for name in ('train', 'test'):
+        for r in iter_dataset(str(tmp_path / 'out' / f"{name}.jsonl")):
+            templates.setdefault(template_key(r), set()).add(name)
+    assert len(templates) == 2 and all(len(splits) == 1 for splits in templates.values())
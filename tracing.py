@@ -0,0 +1,147 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+# Spans beyond this many are still counted in the summary but not kept for the trace file
+MAX_EVENTS = 1_000_000
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """
+    Collects timed spans from any thread: per-name durations for percentile summaries
+    and, up to MAX_EVENTS, complete events for a Chrome trace (chrome://tracing or
+    ui.perfetto.dev).
+    """
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.max_events = max_events
+        self.events: List[dict] = []
+        self.durations: Dict[str, List[float]] = {}
+
+    def add(self, name: str, start: float, seconds: float, args: Optional[dict] = None,
+            pid: Optional[int] = None, tid: Optional[int] = None):
+        """Records a span that started at perf_counter() value `start`."""
+        event = {'name': name, 'ph': 'X', 'ts': round((start - self.origin) * 1e6, 1),
+                 'dur': round(seconds * 1e6, 1), 'pid': pid or os.getpid(), 'tid': tid or threading.get_ident()}
+        if args:
+            event['args'] = args
+        with self.lock:
+            self.durations.setdefault(name, []).append(seconds)
+            if len(self.events) < self.max_events:
+                self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time.perf_counter() - start, args)
+
+    def summary(self, percentiles=(50, 95, 99)) -> Dict[str, dict]:
+        import numpy as np
+        report = {}
+        with self.lock:
+            for name, values in sorted(self.durations.items()):
+                values = np.asarray(values)
+                report[name] = {'count': len(values), 'total_s': round(float(values.sum()), 3)}
+                for p, value in zip(percentiles, np.percentile(values, percentiles)):
+                    report[name][f"p{p}_ms"] = round(float(value) * 1000, 2)
+                report[name]['max_ms'] = round(float(values.max()) * 1000, 2)
+        return report
+
+    def export_chrome(self, path: str):
+        with self.lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def print_summary(report: Dict[str, dict]):
+    if not report:
+        return
+    columns = [key for key in next(iter(report.values())) if key != 'count']
+    width = max(len(name) for name in report)
+    print(f"{'span':<{width}} {'count':>8} " + ' '.join(f"{column:>10}" for column in columns))
+    for name, row in report.items():
+        print(f"{name:<{width}} {row['count']:>8} " + ' '.join(f"{row[column]:>10}" for column in columns))
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable(trace_path: Optional[str] = None) -> Tracer:
+    """
+    Starts tracing in this process. With `trace_path` the Chrome trace is written and
+    the summary printed when the process exits.
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+        if trace_path:
+            atexit.register(_finish, _tracer, trace_path)
+    return _tracer
+
+
+def _finish(tracer: Tracer, trace_path: str):
+    tracer.export_chrome(trace_path)
+    print_summary(tracer.summary())
+    print(f"Trace written to {trace_path}")
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def span(name: str, **args):
+    """
+    `with span('sparql', endpoint=...):` times the block when tracing is enabled and is
+    a shared no-op context otherwise. The yielded dict (None when disabled) can take
+    more args for the event.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.span(name, **args)
+
+
+def traced(name: str):
+    """Decorator form of `span`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def call_in_worker(name: str, func: Callable, argument):
+    """
+    Runs func(argument) in a worker process and returns (result, span) so the parent can
+    record the span with `record_worker_span`; pickles as long as `func` does.
+    """
+    start = time.time()
+    started = time.perf_counter()
+    result = func(argument)
+    return result, {'name': name, 'start': start, 'seconds': time.perf_counter() - started, 'pid': os.getpid()}
+
+
+def record_worker_span(event: dict):
+    if _tracer is not None:
+        # Worker clocks are mapped through wall-clock time
+        start = time.perf_counter() - (time.time() - event['start'])
+        _tracer.add(event['name'], start, event['seconds'], pid=event['pid'], tid=event['pid'])
+
+
+if Config.TRACE_PATH:
+    enable(Config.TRACE_PATH)
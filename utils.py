@@ -1,25 +1,108 @@
 import json
-from SPARQLWrapper import SPARQLWrapper, JSON
 import csv
+import importlib
+import os
+import threading
+import sparql_cache
+import tracing
+from sparql_client import SPARQLClient, SPARQLQueryError, is_local
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self.load(), attribute)
+
 
 def get_value_from_dict(data, key):
     if key in data:
         return data[key]
 
 
-def run_sparql_query(sparql_endpoint, sparql_query, param='', flag=False):
+@tracing.traced('sparql')
+def run_sparql_query(sparql_endpoint, sparql_query, param='', flag=False, use_cache=True):
     if flag:
         sparql_query = sparql_query % param
+    cache = sparql_cache.get_default_cache() if use_cache else None
+    if cache is not None:
+        key = cache.key(sparql_endpoint, sparql_query)
+        found, result, error = cache.get_result(key)
+        if found:
+            if error is not None:
+                print(f"An error occurred (cached): {error}")
+            return result
     try:
-        sparql = SPARQLWrapper(sparql_endpoint)
-        sparql.setQuery(sparql_query)
-        sparql.setReturnFormat(JSON)
-        result = sparql.query().convert()
-        return result
+        if is_local(sparql_endpoint):
+            result = get_sparql_client(sparql_endpoint).query(sparql_query)
+        else:
+            from SPARQLWrapper import SPARQLWrapper, JSON
+            sparql = SPARQLWrapper(sparql_endpoint)
+            sparql.setQuery(sparql_query)
+            sparql.setReturnFormat(JSON)
+            result = sparql.query().convert()
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+        if cache is not None:
+            cache.put_error(key, str(e))
+        return None
+    if cache is not None:
+        cache.put_result(key, result)
+    return result
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_sparql_client(sparql_endpoint, timeout=60):
+    if is_local(sparql_endpoint):
+        import local_sparql
+        return local_sparql.get_client(sparql_endpoint, timeout)
+    with _clients_lock:
+        if sparql_endpoint not in _clients:
+            _clients[sparql_endpoint] = SPARQLClient(sparql_endpoint, timeout)
+        return _clients[sparql_endpoint]
+
+
+@tracing.traced('sparql')
+def run_sparql_answer(sparql_endpoint, sparql_query, max_rows=None, use_cache=True, timeout=60):
+    """
+    Like extruct_values(run_sparql_query(...)), but the rows are parsed while the
+    response streams in, so large results are never held twice; ASK queries give
+    their boolean. At most `max_rows` rows are read. Returns None on errors.
+    """
+    cache = sparql_cache.get_default_cache() if use_cache else None
+    if cache is not None:
+        key = cache.key(sparql_endpoint, sparql_query, 'answer')
+        found, answer, error = cache.get_answer(key)
+        if found:
+            if error is not None:
+                print(f"An error occurred (cached): {error}")
+                return None
+            return answer[:max_rows] if isinstance(answer, list) else answer
+    try:
+        # One row more than asked tells whether the answer was cut off
+        limit = max_rows + 1 if max_rows is not None else None
+        answer = get_sparql_client(sparql_endpoint, timeout).query_answer(sparql_query, timeout, limit)
+    except SPARQLQueryError as e:
+        print(f"An error occurred: {str(e)}")
+        if cache is not None:
+            cache.put_error(key, str(e))
         return None
-    return
+    if isinstance(answer, list) and max_rows is not None and len(answer) > max_rows:
+        return answer[:max_rows]
+    if cache is not None:
+        cache.put_answer(key, answer)
+    return answer
 
 
 def load_json_data(file_name):
@@ -37,6 +120,41 @@ def write_to_json(result, out_file_path):
     print("Successfully written to file!")
 
 
+def load_jsonl(file_name):
+    records = []
+    try:
+        with open(file_name, 'r', encoding='utf-8') as jsonl_file:
+            for line in jsonl_file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A line cut short by a crash while appending; it gets redone on resume.
+                    print(f"Skipping malformed line in '{file_name}'")
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def append_jsonl(records, out_file_path):
+    with open(out_file_path, "ab+") as f:
+        # A crash can leave the last line cut short; start a new line so the next record stays readable
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        for record in records:
+            f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.flush()
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text and SPARQL.
+    return len(text) // 4 + 1
+
+
 def extruct_values(results):
     return_result = []
     for result in results["results"]["bindings"]:
@@ -49,11 +167,18 @@ def extruct_values(results):
     return return_result
 
 
+_examples_cache = {}
+
+
 def get_examples(key, file_path="examples.json"):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        examples_data = json.load(file)
-    examples = '\n'.join(f"{key}: {value}" for d in examples_data.get(key, None) for key, value in d.items())
-    return examples
+    # Parsed once per file version instead of on every prompt
+    cache_key = (os.path.abspath(file_path), os.stat(file_path).st_mtime_ns, key)
+    if cache_key not in _examples_cache:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            examples_data = json.load(file)
+        _examples_cache[cache_key] = '\n'.join(
+            f"{key}: {value}" for d in examples_data.get(key, None) for key, value in d.items())
+    return _examples_cache[cache_key]
 
 
 def convert_csv_to_json(input_csv, output_json):